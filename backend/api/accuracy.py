@@ -0,0 +1,240 @@
+"""
+Incrementally maintained PredictionAccuracy totals.
+
+Like rollups.py, every code path that sets or clears
+PredictionResult.actual_sales calls ``record`` in the same transaction,
+removing the row's old contribution (sign=-1) before adding the new one.
+Rows without an actual_sales contribute nothing. ``rebuild`` and ``check``
+recompute the totals from the raw table.
+
+``drift`` and ``rolling`` sum the per-day rows over a date range, so the
+error metrics of any window cost O(days x groups) rows, however many
+predictions there are.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Abs
+
+from .models import PredictionAccuracy, PredictionResult
+
+TOTALS = ('count', 'sum_error', 'sum_abs_error', 'sum_sq_error', 'sum_actual')
+GROUP_FIELDS = ('category', 'region', 'seasonality')
+
+
+def accuracy_key(day, category, region, seasonality):
+    return (day, category, region, seasonality or '')
+
+
+def _deltas(results, sign):
+    deltas = {}
+    for result in results:
+        if result.actual_sales is None:
+            continue
+        key = accuracy_key(result.date, result.category, result.region, result.seasonality)
+        actual = float(result.actual_sales)
+        error = float(result.predicted_sales) - actual
+        count, total, total_abs, total_sq, total_actual = deltas.get(key, (0, 0.0, 0.0, 0.0, 0.0))
+        deltas[key] = (
+            count + sign,
+            total + sign * error,
+            total_abs + sign * abs(error),
+            total_sq + sign * error * error,
+            total_actual + sign * actual,
+        )
+    return deltas
+
+
+def record(results, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) the errors of PredictionResult objects
+    that have an actual_sales. Call it in the transaction that writes them.
+    """
+    apply(_deltas(results, sign))
+
+
+@transaction.atomic
+def apply(deltas, sign=1, batch_size=1000):
+    """
+    Add ``sign`` times {accuracy key: totals} to the accuracy rows: missing
+    keys are inserted as zero rows, then every key is incremented by one
+    executemany'd UPDATE, so a backfill touching tens of thousands of keys
+    costs two round trips per batch rather than two queries per key.
+    """
+    if not deltas:
+        return
+    PredictionAccuracy.objects.bulk_create([
+        PredictionAccuracy(date=day, category=category, region=region, seasonality=seasonality)
+        for day, category, region, seasonality in deltas
+    ], batch_size=batch_size, ignore_conflicts=True)
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {}'.format(
+        quote(PredictionAccuracy._meta.db_table),
+        ', '.join(f'{quote(name)} = {quote(name)} + %s' for name in TOTALS),
+        ' AND '.join(f'{quote(name)} = %s' for name in ('date', 'category', 'region', 'seasonality')),
+    )
+    params = [
+        [sign * value for value in values]
+        + [connection.ops.adapt_datefield_value(day), category, region, seasonality]
+        for (day, category, region, seasonality), values in deltas.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def totals(queryset, actual=F('actual_sales')):
+    """
+    Totals per accuracy key of the PredictionResult ``queryset``, summed in
+    the database with ``actual`` as the observed value.
+    """
+    result = {}
+    error = F('predicted_sales') - actual
+    groups = (
+        queryset.order_by().values('date', 'category', 'region', 'seasonality')
+        .annotate(n=Count('id'), total=Sum(error), total_abs=Sum(Abs(error)),
+                  total_sq=Sum(error * error), total_actual=Sum(actual))
+    )
+    for group in groups:
+        key = accuracy_key(group['date'], group['category'], group['region'], group['seasonality'])
+        previous = result.get(key, (0, 0.0, 0.0, 0.0, 0.0))
+        current = (group['n'], group['total'], group['total_abs'], group['total_sq'], group['total_actual'])
+        result[key] = tuple(a + (b or 0) for a, b in zip(previous, current))
+    return result
+
+
+def aggregate_raw():
+    """Totals per accuracy key computed from the raw PredictionResult table."""
+    return totals(PredictionResult.objects.filter(actual_sales__isnull=False))
+
+
+@transaction.atomic
+def rebuild():
+    """Replace all accuracy rows with totals recomputed from the raw table. Returns the row count."""
+    raw = aggregate_raw()
+    PredictionAccuracy.objects.all().delete()
+    PredictionAccuracy.objects.bulk_create([
+        PredictionAccuracy(date=day, category=category, region=region, seasonality=seasonality,
+                           **dict(zip(TOTALS, values)))
+        for (day, category, region, seasonality), values in raw.items()
+    ], batch_size=1000)
+    return len(raw)
+
+
+def check(rel_tol=1e-9, abs_tol=1e-6):
+    """Compare the accuracy rows with the raw table. Returns a list of mismatch descriptions."""
+    expected = aggregate_raw()
+    actual = {
+        accuracy_key(row.date, row.category, row.region, row.seasonality): tuple(getattr(row, name) for name in TOTALS)
+        for row in PredictionAccuracy.objects.all()
+    }
+    mismatches = []
+    empty = (0, 0.0, 0.0, 0.0, 0.0)
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, empty)
+        have = actual.get(key, empty)
+        if want[0] != have[0] or not all(
+            math.isclose(w, h, rel_tol=rel_tol, abs_tol=abs_tol) for w, h in zip(want[1:], have[1:])
+        ):
+            mismatches.append(f"{key}: expected {dict(zip(TOTALS, want))}, accuracy row has {dict(zip(TOTALS, have))}")
+    return mismatches
+
+
+def metrics(count, total, total_abs, total_sq, total_actual):
+    """bias, MAE, RMSE and WAPE from summed errors."""
+    if not count:
+        return {'count': 0, 'bias': None, 'mae': None, 'rmse': None, 'wape': None}
+    return {
+        'count': count,
+        'bias': total / count,
+        'mae': total_abs / count,
+        'rmse': math.sqrt(max(total_sq, 0.0) / count),
+        'wape': total_abs / total_actual if total_actual else None,
+    }
+
+
+def _sums():
+    # Annotations may not shadow the model's field names
+    return {f'{name}__sum': Sum(name) for name in TOTALS}
+
+
+def drift(date_from=None, date_to=None, group_by=('category', 'region')):
+    """
+    Error metrics of the predictions dated in [date_from, date_to], per
+    ``group_by`` group and overall.
+    """
+    # Groups whose predictions have all been removed again keep a zero row
+    queryset = PredictionAccuracy.objects.filter(count__gt=0)
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    sums = _sums()
+    groups = []
+    for row in queryset.order_by().values(*group_by).annotate(**sums).order_by(*group_by):
+        groups.append({
+            **{field: row[field] for field in group_by},
+            **metrics(*(row[alias] or 0 for alias in sums)),
+        })
+    overall = queryset.aggregate(**sums)
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'overall': metrics(*(overall[alias] or 0 for alias in sums)),
+        'groups': groups,
+    }
+
+
+def rolling(window_days=7, periods=1, date_to=None, group_by=GROUP_FIELDS):
+    """
+    Error metrics per ``group_by`` group and overall over the
+    ``window_days`` days ending at ``date_to`` (default: the newest day with
+    actuals), and over each window ending on the ``periods - 1`` days
+    before it. Reads the per-day rows of window_days + periods - 1 days
+    once and slides the windows over their cumulative sums.
+    """
+    queryset = PredictionAccuracy.objects.filter(count__gt=0)
+    if date_to is None:
+        date_to = queryset.aggregate(newest=Max('date'))['newest']
+    result = {'window_days': window_days, 'periods': periods, 'date_to': date_to,
+              'group_by': list(group_by), 'overall': [], 'groups': []}
+    if date_to is None:
+        return result
+
+    span = window_days + periods - 1
+    first = date_to - timedelta(days=span - 1)
+    sums = _sums()
+    daily = defaultdict(lambda: np.zeros((span, len(TOTALS))))
+    overall = np.zeros((span, len(TOTALS)))
+    rows = (queryset.filter(date__gte=first, date__lte=date_to).order_by()
+            .values('date', *group_by).annotate(**sums))
+    for row in rows:
+        values = [row[alias] or 0 for alias in sums]
+        day = (row['date'] - first).days
+        daily[tuple(row[field] for field in group_by)][day] += values
+        overall[day] += values
+
+    def windows(matrix):
+        cumulative = np.vstack([np.zeros(len(TOTALS)), np.cumsum(matrix, axis=0)])
+        found = []
+        for end in range(window_days, span + 1):
+            count, *totals = cumulative[end] - cumulative[end - window_days]
+            last = first + timedelta(days=end - 1)
+            found.append({
+                'date_from': last - timedelta(days=window_days - 1),
+                'date_to': last,
+                # count comes back as a difference of float running sums
+                **metrics(int(round(count)), *(float(value) for value in totals)),
+            })
+        return found
+
+    result['overall'] = windows(overall)
+    result['groups'] = [
+        {**dict(zip(group_by, key)), 'windows': windows(daily[key])}
+        for key in sorted(daily)
+    ]
+    return result
@@ -0,0 +1,104 @@
+"""
+Observed sales for PredictionResult.actual_sales.
+
+Ingest (POST /api/actuals/): each row is a full MarketData row. It is
+upserted on (store_id, product_id, date), so a corrected figure replaces
+the earlier one. The upsert refreshes MarketData.updated_at, so the next
+export_history run rewrites that month of the Parquet history (new days
+are appended) and the following ``data_pipeline.py --incremental`` run
+learns from it. Its
+units_sold becomes the actual_sales of the predictions for the same store,
+product and day, and PredictionAccuracy is moved by the difference, all in
+one transaction.
+
+Backfill (manage.py backfill_actuals): copies MarketData.units_sold onto
+every prediction whose actual_sales is missing or different. It walks
+the predictions in primary-key ranges. Each range is one transaction with
+three statements: an UPDATE whose correlated subquery joins on (store_id,
+product_id, date) through the unique_market_data_row index, and two
+GROUP BY queries that move PredictionAccuracy by the old and new errors.
+Nothing is loaded row by row into Python.
+"""
+from django.db import transaction
+from django.db.models import F, Max, Min, OuterRef, Subquery
+
+from . import accuracy
+from .models import MarketData, PredictionResult
+
+UPSERT_FIELDS = [field.name for field in MarketData._meta.concrete_fields
+                 if field.name not in ('id', 'store_id', 'product_id', 'date')]
+
+
+def _predictions(keys):
+    """PredictionResult rows keyed by any of ``keys``, locked for the update where the database can."""
+    dates = {day for _, _, day in keys}
+    stores = {store for store, _, _ in keys}
+    products = {product for _, product, _ in keys}
+    # Served by prediction_store_product_idx; the cross product it over-selects is dropped below
+    queryset = PredictionResult.objects.select_for_update().order_by().filter(
+        store_id__in=stores, product_id__in=products, date__in=dates)
+    return [p for p in queryset if (p.store_id, p.product_id, p.date) in keys]
+
+
+@transaction.atomic
+def ingest(rows, batch_size=1000):
+    """
+    Upsert validated MarketData field dicts and copy their units_sold onto
+    matching predictions. Returns (market rows written, predictions updated).
+    """
+    actuals = {(row['store_id'], row['product_id'], row['date']): row['units_sold'] for row in rows}
+    MarketData.objects.bulk_create(
+        [MarketData(**row) for row in rows], batch_size=batch_size,
+        update_conflicts=True, unique_fields=['store_id', 'product_id', 'date'], update_fields=UPSERT_FIELDS)
+
+    changed = [p for p in _predictions(actuals)
+               if p.actual_sales != actuals[(p.store_id, p.product_id, p.date)]]
+    accuracy.record(changed, sign=-1)
+    for prediction in changed:
+        prediction.actual_sales = actuals[(prediction.store_id, prediction.product_id, prediction.date)]
+    PredictionResult.objects.bulk_update(changed, ['actual_sales'], batch_size=batch_size)
+    accuracy.record(changed)
+    return len(rows), len(changed)
+
+
+def observed_sales():
+    """units_sold of the MarketData row with the outer prediction's store, product and day."""
+    return Subquery(MarketData.objects.filter(
+        store_id=OuterRef('store_id'), product_id=OuterRef('product_id'), date=OuterRef('date'),
+    ).order_by().values('units_sold')[:1])
+
+
+def _backfill_range(queryset, low, high):
+    stale = (queryset.filter(id__gt=low, id__lte=high)
+             .annotate(observed=observed_sales())
+             .filter(observed__isnull=False)
+             .exclude(actual_sales=F('observed')))
+    with transaction.atomic():
+        accuracy.apply(accuracy.totals(stale.filter(actual_sales__isnull=False)), sign=-1)
+        accuracy.apply(accuracy.totals(stale, actual=F('observed')))
+        return PredictionResult.objects.filter(pk__in=stale.values('pk')).update(actual_sales=observed_sales())
+
+
+def backfill(batch_size=50000, date_from=None, date_to=None, progress=None):
+    """
+    Set actual_sales from MarketData for predictions dated in [date_from,
+    date_to]. ``progress(high, max_id, updated)`` is called after each batch.
+    Returns the number of predictions updated.
+    """
+    queryset = PredictionResult.objects.order_by()
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return 0
+    updated = 0
+    low = bounds['low'] - 1
+    while low < bounds['high']:
+        high = min(low + batch_size, bounds['high'])
+        updated += _backfill_range(queryset, low, high)
+        if progress is not None:
+            progress(high, bounds['high'], updated)
+        low = high
+    return updated
@@ -0,0 +1,77 @@
+"""
+Aggregations behind /api/stats/ and /api/seasonal-analysis/, with sync
+versions for the DRF views and async versions for the ASGI views.
+
+Both read the PredictionRollup table (one row per category, region and
+seasonality) and reduce it in Python, so their cost depends on the number of
+groups rather than on the prediction history.
+"""
+from .instrumentation import stage
+from .models import PredictionRollup
+
+ROLLUP_FIELDS = ('category', 'region', 'seasonality', 'count', 'sum')
+
+
+def _rollups():
+    return PredictionRollup.objects.filter(count__gt=0).values_list(*ROLLUP_FIELDS)
+
+
+def _seasonal(rollups):
+    totals = {}
+    for category, _region, seasonality, _count, total in rollups:
+        key = (category, seasonality)
+        totals[key] = totals.get(key, 0.0) + total
+    # '' is how the rollups store a missing seasonality
+    return [
+        {
+            "category": category,
+            "seasonality": seasonality or None,
+            "total_predicted_sales": total,
+        }
+        for (category, seasonality), total in sorted(totals.items())
+    ]
+
+
+def _top(rollups, index, field, limit=5):
+    totals = {}
+    for row in rollups:
+        totals[row[index]] = totals.get(row[index], 0.0) + row[4]
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{field: key, "total_sales": total} for key, total in ranked]
+
+
+def _stats(rollups):
+    prediction_count = sum(row[3] for row in rollups)
+    total = sum(row[4] for row in rollups)
+    return {
+        "prediction_count": prediction_count,
+        "avg_predicted_sales": total / prediction_count if prediction_count else 0,
+        "top_categories": _top(rollups, 0, 'category'),
+        "top_regions": _top(rollups, 1, 'region'),
+    }
+
+
+def _read():
+    with stage('analytics_query'):
+        return list(_rollups())
+
+
+async def _aread():
+    with stage('analytics_query'):
+        return [row async for row in _rollups()]
+
+
+def seasonal_data():
+    return _seasonal(_read())
+
+
+async def aseasonal_data():
+    return _seasonal(await _aread())
+
+
+def stats_data():
+    return _stats(_read())
+
+
+async def astats_data():
+    return _stats(await _aread())
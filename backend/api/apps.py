@@ -1,6 +1,24 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def _serving():
+    """False under manage.py, except for the commands listed in MODEL_PRELOAD_COMMANDS."""
+    if len(sys.argv) < 2 or os.path.basename(sys.argv[0]) != 'manage.py':
+        return True
+    return sys.argv[1] in getattr(settings, 'MODEL_PRELOAD_COMMANDS', ('runserver',))
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Management commands that don't serve requests would pay the model
+        # load for nothing; registry.get() loads it on first use instead.
+        if getattr(settings, 'MODEL_PRELOAD', True) and _serving():
+            from .registry import registry
+            registry.load()
@@ -0,0 +1,128 @@
+"""
+Async variants of the prediction and analytics views for the ASGI application.
+
+Model inference runs in the bounded ``inference_pool`` so the event loop keeps
+serving other requests while ``model.predict`` runs; the analytics queries
+use Django's async ORM. Saving a prediction runs its transaction (row plus
+rollups) through sync_to_async, since the async ORM has no transactions.
+When the pool, or the coalescer's queue, is full the views answer 503
+instead of queueing.
+"""
+import asyncio
+import json
+import logging
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+
+from .analytics import aseasonal_data, astats_data
+from .cache import analytics_cache, etag_matches
+from .coalescer import coalescer
+from .instrumentation import stage
+from .pool import PoolSaturated, inference_pool
+from .predictor import arecord_prediction, memo_lookup, predict_matrix
+from .registry import registry
+from .serializers import PredictionRequestSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def _method_not_allowed(request):
+    return JsonResponse({"detail": f'Method "{request.method}" not allowed.'},
+                        status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+def _overloaded(e):
+    response = JsonResponse({"error": f"Server busy: {e}"},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '1'
+    return response
+
+
+def _score_one(data):
+    """(bundle, memo key, memo entry, prediction or Future), or all None without a model."""
+    bundle = registry.get()
+    if bundle is None:
+        return None, None, None, None
+    row, segment, key, entry = memo_lookup(bundle, data)
+    if entry is not None:
+        return bundle, key, entry, entry.predicted_sales
+    if settings.PREDICTION_COALESCE:
+        # Returns a Future; the coalescer thread resolves it
+        return bundle, key, entry, coalescer.submit(bundle, row, segment)
+    return bundle, key, entry, float(predict_matrix(bundle, row[None, :], [segment])[0])
+
+
+@csrf_exempt
+async def predict_sales(request):
+    if request.method != 'POST':
+        return _method_not_allowed(request)
+    
+    try:
+        payload = json.loads(request.body)
+    except ValueError as e:
+        return JsonResponse({"detail": f"JSON parse error - {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = PredictionRequestSerializer(data=payload)
+    with stage('validate'):
+        valid = serializer.is_valid()
+    if not valid:
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        bundle, key, entry, predicted_sales = await inference_pool.run(_score_one, serializer.validated_data)
+        if isinstance(predicted_sales, Future):
+            predicted_sales = await asyncio.wrap_future(predicted_sales)
+    except PoolSaturated as e:
+        return _overloaded(e)
+    except Exception as e:
+        logger.exception("Prediction failed")
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    if bundle is None:
+        return JsonResponse({"error": "Model, preprocessor, or columns not available"},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    try:
+        prediction_id, prediction_uuid = await arecord_prediction(key, entry, serializer.validated_data,
+                                                                  predicted_sales)
+    except Exception as e:
+        logger.exception("Saving prediction failed")
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return JsonResponse({
+        "predicted_sales": predicted_sales,
+        "prediction_id": prediction_id,
+        "prediction_uuid": prediction_uuid,
+        "model_version": bundle.version
+    })
+
+
+async def _analytics_response(request, name, acompute):
+    if request.method != 'GET':
+        return _method_not_allowed(request)
+    try:
+        etag, data = await analytics_cache.aget_or_compute(name, acompute)
+    except Exception as e:
+        logger.exception("Computing %s failed", name)
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    if etag_matches(request, etag):
+        analytics_cache.not_modified.inc()
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(data, safe=False)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+async def seasonal_analysis(request):
+    return await _analytics_response(request, 'seasonal_analysis', aseasonal_data)
+
+
+async def get_stats(request):
+    return await _analytics_response(request, 'stats', astats_data)
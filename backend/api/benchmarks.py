@@ -0,0 +1,207 @@
+"""
+Measurements behind the ``benchmark`` management command.
+
+Each ``bench_*`` function returns {name: metrics} where metrics are flat
+numbers. Names ending in ``_ms`` or ``seconds`` are better when lower, names
+ending in ``_rps`` or ``_per_sec`` better when higher; ``compare`` uses that
+convention to flag regressions against a stored baseline.
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import AsyncClient, Client
+
+from . import rollups
+from .cache import analytics_cache
+from .models import PredictionResult
+from .synthetic import market_frame, write_csv
+
+LOWER_IS_BETTER = ('_ms', 'seconds')
+HIGHER_IS_BETTER = ('_rps', '_per_sec')
+
+
+def latency_summary(latencies, wall, errors=0):
+    """Percentiles of per-request latencies (seconds) and throughput over ``wall`` seconds."""
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        'requests': len(ms),
+        'errors': errors,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean()),
+        'throughput_rps': len(ms) / wall if wall else 0.0,
+    }
+
+
+def _post_wsgi(client, path, payload):
+    started = time.perf_counter()
+    response = client.post(path, payload, content_type='application/json')
+    return time.perf_counter() - started, response.status_code == 200
+
+
+def bench_predict_wsgi(payloads, concurrency, path='/api/predict/'):
+    """POST every payload through the WSGI test client from ``concurrency`` threads."""
+    clients = [Client() for _ in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(
+            lambda i: _post_wsgi(clients[i % concurrency], path, payloads[i]), range(len(payloads))
+        ))
+    wall = time.perf_counter() - started
+    return latency_summary([t for t, _ in timings], wall, sum(not ok for _, ok in timings))
+
+
+async def _run_asgi(payloads, concurrency, path):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(payload):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, payload, content_type='application/json')
+            return time.perf_counter() - started, response.status_code == 200
+
+    return await asyncio.gather(*(post(payload) for payload in payloads))
+
+
+def bench_predict_asgi(payloads, concurrency, path='/api/async/predict/'):
+    """POST every payload through the ASGI handler with at most ``concurrency`` in flight."""
+    started = time.perf_counter()
+    timings = asyncio.run(_run_asgi(payloads, concurrency, path))
+    wall = time.perf_counter() - started
+    return latency_summary([t for t, _ in timings], wall, sum(not ok for _, ok in timings))
+
+
+def fill_predictions(target_rows, seed=0, chunk_size=50000):
+    """
+    Bulk insert synthetic PredictionResult rows until the table holds
+    ``target_rows`` and rebuild the rollups. Returns the insert time in seconds.
+    """
+    existing = PredictionResult.objects.count()
+    started = time.perf_counter()
+    for offset in range(existing, target_rows, chunk_size):
+        frame = market_frame(min(chunk_size, target_rows - offset), seed, offset)
+        objects = [
+            PredictionResult(store_id=int(store[1:]), product_id=int(product[1:]), category=category,
+                             region=region, date=day, predicted_sales=sales, seasonality=season)
+            for store, product, category, region, day, sales, season in zip(
+                frame['Store ID'], frame['Product ID'], frame['Category'], frame['Region'],
+                frame['Date'], frame['Units Sold'].tolist(), frame['Seasonality'],
+            )
+        ]
+        with transaction.atomic():
+            PredictionResult.objects.bulk_create(objects, batch_size=5000)
+    rollups.rebuild()
+    return time.perf_counter() - started
+
+
+def _get_latencies(client, path, repeats, cold):
+    latencies = []
+    for _ in range(repeats):
+        if cold:
+            analytics_cache.bump()
+        started = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+    return latencies
+
+
+def bench_analytics(rows, repeats=50):
+    """/api/stats/ and /api/seasonal-analysis/ on a table of ``rows`` predictions, cold and cached."""
+    fill_seconds = fill_predictions(rows)
+    client = Client()
+    results = {}
+    for name, path in (('stats', '/api/stats/'), ('seasonal_analysis', '/api/seasonal-analysis/')):
+        for state, cold in (('cold', True), ('warm', False)):
+            started = time.perf_counter()
+            latencies = _get_latencies(client, path, repeats, cold)
+            results[f'{name}.{state}.rows_{rows}'] = latency_summary(latencies, time.perf_counter() - started)
+    # What the rollups save: the same totals computed from the raw table
+    started = time.perf_counter()
+    rollups.aggregate_raw()
+    results[f'raw_aggregate.rows_{rows}'] = {'seconds': time.perf_counter() - started}
+    results[f'fill_predictions.rows_{rows}'] = {'seconds': fill_seconds}
+    return results
+
+
+def bench_import(directory, rows, chunk_size=50000):
+    """``import_data`` on a synthetic CSV of ``rows`` rows."""
+    path = write_csv(os.path.join(directory, 'import.csv'), rows, seed=1)
+    output = StringIO()
+    started = time.perf_counter()
+    call_command('import_data', path, chunk_size=chunk_size, stdout=output)
+    seconds = time.perf_counter() - started
+    if 'Error importing data' in output.getvalue():
+        raise RuntimeError(output.getvalue().strip())
+    return {'import_data': {'rows': rows, 'seconds': seconds, 'rows_per_sec': rows / seconds}}
+
+
+def bench_pipeline(directory, rows, script, workers=None):
+    """
+    Run data_pipeline.py on a synthetic CSV in ``directory`` (which receives
+    its models/ and data/ output) and return per-stage timings.
+    """
+    path = write_csv(os.path.join(directory, 'train.csv'), rows, seed=2)
+    for name in ('models', 'data'):
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+    timings_path = os.path.join(directory, 'timings.json')
+    command = [sys.executable, script, '--data', path, '--no-cache', '--timings', timings_path]
+    if workers:
+        command += ['--workers', str(workers)]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=directory, capture_output=True, text=True,
+                               env={**os.environ, 'MPLBACKEND': 'Agg'})
+    seconds = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"data_pipeline.py failed:\n{completed.stderr[-2000:]}")
+    with open(timings_path) as f:
+        timings = json.load(f)
+    results = {'pipeline.total': {'rows': rows, 'seconds': seconds, 'peak_rss_mb': timings['peak_rss_mb']}}
+    for stage, stage_seconds in timings['stages'].items():
+        results[f'pipeline.{stage}'] = {'seconds': stage_seconds}
+    for model, fit_seconds in timings.get('fit_wall', {}).items():
+        results[f'pipeline.fit.{model}'] = {'seconds': fit_seconds}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Rows of (name, metric, baseline, current, change, regressed) for every
+    directional metric present in both runs. ``change`` is relative, positive
+    when the current run is worse.
+    """
+    rows = []
+    for name, metrics in results.items():
+        for metric, current in metrics.items():
+            previous = baseline.get(name, {}).get(metric)
+            if previous is None or not previous:
+                continue
+            if metric.endswith(LOWER_IS_BETTER):
+                change = (current - previous) / previous
+            elif metric.endswith(HIGHER_IS_BETTER):
+                change = (previous - current) / previous
+            else:
+                continue
+            rows.append((name, metric, previous, current, change, change > tolerance))
+    return rows
+
+
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'cpu_count': os.cpu_count(),
+        'database': connection.vendor,
+    }
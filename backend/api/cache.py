@@ -0,0 +1,116 @@
+"""
+Response cache for the analytics endpoints.
+
+Cached payloads are keyed by endpoint name and a data version that is bumped
+whenever PredictionResult rows are written (see ``rollups.record``), so a
+write invalidates every cached aggregate at once. Each entry carries an ETag
+computed from its JSON body so unchanged dashboards can revalidate with
+If-None-Match and get a 304.
+
+The cache alias comes from ``ANALYTICS_CACHE_ALIAS``. With the per-process
+local-memory backend a write only bumps the version in its own process and
+other workers can serve data up to ``ANALYTICS_CACHE_TIMEOUT`` seconds old;
+the file backend shares versions and entries between processes.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .metrics import Counter
+
+VERSION_KEY = 'analytics:version'
+
+
+def _etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return '"%s"' % hashlib.md5(body).hexdigest()
+
+
+def _initial_version():
+    # Not 1: a version key that was evicted must not resurrect old entries
+    return time.time_ns()
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return '*' in candidates or etag in [tag[2:] if tag.startswith('W/') else tag for tag in candidates]
+
+
+class AnalyticsCache:
+
+    def __init__(self):
+        self.hits = Counter('analytics_cache_hits_total', 'Analytics responses served from cache')
+        self.misses = Counter('analytics_cache_misses_total', 'Analytics responses recomputed')
+        self.not_modified = Counter('analytics_cache_not_modified_total', 'Analytics requests answered 304')
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 60)
+
+    def version(self):
+        return self.cache.get_or_set(VERSION_KEY, _initial_version, timeout=None)
+
+    async def aversion(self):
+        return await self.cache.aget_or_set(VERSION_KEY, _initial_version, timeout=None)
+
+    def bump(self):
+        """Invalidate every cached aggregate. Called after PredictionResult writes commit."""
+        try:
+            self.cache.incr(VERSION_KEY)
+        except ValueError:
+            self.cache.set(VERSION_KEY, _initial_version(), timeout=None)
+
+    def _key(self, name, version):
+        return f'analytics:{name}:{version}'
+
+    def get_or_compute(self, name, compute):
+        """Return (etag, data) for an endpoint, computing and caching it on a miss."""
+        key = self._key(name, self.version())
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.hits.inc()
+            return entry
+        self.misses.inc()
+        data = compute()
+        entry = (_etag(data), data)
+        self.cache.set(key, entry, self.timeout)
+        return entry
+
+    async def aget_or_compute(self, name, acompute):
+        key = self._key(name, await self.aversion())
+        entry = await self.cache.aget(key)
+        if entry is not None:
+            self.hits.inc()
+            return entry
+        self.misses.inc()
+        data = await acompute()
+        entry = (_etag(data), data)
+        await self.cache.aset(key, entry, self.timeout)
+        return entry
+
+    def stats(self):
+        hits, misses = self.hits.value, self.misses.value
+        return {
+            'alias': getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'default'),
+            'timeout': self.timeout,
+            'version': self.version(),
+            'hits': hits,
+            'misses': misses,
+            'not_modified': self.not_modified.value,
+            'hit_ratio': hits / (hits + misses) if hits + misses else None,
+        }
+
+
+analytics_cache = AnalyticsCache()
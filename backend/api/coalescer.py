@@ -0,0 +1,191 @@
+"""
+Micro-batching for single-row predictions.
+
+Concurrent ``/api/async/predict/`` calls each hand an encoded row to the
+coalescer and await a future. A background thread collects rows for up to
+``PREDICTION_COALESCE_WINDOW_MS`` or ``PREDICTION_COALESCE_MAX_BATCH`` rows,
+scores them with one vectorized ``model.predict`` per model (global or
+segment, see segments.py) and resolves every caller's future with its own
+value. Futures are ``concurrent.futures.Future`` so async views can await
+them with ``asyncio.wrap_future``.
+
+Only the async view uses it. Sync views (WSGI sync workers, or DRF views
+under ASGI, which Django runs one at a time on its thread-sensitive
+executor) reach it one request at a time, so every row would wait out the
+window alone in a batch of one.
+
+Rows queued or being scored count against
+``PREDICTION_COALESCE_MAX_PENDING``; past it ``submit`` raises PoolSaturated
+and the view answers 503. The async view's inference-pool slot is released
+as soon as the row is queued, so this is what bounds its backlog.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+from .metrics import Histogram
+from .pool import PoolSaturated
+from .predictor import predict_matrix
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+class PredictionCoalescer:
+
+    def __init__(self, window_ms=None, max_batch=None, max_pending=None):
+        self._window_ms = window_ms
+        self._max_batch = max_batch
+        self._max_pending = max_pending
+        self._pending = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.batch_size = Histogram(
+            'prediction_coalesced_batch_size',
+            'Rows scored per coalesced model.predict call',
+            BATCH_SIZE_BUCKETS,
+        )
+        self.queue_wait = Histogram(
+            'prediction_coalesce_queue_wait_seconds',
+            'Time a row waited in the coalescer before being scored',
+            QUEUE_WAIT_BUCKETS,
+        )
+
+    @property
+    def window(self):
+        window_ms = self._window_ms
+        if window_ms is None:
+            window_ms = getattr(settings, 'PREDICTION_COALESCE_WINDOW_MS', 2.0)
+        return window_ms / 1000.0
+
+    @property
+    def max_batch(self):
+        if self._max_batch is None:
+            return getattr(settings, 'PREDICTION_COALESCE_MAX_BATCH', 64)
+        return self._max_batch
+
+    @property
+    def max_pending(self):
+        if self._max_pending is None:
+            return getattr(settings, 'PREDICTION_COALESCE_MAX_PENDING', 256)
+        return self._max_pending
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _ensure_worker(self):
+        # Restart the worker after a fork; threads do not survive it.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pending = 0
+            self._thread = threading.Thread(
+                target=self._run, name='prediction-coalescer', daemon=True
+            )
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def submit(self, bundle, row, segment=None):
+        """
+        Queue one encoded feature row for the global model or the model of
+        ``segment``. Returns a Future resolving to its prediction. Raises
+        PoolSaturated when ``max_pending`` rows are already waiting.
+        """
+        self._ensure_worker()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolSaturated(f"{self._pending} coalesced predictions already pending")
+            self._pending += 1
+        future = Future()
+        future.add_done_callback(self._release)
+        self._queue.put((bundle, row, segment, future, time.perf_counter()))
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def _collect(self):
+        items = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        max_batch = self.max_batch
+        while len(items) < max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            started = time.perf_counter()
+            for *_, enqueued in items:
+                self.queue_wait.observe(started - enqueued)
+
+            # A hot reload may land mid-window; score each bundle separately.
+            groups = {}
+            for item in items:
+                groups.setdefault(id(item[0]), []).append(item)
+            for group in groups.values():
+                try:
+                    self._score(group)
+                except Exception as e:
+                    # Never let one batch kill the thread every later caller waits on
+                    logger.exception("Coalesced batch failed")
+                    for _, _, _, future, _ in group:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def _score(self, group):
+        # A caller whose request was dropped (e.g. the client disconnected)
+        # has cancelled its future; skip its row rather than resolve it.
+        group = [item for item in group if item[3].set_running_or_notify_cancel()]
+        if not group:
+            return
+        bundle = group[0][0]
+        futures = [future for _, _, _, future, _ in group]
+        self.batch_size.observe(len(group))
+        try:
+            # One predict call per model among the collected rows
+            predictions = predict_matrix(bundle, np.vstack([row for _, row, _, _, _ in group]),
+                                         [segment for _, _, segment, _, _ in group])
+        except Exception as e:
+            logger.exception("Coalesced prediction failed")
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, value in zip(futures, predictions):
+            future.set_result(float(value))
+
+    def stats(self):
+        return {
+            'enabled': getattr(settings, 'PREDICTION_COALESCE', False),
+            'window_ms': self.window * 1000.0,
+            'max_batch': self.max_batch,
+            'max_pending': self.max_pending,
+            'pending': self._pending,
+            'queue_depth': self._queue.qsize(),
+            'batch_size': self.batch_size.snapshot(),
+            'queue_wait_seconds': self.queue_wait.snapshot(),
+        }
+
+
+coalescer = PredictionCoalescer()
@@ -0,0 +1,203 @@
+"""
+Market history as a month-partitioned Parquet dataset.
+
+Layout: ``<root>/month=YYYY-MM/part-<stamp>.parquet``. Rows use the column
+names of retail_store_inventory.csv, so a scan returns the same frame
+``pipeline.data.read_csv`` does. Date is a date32, the categoricals are
+dictionary-encoded strings and the numeric columns float64, the precision
+MarketData and the CSV reader hold them in. Each file is sorted by date,
+store and product, so its row-group statistics let date filters skip whole
+row groups.
+
+Appending never rewrites data: every export adds one new file to each
+month it touches. ``replace_month`` rewrites a whole month instead, for
+corrected rows. A scan reads only the requested columns. It prunes by
+``month`` and by row-group statistics before decoding anything, and it
+memory-maps the files instead of reading them into buffers.
+
+Like features.py this module must not import Django, so data_pipeline.py
+can read the dataset. pyarrow is optional: without it ``HAS_ARROW`` is
+False and the functions here raise ImportError.
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import date, datetime, timezone
+
+from .features import CATEGORICAL_FEATURES, DATE, NUMERIC_FEATURES, TARGET
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from pyarrow import fs
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+PARTITION = 'month'
+HISTORY_COLUMNS = [DATE] + CATEGORICAL_FEATURES + NUMERIC_FEATURES + [TARGET]
+ROW_GROUP_SIZE = 100000
+
+
+def require_arrow():
+    if not HAS_ARROW:
+        raise ImportError("The Parquet market history needs pyarrow (pip install pyarrow)")
+
+
+def schema():
+    require_arrow()
+    fields = [pa.field(DATE, pa.date32())]
+    fields += [pa.field(column, pa.dictionary(pa.int32(), pa.string())) for column in CATEGORICAL_FEATURES]
+    fields += [pa.field(column, pa.float64()) for column in NUMERIC_FEATURES + [TARGET]]
+    return pa.schema(fields)
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([(PARTITION, pa.string())]), flavor='hive')
+
+
+def _month(value):
+    return f'{value.year:04d}-{value.month:02d}'
+
+
+def to_table(frame):
+    """A pandas frame with the CSV columns as an Arrow table in the history schema, sorted by date."""
+    require_arrow()
+    frame = frame.sort_values([DATE, 'Store ID', 'Product ID'], kind='stable')
+    arrays = []
+    for field in schema():
+        values = frame[field.name]
+        if field.name == DATE:
+            arrays.append(pa.array(values.to_numpy(dtype='datetime64[D]'), type=pa.date32()))
+        elif pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values.astype(str).to_numpy(), type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values.to_numpy(dtype='float64'), type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema())
+
+
+def append(root, frame, row_group_size=ROW_GROUP_SIZE):
+    """
+    Add ``frame``'s rows to the dataset, one new file per month they cover.
+    Existing files are never touched. Returns the paths written.
+    """
+    table = to_table(frame)
+    if not table.num_rows:
+        return []
+    months = pc.strftime(table[DATE], format='%Y-%m')
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    paths = []
+    for month in pc.unique(months).to_pylist():
+        part = table.filter(pc.equal(months, month))
+        directory = os.path.join(root, f'{PARTITION}={month}')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'part-{stamp}-{uuid.uuid4().hex[:8]}.parquet')
+        # Written under a dot-name scans ignore, then renamed into place
+        staging = os.path.join(directory, f'.{os.path.basename(path)}.tmp')
+        pq.write_table(part, staging, row_group_size=row_group_size, use_dictionary=True,
+                       compression='zstd', write_statistics=True)
+        os.replace(staging, path)
+        paths.append(path)
+    return paths
+
+
+def replace_month(root, month, frame, row_group_size=ROW_GROUP_SIZE):
+    """
+    Replace every file of ``month`` ('YYYY-MM') with ``frame``'s rows, which
+    must all fall in that month. The new files are written to a staging
+    directory scans ignore and swapped in by two renames. Returns the paths.
+    """
+    staging = os.path.join(root, f'.staging-{uuid.uuid4().hex[:8]}')
+    retired = os.path.join(root, f'.{PARTITION}={month}.old-{uuid.uuid4().hex[:8]}')
+    target = os.path.join(root, f'{PARTITION}={month}')
+    try:
+        written = append(staging, frame, row_group_size)
+        if os.path.isdir(target):
+            os.replace(target, retired)
+        staged = os.path.join(staging, f'{PARTITION}={month}')
+        if os.path.isdir(staged):
+            os.replace(staged, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        shutil.rmtree(retired, ignore_errors=True)
+    return [os.path.join(target, os.path.basename(path)) for path in written]
+
+
+def files(root):
+    """Every data file of the dataset, sorted."""
+    found = []
+    if not os.path.isdir(root):
+        return found
+    for directory, subdirectories, names in os.walk(root):
+        # Staging and retired months are dot-directories
+        subdirectories[:] = [name for name in subdirectories if not name.startswith('.')]
+        found.extend(os.path.join(directory, name) for name in names
+                     if name.endswith('.parquet') and not name.startswith('.'))
+    return sorted(found)
+
+
+def signature(root):
+    """SHA-256 over every file's name, size and mtime: changes whenever data is appended."""
+    digest = hashlib.sha256()
+    for path in files(root):
+        stat = os.stat(path)
+        digest.update(f'{os.path.relpath(path, root)}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+
+def last_date(root):
+    """The newest Date in the dataset, read from the footer statistics of the newest month only."""
+    require_arrow()
+    months = sorted(name for name in (os.listdir(root) if os.path.isdir(root) else ())
+                    if name.startswith(f'{PARTITION}='))
+    for month in reversed(months):
+        newest = None
+        for path in files(os.path.join(root, month)):
+            metadata = pq.ParquetFile(path).metadata
+            column = metadata.schema.names.index(DATE)
+            for i in range(metadata.num_row_groups):
+                statistics = metadata.row_group(i).column(column).statistics
+                if statistics is not None and statistics.has_min_max:
+                    newest = statistics.max if newest is None else max(newest, statistics.max)
+        if newest is not None:
+            return newest
+    return None
+
+
+def _filter(start, end, where):
+    expression = None
+    terms = []
+    if start is not None:
+        terms += [ds.field(PARTITION) >= _month(start), ds.field(DATE) >= pa.scalar(start, pa.date32())]
+    if end is not None:
+        terms += [ds.field(PARTITION) <= _month(end), ds.field(DATE) <= pa.scalar(end, pa.date32())]
+    for column, value in (where or {}).items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        terms.append(ds.field(column).isin([str(v) for v in values]))
+    for term in terms:
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def read(root, columns=None, start=None, end=None, where=None):
+    """
+    Scan the dataset into a pandas frame. ``columns`` projects (all history
+    columns by default), ``start``/``end`` are inclusive dates and ``where``
+    maps categorical columns to a value or list of values to keep, e.g.
+    ``{'Region': ['North', 'East']}``. Categoricals come back as pandas
+    categoricals and Date as datetime64.
+    """
+    require_arrow()
+    if isinstance(start, str):
+        start = date.fromisoformat(start)
+    if isinstance(end, str):
+        end = date.fromisoformat(end)
+    # The explicit schema casts files written before the numeric columns
+    # were float64 up on read, rather than failing to unify the two
+    dataset = ds.dataset(root, schema=schema().append(pa.field(PARTITION, pa.string())), format='parquet',
+                         partitioning=_partitioning(), filesystem=fs.LocalFileSystem(use_mmap=True))
+    table = dataset.to_table(columns=list(columns or HISTORY_COLUMNS), filter=_filter(start, end, where))
+    return table.to_pandas(date_as_object=False, split_blocks=True, self_destruct=True)
@@ -0,0 +1,294 @@
+"""
+Feature encoding shared by training (data_pipeline.py) and serving (views.py).
+
+The design matrix layout is the one ``pd.get_dummies(df, columns=CATEGORICAL_FEATURES,
+drop_first=True)`` produces in data_pipeline.py: the numeric features, then one
+column per non-baseline level of each categorical feature, then the date parts.
+``FeatureEncoder`` compiles that layout once into index lookups so a request
+can be written straight into a preallocated NumPy row without pandas.
+
+This module must not import Django or pandas so data_pipeline.py can use it.
+"""
+import re
+
+import numpy as np
+
+TARGET = 'Units Sold'
+DATE = 'Date'
+
+NUMERIC_FEATURES = [
+    'Inventory Level',
+    'Units Ordered',
+    'Demand Forecast',
+    'Price',
+    'Discount',
+    'Competitor Pricing',
+]
+
+CATEGORICAL_FEATURES = [
+    'Store ID',
+    'Product ID',
+    'Category',
+    'Region',
+    'Weather Condition',
+    'Holiday/Promotion',
+    'Seasonality',
+]
+
+DATE_FEATURES = ['Day', 'Month', 'Year']
+
+# PredictionRequestSerializer field -> training column
+REQUEST_FIELDS = {
+    'store_id': 'Store ID',
+    'product_id': 'Product ID',
+    'category': 'Category',
+    'region': 'Region',
+    'inventory_level': 'Inventory Level',
+    'units_ordered': 'Units Ordered',
+    'demand_forecast': 'Demand Forecast',
+    'price': 'Price',
+    'discount': 'Discount',
+    'weather_condition': 'Weather Condition',
+    'holiday_promotion': 'Holiday/Promotion',
+    'competitor_pricing': 'Competitor Pricing',
+    'seasonality': 'Seasonality',
+}
+FEATURE_FIELDS = {column: field for field, column in REQUEST_FIELDS.items()}
+
+_BOOLEAN_WORDS = {'true': 1, 'yes': 1, 'false': 0, 'no': 0}
+_DIGITS = re.compile(r'\d+')
+
+
+def date_parts(dates):
+    """Vectorized (day, month, year) for anything coercible to datetime64[D]."""
+    days = np.asarray(dates, dtype='datetime64[D]')
+    months = days.astype('datetime64[M]')
+    day = (days - months).astype(np.int64) + 1
+    month = months.astype(np.int64) % 12 + 1
+    year = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    return day, month, year
+
+
+def _sorted_levels(levels):
+    """
+    Levels as strings, in the order ``pd.get_dummies`` gives their columns:
+    by value when every level is a number (an integer-typed column), else as
+    strings (a string or categorical column read from the CSV).
+    """
+    levels = list(levels)
+    if all(isinstance(level, (int, float, np.integer, np.floating)) for level in levels):
+        levels = sorted(levels)
+    else:
+        levels = sorted(str(level) for level in levels)
+    return [str(level) for level in levels]
+
+
+def _numeric_key(value):
+    """Integer key used to match e.g. store_id=2 or 'yes(1)' against 'S002' / '1'."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    text = str(value).strip().lower()
+    if text in _BOOLEAN_WORDS:
+        return _BOOLEAN_WORDS[text]
+    match = _DIGITS.search(text)
+    if match:
+        return int(match.group())
+    return None
+
+
+class FeatureEncoder:
+    """
+    Compiled mapping from raw features to the trained column layout.
+
+    Build it with ``FeatureEncoder(columns)`` from the saved ``columns.pkl``
+    list, or with ``FeatureEncoder.fit(frame)`` from a training frame.
+    Categorical values that are the dropped baseline level or unknown encode
+    as all zeros, exactly like ``get_dummies(drop_first=True)`` followed by a
+    reindex to the training columns.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.n_features = len(self.columns)
+        position = {column: i for i, column in enumerate(self.columns)}
+
+        missing = [c for c in NUMERIC_FEATURES + DATE_FEATURES if c not in position]
+        if missing:
+            raise ValueError(f"Columns are missing required features: {missing}")
+
+        self.numeric_index = np.array([position[c] for c in NUMERIC_FEATURES], dtype=np.intp)
+        self.date_index = np.array([position[c] for c in DATE_FEATURES], dtype=np.intp)
+
+        # feature -> {level: column index}, plus a numeric-key lookup so
+        # integer ids and flag strings from the API map onto the same levels.
+        self.levels = {feature: {} for feature in CATEGORICAL_FEATURES}
+        self.numeric_levels = {feature: {} for feature in CATEGORICAL_FEATURES}
+        for feature in CATEGORICAL_FEATURES:
+            prefix = feature + '_'
+            for column, i in position.items():
+                if column.startswith(prefix):
+                    level = column[len(prefix):]
+                    self.levels[feature][level] = i
+                    key = _numeric_key(level)
+                    if key is not None:
+                        self.numeric_levels[feature].setdefault(key, i)
+
+        covered = set(self.numeric_index) | set(self.date_index)
+        covered.update(i for levels in self.levels.values() for i in levels.values())
+        unexpected = [c for i, c in enumerate(self.columns) if i not in covered]
+        if unexpected:
+            raise ValueError(f"Columns cannot be produced by the encoder: {unexpected}")
+
+    @classmethod
+    def from_levels(cls, levels):
+        """
+        Build the column layout from {feature: levels}. Levels are sorted the
+        way get_dummies sorts them (see ``_sorted_levels``) and the first is
+        dropped, so integer levels must be passed as numbers, not strings.
+        """
+        columns = list(NUMERIC_FEATURES)
+        for feature in CATEGORICAL_FEATURES:
+            columns.extend(f"{feature}_{level}" for level in _sorted_levels(levels[feature])[1:])
+        columns.extend(DATE_FEATURES)
+        return cls(columns)
+
+    @classmethod
+    def fit(cls, frame):
+        """Derive the column layout from a training frame."""
+        levels = {}
+        for feature in CATEGORICAL_FEATURES:
+            values = np.asarray(frame[feature])
+            if values.dtype.kind not in 'biuf':
+                values = values.astype(str)
+            levels[feature] = np.unique(values).tolist()
+        return cls.from_levels(levels)
+
+    def category_index(self, feature, value):
+        """Column index for a categorical value, or None for the baseline / unknown levels."""
+        levels = self.levels[feature]
+        index = levels.get(str(value).strip())
+        if index is not None:
+            return index
+        key = _numeric_key(value)
+        if key is None:
+            return None
+        return self.numeric_levels[feature].get(key)
+
+    def encode(self, data, out=None):
+        """
+        Encode one validated request dict (PredictionRequestSerializer fields)
+        into a row of the design matrix. ``out`` may be a preallocated row.
+        """
+        if out is None:
+            out = np.zeros(self.n_features, dtype=np.float64)
+        else:
+            out.fill(0.0)
+
+        for feature, i in zip(NUMERIC_FEATURES, self.numeric_index):
+            out[i] = data[FEATURE_FIELDS[feature]]
+
+        for feature in CATEGORICAL_FEATURES:
+            index = self.category_index(feature, data[FEATURE_FIELDS[feature]])
+            if index is not None:
+                out[index] = 1.0
+
+        date = data['date']
+        out[self.date_index[0]] = date.day
+        out[self.date_index[1]] = date.month
+        out[self.date_index[2]] = date.year
+        return out
+
+    def encode_many(self, rows):
+        """Encode a sequence of request dicts into one (n, n_features) matrix."""
+        matrix = np.zeros((len(rows), self.n_features), dtype=np.float64)
+        for row, data in zip(matrix, rows):
+            self.encode(data, out=row)
+        return matrix
+
+    def encode_series(self, data, dates):
+        """
+        Encode one request dict whose fields are each either a single value
+        or a sequence with one value per entry of ``dates`` into an
+        (len(dates), n_features) matrix. The date parts come from ``dates``.
+        """
+        n_rows = len(dates)
+        matrix = np.zeros((n_rows, self.n_features), dtype=np.float64)
+        for feature, i in zip(NUMERIC_FEATURES, self.numeric_index):
+            matrix[:, i] = data[FEATURE_FIELDS[feature]]
+
+        rows = np.arange(n_rows)
+        for feature in CATEGORICAL_FEATURES:
+            value = data[FEATURE_FIELDS[feature]]
+            if not isinstance(value, (list, tuple, np.ndarray)):
+                index = self.category_index(feature, value)
+                if index is not None:
+                    matrix[:, index] = 1.0
+                continue
+            uniques, inverse = np.unique(np.asarray(value).astype(str), return_inverse=True)
+            indexes = (self.category_index(feature, level) for level in uniques)
+            lookup = np.array([-1 if index is None else index for index in indexes], dtype=np.intp)
+            targets = lookup[inverse.ravel()]
+            hit = targets >= 0
+            matrix[rows[hit], targets[hit]] = 1.0
+
+        day, month, year = date_parts(dates)
+        matrix[:, self.date_index[0]] = day
+        matrix[:, self.date_index[1]] = month
+        matrix[:, self.date_index[2]] = year
+        return matrix
+
+    def _frame_parts(self, frame):
+        """
+        Split a training frame into its dense block (numeric features and
+        date parts, with their column indexes) and the (row, column)
+        coordinates of its one-hot entries.
+        """
+        n_rows = len(frame)
+        dense_index = np.concatenate([self.numeric_index, self.date_index])
+        dense = np.empty((n_rows, len(dense_index)), dtype=np.float64)
+        for j, feature in enumerate(NUMERIC_FEATURES):
+            dense[:, j] = np.asarray(frame[feature], dtype=np.float64)
+        day, month, year = date_parts(np.asarray(frame[DATE], dtype='datetime64[D]'))
+        dense[:, len(NUMERIC_FEATURES)] = day
+        dense[:, len(NUMERIC_FEATURES) + 1] = month
+        dense[:, len(NUMERIC_FEATURES) + 2] = year
+
+        rows = np.arange(n_rows)
+        hot_rows = [np.empty(0, dtype=np.intp)]
+        hot_cols = [np.empty(0, dtype=np.intp)]
+        for feature in CATEGORICAL_FEATURES:
+            levels = self.levels[feature]
+            if not levels:
+                continue
+            uniques, inverse = np.unique(np.asarray(frame[feature]).astype(str), return_inverse=True)
+            lookup = np.array([levels.get(level, -1) for level in uniques], dtype=np.intp)
+            targets = lookup[inverse.ravel()]
+            hit = targets >= 0
+            hot_rows.append(rows[hit])
+            hot_cols.append(targets[hit])
+        return dense, dense_index, np.concatenate(hot_rows), np.concatenate(hot_cols)
+
+    def transform_frame(self, frame):
+        """
+        Vectorized encoding of a training frame with the raw CSV column names
+        (numeric features, categorical features and ``Date``).
+        """
+        dense, dense_index, hot_rows, hot_cols = self._frame_parts(frame)
+        matrix = np.zeros((len(frame), self.n_features), dtype=np.float64)
+        matrix[:, dense_index] = dense
+        matrix[hot_rows, hot_cols] = 1.0
+        return matrix
+
+    def transform_frame_sparse(self, frame):
+        """Like ``transform_frame`` but returns a CSR matrix holding only the non-zero one-hots."""
+        # Only the chunked trainer needs scipy; serving imports this module
+        from scipy import sparse
+
+        dense, dense_index, hot_rows, hot_cols = self._frame_parts(frame)
+        n_rows = len(frame)
+        rows = np.concatenate([np.repeat(np.arange(n_rows), len(dense_index)), hot_rows])
+        cols = np.concatenate([np.tile(dense_index, n_rows), hot_cols])
+        data = np.concatenate([dense.ravel(), np.ones(len(hot_rows))])
+        return sparse.csr_matrix((data, (rows, cols)), shape=(n_rows, self.n_features))
@@ -0,0 +1,96 @@
+"""
+Forecast horizons for one store/product.
+
+A request covers a date range with exogenous inputs that are either fixed
+or given per day. The whole range is encoded in one vectorized pass
+(``FeatureEncoder.encode_series``) and scored with a single predict call.
+Forecasts are not stored as PredictionResult rows.
+
+Responses are cached under (model version, hash of the validated inputs),
+so a repeated dashboard request is a cache lookup and a new model version
+never serves an old forecast.
+"""
+import hashlib
+import json
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .instrumentation import stage
+from .metrics import Counter
+from .predictor import predict_matrix
+from .segments import segment_models
+
+
+def forecast_dates(start, end):
+    """Every day from start to end inclusive, as datetime64[D]."""
+    return np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+
+
+def inputs_hash(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return hashlib.sha256(body).hexdigest()
+
+
+def forecast(bundle, data):
+    dates = forecast_dates(data['start_date'], data['end_date'])
+    with stage('encode'):
+        matrix = bundle.encoder.encode_series(data, dates)
+    # region and category are fixed over the horizon: one segment for every day
+    segment, = segment_models.routes(bundle, [data])
+    predictions = predict_matrix(bundle, matrix, [segment] * len(matrix))
+    return {
+        "model_version": bundle.version,
+        "store_id": data['store_id'],
+        "product_id": data['product_id'],
+        "start_date": data['start_date'].isoformat(),
+        "end_date": data['end_date'].isoformat(),
+        "days": len(dates),
+        "total_predicted_sales": float(predictions.sum()),
+        "forecast": [
+            {"date": day, "predicted_sales": value}
+            for day, value in zip(np.datetime_as_string(dates).tolist(), predictions.tolist())
+        ],
+    }
+
+
+class ForecastCache:
+
+    def __init__(self):
+        self.hits = Counter('forecast_cache_hits_total', 'Forecasts served from cache')
+        self.misses = Counter('forecast_cache_misses_total', 'Forecasts computed')
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'FORECAST_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'FORECAST_CACHE_TIMEOUT', 3600)
+
+    def get_or_compute(self, bundle, data):
+        """Return (cached, payload) for a validated forecast request."""
+        key = f'forecast:{bundle.version}:{inputs_hash(data)}'
+        payload = self.cache.get(key)
+        if payload is not None:
+            self.hits.inc()
+            return True, payload
+        self.misses.inc()
+        payload = forecast(bundle, data)
+        self.cache.set(key, payload, self.timeout)
+        return False, payload
+
+    def stats(self):
+        hits, misses = self.hits.value, self.misses.value
+        return {
+            'alias': getattr(settings, 'FORECAST_CACHE_ALIAS', 'default'),
+            'timeout': self.timeout,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else None,
+        }
+
+
+forecast_cache = ForecastCache()
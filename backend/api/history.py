@@ -0,0 +1,134 @@
+"""
+Export of MarketData to the Parquet market history (see columnar.py).
+
+``export`` appends every day newer than the newest day already in the
+dataset, one month at a time so memory stays bounded. It also rewrites,
+whole, every exported month holding a row created or updated since the
+previous export (``MarketData.updated_at``): an actual corrected through
+POST /api/actuals/, or a late row for a day that was already exported.
+The time of each export is kept in ``_export.json`` at the dataset root.
+Deleted MarketData rows leave the history only on a rebuild.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from . import columnar
+from .models import MarketData
+
+STATE_FILE = '_export.json'
+# updated_at is set when a row is built, before its transaction commits, so
+# a row committed just after an export started can carry an earlier time
+WATERMARK_SLACK = timedelta(minutes=5)
+
+# CSV column -> MarketData field, in history column order
+FIELDS = {
+    'Date': 'date',
+    'Store ID': 'store_id',
+    'Product ID': 'product_id',
+    'Category': 'category',
+    'Region': 'region',
+    'Weather Condition': 'weather_condition',
+    'Holiday/Promotion': 'holiday_promotion',
+    'Seasonality': 'seasonality',
+    'Inventory Level': 'inventory_level',
+    'Units Ordered': 'units_ordered',
+    'Demand Forecast': 'demand_forecast',
+    'Price': 'price',
+    'Discount': 'discount',
+    'Competitor Pricing': 'competitor_pricing',
+    'Units Sold': 'units_sold',
+}
+
+
+def history_dir():
+    return str(getattr(settings, 'MARKET_HISTORY_DIR', settings.BASE_DIR.parent / 'data' / 'market_history'))
+
+
+def market_frame(queryset):
+    """MarketData rows as a frame with the CSV's column names and id formats ('S001', 'P0001')."""
+    rows = list(queryset.order_by().values_list(*FIELDS.values()))
+    frame = pd.DataFrame(rows, columns=list(FIELDS))
+    if not rows:
+        return frame
+    # import_data parsed the numbers out of these; restore the CSV spelling
+    # so the trained column names match the ones built from the CSV
+    frame['Store ID'] = np.char.add('S', np.char.zfill(frame['Store ID'].to_numpy().astype(str), 3))
+    frame['Product ID'] = np.char.add('P', np.char.zfill(frame['Product ID'].to_numpy().astype(str), 4))
+    return frame
+
+
+def _exported_at(root):
+    try:
+        with open(os.path.join(root, STATE_FILE)) as f:
+            return datetime.fromisoformat(json.load(f)['exported_at'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_state(root, exported_at):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'exported_at': exported_at.isoformat()}, f)
+    os.replace(path + '.tmp', path)
+
+
+def _month_rows(month):
+    return MarketData.objects.filter(date__year=month.year, date__month=month.month)
+
+
+def export(root=None, since=None, rebuild=False):
+    """
+    Bring the dataset at ``root`` up to date with MarketData: rewrite the
+    exported months changed since the previous export, then append the
+    days after ``since`` (default: the newest day already exported). A
+    dataset without an export time is only appended to. ``rebuild`` writes
+    the whole table to a fresh dataset and swaps it in. Returns (rows,
+    files) written.
+    """
+    root = root or history_dir()
+    started = timezone.now()
+    target = f'{root}.rebuild' if rebuild else root
+    rewrite = []
+    if rebuild:
+        shutil.rmtree(target, ignore_errors=True)
+        since = None
+    else:
+        newest = columnar.last_date(root)
+        exported_at = _exported_at(root)
+        if exported_at is not None and newest is not None:
+            changed = MarketData.objects.filter(updated_at__gte=exported_at - WATERMARK_SLACK, date__lte=newest)
+            rewrite = list(changed.dates('date', 'month'))
+        if since is None:
+            since = newest
+
+    rows, files = 0, 0
+    for month in rewrite:
+        frame = market_frame(_month_rows(month))
+        files += len(columnar.replace_month(target, f'{month.year:04d}-{month.month:02d}', frame))
+        rows += len(frame)
+
+    queryset = MarketData.objects.all()
+    if since is not None:
+        queryset = queryset.filter(date__gt=since)
+    for month in queryset.dates('date', 'month'):
+        if month in rewrite:
+            # Its new days were written with the rest of the month
+            continue
+        frame = market_frame(queryset.filter(date__year=month.year, date__month=month.month))
+        files += len(columnar.append(target, frame))
+        rows += len(frame)
+    _write_state(target, started)
+
+    if rebuild:
+        shutil.rmtree(root, ignore_errors=True)
+        if os.path.isdir(target):
+            os.replace(target, root)
+    return rows, files
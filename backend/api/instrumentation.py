@@ -0,0 +1,45 @@
+"""
+Metrics for the prediction and analytics hot paths.
+
+``stage(name)`` times one step of a request (validate, encode, transform,
+predict, save, analytics_query) into ``api_stage_seconds``; the request
+totals are recorded by ``middleware.MetricsMiddleware``. Everything here is
+exported on /api/metrics/ together with the coalescer, write-behind, cache
+and memo metrics.
+"""
+import time
+from contextlib import contextmanager
+
+from .metrics import Counter, Family, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+BATCH_ROWS_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+
+requests = Family(Counter, 'api_requests_total', 'HTTP requests by view, method and status',
+                  ['view', 'method', 'status'])
+request_errors = Family(Counter, 'api_request_errors_total', 'Requests answered with a 5xx status', ['view'])
+request_seconds = Family(Histogram, 'api_request_seconds', 'Request latency by view', ['view'],
+                         buckets=LATENCY_BUCKETS)
+stage_seconds = Family(Histogram, 'api_stage_seconds', 'Time spent in each request stage', ['stage'],
+                       buckets=STAGE_BUCKETS)
+batch_rows = Histogram('prediction_batch_rows', 'Rows scored per model.predict call', BATCH_ROWS_BUCKETS)
+model_info = Family(Gauge, 'prediction_model_info', 'The loaded model (always 1)', ['version', 'artifact'])
+model_load_seconds = Gauge('prediction_model_load_seconds', 'Time taken to load the current model')
+
+
+@contextmanager
+def stage(name):
+    histogram = stage_seconds.labels(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started)
+
+
+def record_model(bundle):
+    """Point prediction_model_info at a newly loaded bundle."""
+    model_info.clear()
+    model_info.labels(bundle.version, bundle.artifact).set(1)
+    model_load_seconds.set(bundle.load_seconds)
@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from api import actuals
+
+
+class Command(BaseCommand):
+    help = 'Copy MarketData.units_sold onto PredictionResult.actual_sales by store, product and date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='Prediction ids updated per transaction')
+        parser.add_argument('--date-from', type=date.fromisoformat, default=None,
+                            help='Only predictions dated on or after this date')
+        parser.add_argument('--date-to', type=date.fromisoformat, default=None,
+                            help='Only predictions dated on or before this date')
+
+    def handle(self, *args, **options):
+        def progress(high, max_id, updated):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  up to id {high}/{max_id}: {updated} updated')
+
+        updated = actuals.backfill(options['batch_size'], options['date_from'], options['date_to'], progress)
+        self.stdout.write(self.style.SUCCESS(f'Set actual_sales on {updated} predictions'))
@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from api import benchmarks
+from api.registry import registry
+from api.synthetic import prediction_requests
+
+SECTIONS = ['pipeline', 'predict', 'analytics', 'import']
+
+
+def _ints(value):
+    return [int(part) for part in value.split(',') if part]
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the training pipeline, prediction and analytics endpoints and import_data '
+            'on synthetic data in a throwaway database, and compare against a baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', default=','.join(SECTIONS),
+                            help=f'Comma-separated sections to run ({", ".join(SECTIONS)})')
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the results as JSON')
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmarks' / 'baseline.json'),
+                            help='Baseline results to compare against')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Also write the results to --baseline')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Relative slowdown reported as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit non-zero when any metric regressed beyond --tolerance')
+        parser.add_argument('--concurrency', type=_ints, default=[1, 4, 16],
+                            help='Concurrent clients for the predict benchmarks')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per predict run')
+        parser.add_argument('--analytics-rows', type=_ints, default=[10000, 1000000, 10000000],
+                            help='Prediction table sizes for the analytics benchmarks')
+        parser.add_argument('--analytics-repeats', type=int, default=50, help='Requests per analytics run')
+        parser.add_argument('--import-rows', type=int, default=100000, help='Rows in the import_data CSV')
+        parser.add_argument('--pipeline-rows', type=int, default=100000, help='Rows in the training CSV')
+        parser.add_argument('--workers', type=int, default=None, help='Workers for data_pipeline.py')
+        parser.add_argument('--quick', action='store_true',
+                            help='Small sizes for a smoke run: 100 requests, 10k analytics/import/pipeline rows')
+
+    def _section(self, title, results, run):
+        self.stdout.write(f'{title}...')
+        section = run()
+        results.update(section)
+        for name, metrics in section.items():
+            shown = ', '.join(f'{key} {value:,.2f}' if isinstance(value, float) else f'{key} {value}'
+                              for key, value in metrics.items())
+            self.stdout.write(f'  {name}: {shown}')
+
+    def _run(self, options, sections, workdir):
+        results = {}
+        model_dir = settings.MODEL_DIR
+        if 'pipeline' in sections:
+            script = settings.BASE_DIR.parent / 'data_pipeline.py'
+            self._section('Training pipeline', results, lambda: benchmarks.bench_pipeline(
+                workdir, options['pipeline_rows'], str(script), options['workers']))
+            # Serve the freshly trained model rather than whatever MODEL_DIR holds
+            model_dir = os.path.join(workdir, 'models')
+
+        if 'predict' in sections:
+            with override_settings(MODEL_DIR=model_dir):
+                registry.unload()
+                if registry.get() is None:
+                    raise CommandError(f'No model could be loaded from {model_dir}: {registry.info()["last_error"]}')
+                payloads = prediction_requests(options['requests'], seed=3)
+                for concurrency in options['concurrency']:
+                    self._section(f'predict_sales, {concurrency} concurrent (WSGI)', results, lambda: {
+                        f'predict.wsgi.c{concurrency}': benchmarks.bench_predict_wsgi(payloads, concurrency)
+                    })
+                    self._section(f'predict_sales, {concurrency} concurrent (ASGI)', results, lambda: {
+                        f'predict.asgi.c{concurrency}': benchmarks.bench_predict_asgi(payloads, concurrency)
+                    })
+            registry.unload()
+
+        if 'analytics' in sections:
+            for rows in sorted(options['analytics_rows']):
+                self._section(f'Analytics on {rows:,} predictions', results,
+                              lambda: benchmarks.bench_analytics(rows, options['analytics_repeats']))
+
+        if 'import' in sections:
+            self._section('import_data', results, lambda: benchmarks.bench_import(workdir, options['import_rows']))
+        return results
+
+    def _compare(self, results, options):
+        try:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['results']
+        except FileNotFoundError:
+            self.stdout.write(f'No baseline at {options["baseline"]}; use --save-baseline to create one')
+            return []
+        rows = benchmarks.compare(results, baseline, options['tolerance'])
+        self.stdout.write(f'\nCompared with {options["baseline"]} '
+                          f'(positive change is worse, tolerance {options["tolerance"]:.0%}):')
+        for name, metric, previous, current, change, regressed in rows:
+            line = f'  {name:<40} {metric:<14} {previous:>12,.2f} -> {current:>12,.2f} ({change:+.0%})'
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+        return [row for row in rows if row[-1]]
+
+    def handle(self, *args, **options):
+        if options['quick']:
+            options.update(requests=100, analytics_rows=[10000], analytics_repeats=20,
+                           import_rows=10000, pipeline_rows=10000)
+        sections = [section.strip() for section in options['only'].split(',') if section.strip()]
+        unknown = set(sections) - set(SECTIONS)
+        if unknown:
+            raise CommandError(f'Unknown sections: {", ".join(sorted(unknown))}')
+
+        with tempfile.TemporaryDirectory(prefix='benchmark-') as workdir:
+            # Everything the benchmarks write goes to a throwaway test database;
+            # on SQLite a file rather than memory so concurrent clients can share it.
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'benchmark.sqlite3')
+            setup_test_environment()
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                results = self._run(options, sections, workdir)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'environment': benchmarks.environment(),
+            'options': {key: options[key] for key in (
+                'only', 'concurrency', 'requests', 'analytics_rows', 'analytics_repeats',
+                'import_rows', 'pipeline_rows', 'workers',
+            )},
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=1)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+        regressions = self._compare(results, options)
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']) or '.', exist_ok=True)
+            with open(options['baseline'], 'w') as f:
+                json.dump(report, f, indent=1)
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {options["baseline"]}'))
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} metric(s) regressed by more than {options["tolerance"]:.0%}')
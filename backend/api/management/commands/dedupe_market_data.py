@@ -0,0 +1,64 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Min
+
+from api.models import MarketData
+
+# The columns MarketData had before migration 0006, so the command also runs
+# against a database that is stuck on it
+FIELDS = ['id', 'date', 'store_id', 'product_id', 'category', 'region', 'inventory_level', 'units_sold',
+          'units_ordered', 'demand_forecast', 'price', 'discount', 'weather_condition', 'holiday_promotion',
+          'competitor_pricing', 'seasonality']
+DELETE_BATCH = 500
+
+
+class Command(BaseCommand):
+    help = ('List MarketData rows that share a (store_id, product_id, date), which migration 0006 '
+            'refuses to constrain, and optionally delete all but the first of each')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true',
+                            help='Delete every duplicate but the one with the lowest id')
+        parser.add_argument('--backup', default=None, metavar='PATH',
+                            help='With --delete (required), write the deleted rows to this CSV first')
+
+    def handle(self, *args, **options):
+        if options['delete'] and not options['backup']:
+            raise CommandError('--delete needs --backup PATH to keep a copy of the rows it removes')
+
+        duplicates = list(MarketData.objects.order_by('store_id', 'product_id', 'date').values(
+            'store_id', 'product_id', 'date'
+        ).annotate(n=Count('id'), keep=Min('id')).filter(n__gt=1))
+        if not duplicates:
+            self.stdout.write(self.style.SUCCESS('No duplicated MarketData rows'))
+            return
+        for row in duplicates:
+            self.stdout.write(f"store {row['store_id']}, product {row['product_id']}, {row['date']}: "
+                              f"{row['n']} rows, keeping id {row['keep']}")
+        extra = sum(row['n'] - 1 for row in duplicates)
+        if not options['delete']:
+            self.stdout.write(self.style.WARNING(
+                f'{len(duplicates)} duplicated keys, {extra} extra rows. '
+                f'Re-run with --delete --backup PATH to remove them.'
+            ))
+            return
+
+        with transaction.atomic():
+            removed = []
+            for row in duplicates:
+                removed.extend(MarketData.objects.filter(
+                    store_id=row['store_id'], product_id=row['product_id'], date=row['date']
+                ).exclude(id=row['keep']).order_by('id').values(*FIELDS))
+            with open(options['backup'], 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                writer.writeheader()
+                writer.writerows(removed)
+            ids = [row['id'] for row in removed]
+            # Batched to stay under SQLite's bound-parameter limit
+            for start in range(0, len(ids), DELETE_BATCH):
+                MarketData.objects.filter(id__in=ids[start:start + DELETE_BATCH]).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {len(removed)} duplicate rows; they are saved in {options['backup']}"
+        ))
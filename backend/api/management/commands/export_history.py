@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import history
+
+
+class Command(BaseCommand):
+    help = ('Append new MarketData days to the month-partitioned Parquet market history used for '
+            'training, and rewrite the months with rows corrected since the last export')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default=None,
+                            help='Dataset directory (default: settings.MARKET_HISTORY_DIR)')
+        parser.add_argument('--since', type=date.fromisoformat, default=None,
+                            help='Export days after this date instead of after the newest exported day')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Rewrite the whole dataset from MarketData. Needed after MarketData '
+                                 'rows are deleted, or for a dataset exported before corrections '
+                                 'were tracked')
+
+    def handle(self, *args, **options):
+        root = options['root'] or history.history_dir()
+        try:
+            rows, files = history.export(root, since=options['since'], rebuild=options['rebuild'])
+        except ImportError as e:
+            raise CommandError(str(e))
+        if rows:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {rows} rows in {files} file(s) to {root}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{root} is up to date'))
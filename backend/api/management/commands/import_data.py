@@ -1,64 +1,176 @@
-# prediction_api/management/commands/import_data.py
-from django.core.management.base import BaseCommand
-from prediction_api.model import MarketData
-import pandas as pd
+# api/management/commands/import_data.py
+import os
+import time
+from contextlib import contextmanager
+
 import numpy as np
-from datetime import datetime
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api import history
+from api.actuals import UPSERT_FIELDS
+from api.models import DataImport, MarketData
+
+# CSV column -> (MarketData field, dtype used while reading)
+CSV_COLUMNS = {
+    'Date': ('date', 'string'),
+    'Store ID': ('store_id', 'string'),
+    'Product ID': ('product_id', 'string'),
+    'Category': ('category', 'category'),
+    'Region': ('region', 'category'),
+    'Inventory Level': ('inventory_level', 'float64'),
+    'Units Sold': ('units_sold', 'float64'),
+    'Units Ordered': ('units_ordered', 'float64'),
+    'Demand Forecast': ('demand_forecast', 'float64'),
+    'Price': ('price', 'float64'),
+    'Discount': ('discount', 'float64'),
+    'Weather Condition': ('weather_condition', 'category'),
+    'Holiday/Promotion': ('holiday_promotion', 'category'),
+    'Competitor Pricing': ('competitor_pricing', 'float64'),
+    'Seasonality': ('seasonality', 'category'),
+}
+
+# Applied for the duration of the import on SQLite. synchronous=OFF trades
+# durability against an OS crash for far fewer fsyncs; each chunk and its
+# checkpoint still commit atomically.
+SQLITE_BULK_PRAGMAS = {
+    'synchronous': 'OFF',
+    'temp_store': 'MEMORY',
+    'cache_size': '-200000',
+}
+
+
+def _ids(values):
+    """'S001' / 'P0001' / '1' -> 1, vectorized over a string column."""
+    return values.str.extract(r'(\d+)', expand=False).astype('int64').to_numpy()
+
 
 class Command(BaseCommand):
     help = 'Import market data from CSV file'
 
     def add_arguments(self, parser):
         parser.add_argument('file_path', type=str, help='Path to the CSV file')
+        parser.add_argument('--chunk-size', type=int, default=50000,
+                            help='Rows read, inserted and committed per chunk')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the saved checkpoint and read the file from the start')
+        parser.add_argument('--export-history', action='store_true',
+                            help='Afterwards, append the new days to the Parquet market history')
+
+    @contextmanager
+    def _bulk_load_pragmas(self):
+        if connection.vendor != 'sqlite':
+            yield
+            return
+        with connection.cursor() as cursor:
+            previous = {}
+            for pragma, value in SQLITE_BULK_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {pragma}')
+                previous[pragma] = cursor.fetchone()[0]
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                for pragma, value in previous.items():
+                    cursor.execute(f'PRAGMA {pragma} = {value}')
+
+    def _checkpoint(self, file_path, restart):
+        stat = os.stat(file_path)
+        checkpoint, created = DataImport.objects.get_or_create(
+            source=os.path.abspath(file_path),
+            defaults={'file_size': stat.st_size, 'file_mtime': stat.st_mtime},
+        )
+        changed = checkpoint.file_size != stat.st_size or checkpoint.file_mtime != stat.st_mtime
+        if restart or changed:
+            # A different file under the same name is re-read from the top;
+            # rows already stored under (store_id, product_id, date) are
+            # updated with the file's values.
+            checkpoint.file_size = stat.st_size
+            checkpoint.file_mtime = stat.st_mtime
+            checkpoint.rows_processed = 0
+            checkpoint.completed = False
+            checkpoint.save()
+        return checkpoint
+
+    def _build_objects(self, chunk):
+        # Column arrays instead of iterrows(): one conversion per column
+        columns = {
+            'date': chunk['Date'].to_numpy(dtype='datetime64[D]').tolist(),
+            'store_id': _ids(chunk['Store ID']).tolist(),
+            'product_id': _ids(chunk['Product ID']).tolist(),
+        }
+        for csv_column, (field, dtype) in CSV_COLUMNS.items():
+            if field in columns:
+                continue
+            values = chunk[csv_column]
+            if dtype == 'category':
+                columns[field] = values.astype(str).tolist()
+            else:
+                columns[field] = values.to_numpy(dtype=np.float64).tolist()
+        fields = list(columns)
+        return [MarketData(**dict(zip(fields, row))) for row in zip(*columns.values())]
 
     def handle(self, *args, **options):
         file_path = options['file_path']
+        chunk_size = options['chunk_size']
         self.stdout.write(self.style.SUCCESS(f'Reading data from {file_path}'))
-        
+
         try:
-            # Read the CSV file
-            df = pd.read_csv(file_path)
-            
-            # Convert date format
-            df['Date'] = pd.to_datetime(df['Date'])
-            
-            # Count number of rows
-            total_rows = len(df)
-            self.stdout.write(self.style.SUCCESS(f'Found {total_rows} rows'))
-            
-            # Batch import to avoid memory issues
-            batch_size = 1000
-            for i in range(0, total_rows, batch_size):
-                batch = df.iloc[i:min(i+batch_size, total_rows)]
-                
-                # Create MarketData objects
-                market_data_objects = []
-                for _, row in batch.iterrows():
-                    market_data = MarketData(
-                        date=row['Date'],
-                        store_id=row['Store ID'],
-                        product_id=row['Product ID'],
-                        category=row['Category'],
-                        region=row['Region'],
-                        inventory_level=row['Inventory Level'],
-                        units_sold=row['Units Sold'],
-                        units_ordered=row['Units Ordered'],
-                        demand_forecast=row['Demand Forecast'],
-                        price=row['Price'],
-                        discount=row['Discount'],
-                        weather_condition=row['Weather Condition'],
-                        holiday_promotion=row['Holiday/Promotion'],
-                        competitor_pricing=row['Competitor Pricing'],
-                        seasonality=row['Seasonality']
-                    )
-                    market_data_objects.append(market_data)
-                
-                # Bulk create
-                MarketData.objects.bulk_create(market_data_objects)
-                
-                self.stdout.write(self.style.SUCCESS(f'Imported {min(i+batch_size, total_rows)} / {total_rows} rows'))
-            
-            self.stdout.write(self.style.SUCCESS('Data import completed successfully!'))
-        
+            checkpoint = self._checkpoint(file_path, options['restart'])
+            if checkpoint.completed:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{file_path} was already imported ({checkpoint.rows_processed} rows); use --restart to re-read it'
+                ))
+                return
+            skip = checkpoint.rows_processed
+            if skip:
+                self.stdout.write(self.style.SUCCESS(f'Resuming after {skip} rows'))
+
+            reader = pd.read_csv(
+                file_path,
+                usecols=list(CSV_COLUMNS),
+                dtype={column: dtype for column, (_, dtype) in CSV_COLUMNS.items()},
+                chunksize=chunk_size,
+                skiprows=range(1, skip + 1) if skip else None,
+            )
+
+            started = time.perf_counter()
+            processed = 0
+            with self._bulk_load_pragmas():
+                for chunk in reader:
+                    chunk['Date'] = pd.to_datetime(chunk['Date'])
+                    objects = self._build_objects(chunk)
+
+                    # The rows and the checkpoint commit together, so a crash
+                    # resumes exactly after the last committed chunk
+                    with transaction.atomic():
+                        MarketData.objects.bulk_create(
+                            objects, update_conflicts=True,
+                            unique_fields=['store_id', 'product_id', 'date'], update_fields=UPSERT_FIELDS)
+                        checkpoint.rows_processed = skip + processed + len(chunk)
+                        checkpoint.save(update_fields=['rows_processed', 'updated_at'])
+
+                    processed += len(chunk)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Imported {skip + processed} rows '
+                        f'({processed / elapsed if elapsed else 0:,.0f} rows/sec)'
+                    ))
+
+            checkpoint.completed = True
+            checkpoint.save(update_fields=['completed', 'updated_at'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Data import completed successfully! {processed} rows in {elapsed:.1f}s'
+            ))
+            if options['export_history']:
+                rows, files = history.export()
+                self.stdout.write(self.style.SUCCESS(
+                    f'Appended {rows} rows in {files} file(s) to {history.history_dir()}'
+                ))
+
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error importing data: {str(e)}'))
\ No newline at end of file
+            # The committed chunks and the checkpoint stay: a re-run resumes
+            raise CommandError(f'Error importing data: {e}') from e
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from api import accuracy, rollups
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the PredictionRollup and PredictionAccuracy tables from PredictionResult, '
+            'or check them for drift')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the rollups with the raw table; exit non-zero on mismatch')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = rollups.check() + accuracy.check()
+            for mismatch in mismatches:
+                self.stdout.write(self.style.ERROR(mismatch))
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} rollup group(s) do not match PredictionResult')
+            self.stdout.write(self.style.SUCCESS('Rollups match PredictionResult'))
+            return
+
+        groups = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {groups} rollup groups from PredictionResult'))
+        rows = accuracy.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} accuracy rows from PredictionResult'))
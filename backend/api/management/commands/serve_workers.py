@@ -0,0 +1,202 @@
+import gc
+import os
+import select
+import shlex
+import signal
+import time
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+
+from api.predictor import predict_matrix
+from api.registry import registry
+
+
+def memory_usage(pid):
+    """RSS, PSS and unique (private) bytes of a process from /proc/<pid>/smaps_rollup, or None."""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[0].endswith(':'):
+                    fields[parts[0][:-1]] = int(parts[1]) * 1024
+    except OSError:
+        return None
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def default_workers():
+    """The worker count gunicorn.conf.py uses: GUNICORN_WORKERS, else 4."""
+    return int(os.environ.get('GUNICORN_WORKERS', '4'))
+
+
+def gunicorn_command(count, host, port):
+    """The gunicorn command line serving the same workers with gunicorn.conf.py."""
+    environment = {'GUNICORN_WORKERS': str(count), 'GUNICORN_BIND': f'{host}:{port}'}
+    return ' '.join(f'{name}={shlex.quote(value)}' for name, value in environment.items()) + \
+        ' ' + shlex.join(['gunicorn', '-c', 'gunicorn.conf.py', 'backend.wsgi'])
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Serve the API from N pre-forked worker processes that share the model loaded '
+            'in the parent, and report per-worker unique memory')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes to fork (default: $GUNICORN_WORKERS, else 4)')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--no-preload', action='store_true',
+                            help='Load the model in every worker after the fork instead of once before it')
+        parser.add_argument('--measure', action='store_true',
+                            help='Start the workers, warm them up, report memory and exit')
+        parser.add_argument('--report-interval', type=float, default=0,
+                            help='Seconds between memory reports while serving (0: only at startup)')
+        parser.add_argument('--access-log', action='store_true', help='Log every request')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print the workers that would start and the equivalent gunicorn command, then exit')
+
+    def _warm_up(self):
+        # Score one row so the model's pages are touched as a serving worker would
+        bundle = registry.get()
+        if bundle is not None:
+            predict_matrix(bundle, np.zeros((1, bundle.encoder.n_features)))
+
+    def _run_worker(self, server, preload, measure, ready):
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            if not preload:
+                registry.load()
+            self._warm_up()
+            os.write(ready, b'.')
+            if measure:
+                signal.pause()
+            else:
+                server.serve_forever()
+        finally:
+            os._exit(0)
+
+    def _report(self, workers):
+        self.stdout.write(f"{'worker':<8}{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'unique MB':>11}")
+        totals = {'rss': 0, 'pss': 0, 'uss': 0}
+        for number, pid in enumerate(workers, 1):
+            usage = memory_usage(pid)
+            if usage is None:
+                self.stdout.write(f"{number:<8}{pid:>8}{'n/a':>10}{'n/a':>10}{'n/a':>11}")
+                continue
+            for key in totals:
+                totals[key] += usage[key]
+            self.stdout.write(f"{number:<8}{pid:>8}{usage['rss'] / 2**20:>10.1f}"
+                              f"{usage['pss'] / 2**20:>10.1f}{usage['uss'] / 2**20:>11.1f}")
+        parent = memory_usage(os.getpid())
+        if parent is not None:
+            self.stdout.write(f"{'parent':<8}{os.getpid():>8}{parent['rss'] / 2**20:>10.1f}"
+                              f"{parent['pss'] / 2**20:>10.1f}{parent['uss'] / 2**20:>11.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(workers)} workers: {totals['uss'] / 2**20:.1f} MB unique, "
+            f"{totals['pss'] / 2**20:.1f} MB proportional, {totals['rss'] / 2**20:.1f} MB summed RSS"
+        ))
+
+    def _wait_ready(self, ready, count, timeout=120):
+        deadline = time.monotonic() + timeout
+        received = 0
+        while received < count:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([ready], [], [], remaining)[0]:
+                raise CommandError(f'Only {received} of {count} workers started')
+            received += len(os.read(ready, count - received))
+
+    def _dry_run(self, count, preload, host, port):
+        if preload:
+            bundle = registry.get()
+            if bundle is None:
+                raise CommandError(f'Model could not be loaded: {registry.info()["last_error"]}')
+            model = f'model {bundle.version} ({bundle.artifact}) preloaded before fork'
+        else:
+            model = 'model loaded per worker'
+        self.stdout.write(f"Would start {count} workers on http://{host}:{port}/ ({model})")
+        if preload:
+            # gunicorn.conf.py always preloads
+            self.stdout.write(f"gunicorn equivalent: {gunicorn_command(count, host, port)}")
+
+    def handle(self, *args, **options):
+        count = options['workers'] if options['workers'] is not None else default_workers()
+        preload = not options['no_preload']
+        if count < 1:
+            raise CommandError('--workers must be at least 1')
+        if options['dry_run']:
+            self._dry_run(count, preload, options['host'], options['port'])
+            return
+
+        application = get_wsgi_application()
+        handler = WSGIRequestHandler if options['access_log'] else QuietRequestHandler
+        server = make_server(options['host'], options['port'], application, handler_class=handler)
+
+        if preload:
+            if registry.get() is None:
+                raise CommandError(f'Model could not be loaded: {registry.info()["last_error"]}')
+            self._warm_up()
+        else:
+            registry.unload()
+        # Children must not share the parent's database connections, and
+        # objects frozen out of the garbage collector are never written to
+        # by a collection, so their pages stay shared after the fork.
+        connections.close_all()
+        gc.collect()
+        gc.freeze()
+
+        ready_read, ready_write = os.pipe()
+        workers = []
+        for _ in range(count):
+            pid = os.fork()
+            if pid == 0:
+                os.close(ready_read)
+                self._run_worker(server, preload, options['measure'], ready_write)
+            workers.append(pid)
+        os.close(ready_write)
+        server.socket.close()
+
+        try:
+            self._wait_ready(ready_read, count)
+            mode = 'preloaded before fork' if preload else 'loaded per worker'
+            self.stdout.write(self.style.SUCCESS(
+                f"{count} workers ready on http://{options['host']}:{options['port']}/ (model {mode})"
+            ))
+            self._report(workers)
+            if options['measure']:
+                return
+            interval = options['report_interval']
+            while True:
+                if interval:
+                    time.sleep(interval)
+                    self._report(workers)
+                else:
+                    signal.pause()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for pid in workers:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            for pid in workers:
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
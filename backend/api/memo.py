@@ -0,0 +1,132 @@
+"""
+Memoized single-row predictions.
+
+Repeated ``/api/predict/`` payloads (client retries, dashboards re-rendering)
+encode to the same feature row. The memo maps (model version, hash of the
+encoded row) to the first prediction made for it, in a per-process LRU
+bounded by ``PREDICTION_MEMO_SIZE`` entries whose entries expire after
+``PREDICTION_MEMO_TTL`` seconds. A hit skips model inference.
+
+``PREDICTION_MEMO_DEDUPE`` decides what happens to the PredictionResult row
+of a request that repeats the original's stored fields: ``'off'`` saves it
+as usual, ``'skip'`` saves nothing and returns the original's ids, and
+``'link'`` saves it with ``duplicate_of`` pointing at the original.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .metrics import Counter
+
+DEDUPE_MODES = ('off', 'skip', 'link')
+
+
+def identity(data):
+    """The request fields a PredictionResult row stores, besides the prediction."""
+    return (data['store_id'], data['product_id'], data['date'], data['category'],
+            data['region'], data['seasonality'])
+
+
+@dataclass(frozen=True)
+class MemoEntry:
+    predicted_sales: float
+    prediction_id: object
+    prediction_uuid: str
+    identity: tuple
+    expires: float
+
+
+class PredictionMemo:
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.hits = Counter('prediction_memo_hits_total', 'Predictions answered from the memo')
+        self.misses = Counter('prediction_memo_misses_total', 'Predictions that ran the model')
+        self.evictions = Counter('prediction_memo_evictions_total', 'Memo entries evicted as least recently used')
+        self.expirations = Counter('prediction_memo_expirations_total', 'Memo entries dropped after their TTL')
+        self.duplicates_skipped = Counter('prediction_memo_duplicates_skipped_total',
+                                          'Duplicate predictions not persisted')
+        self.duplicates_linked = Counter('prediction_memo_duplicates_linked_total',
+                                         'Duplicate predictions persisted with duplicate_of')
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'PREDICTION_MEMO_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'PREDICTION_MEMO_TTL', 300.0)
+
+    @property
+    def dedupe(self):
+        return getattr(settings, 'PREDICTION_MEMO_DEDUPE', 'off')
+
+    def _check_fork(self):
+        # Entries are per process; don't inherit the parent's across fork
+        if self._pid != os.getpid():
+            self._entries = OrderedDict()
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    @staticmethod
+    def key(version, row):
+        return (version, hashlib.blake2b(row.tobytes(), digest_size=16).digest())
+
+    def get(self, key):
+        """The live entry for ``key`` or None. Counts a hit or a miss."""
+        if self.max_size <= 0:
+            return None
+        self._check_fork()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                del self._entries[key]
+                self.expirations.inc()
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        (self.hits if entry is not None else self.misses).inc()
+        return entry
+
+    def put(self, key, predicted_sales, prediction_id, prediction_uuid, data):
+        if self.max_size <= 0:
+            return
+        self._check_fork()
+        entry = MemoEntry(predicted_sales, prediction_id, prediction_uuid, identity(data),
+                          time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions.inc()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        hits, misses = self.hits.value, self.misses.value
+        return {
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'dedupe': self.dedupe,
+            'size': len(self._entries) if self._pid == os.getpid() else 0,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else None,
+            'evictions': self.evictions.value,
+            'expirations': self.expirations.value,
+            'duplicates_skipped': self.duplicates_skipped.value,
+            'duplicates_linked': self.duplicates_linked.value,
+        }
+
+
+prediction_memo = PredictionMemo()
@@ -0,0 +1,174 @@
+"""
+Minimal in-process counters, gauges and histograms for the serving path.
+
+Every metric registers itself by name in ``REGISTRY`` when it is created and
+``exposition()`` renders the registry in the Prometheus text format for
+/api/metrics/. Values are per process: scrape each worker, or aggregate in
+the scraper.
+"""
+import bisect
+import threading
+
+REGISTRY = {}
+
+
+def _register(metric):
+    REGISTRY[metric.name] = metric
+    return metric
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, register=True):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0
+        self._lock = threading.Lock()
+        if register:
+            _register(self)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, register=True):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0.0
+        if register:
+            _register(self)
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style (``le`` upper bounds)."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, register=True):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+        if register:
+            _register(self)
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            cumulative.append(('+Inf' if bound == float('inf') else bound, running))
+        return {
+            'buckets': dict(cumulative),
+            'count': count,
+            'sum': total,
+        }
+
+
+class Family:
+    """
+    One metric per combination of label values, e.g.
+    ``Family(Histogram, 'stage_seconds', '...', ['stage'], buckets=...).labels('encode')``.
+    """
+
+    def __init__(self, metric_class, name, documentation, labelnames, **options):
+        self.metric_class = metric_class
+        self.kind = metric_class.kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.options = options
+        self._children = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self.metric_class(self.name, self.documentation, register=False, **self.options)
+                    self._children[values] = child
+        return child
+
+    def clear(self):
+        with self._lock:
+            self._children = {}
+
+    def children(self):
+        return [(dict(zip(self.labelnames, values)), child) for values, child in list(self._children.items())]
+
+    def snapshot(self):
+        return {','.join(values): child.snapshot() for values, child in list(self._children.items())}
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _samples(metric, labels):
+    if metric.kind != 'histogram':
+        return [(metric.name, labels, metric.snapshot())]
+    snapshot = metric.snapshot()
+    samples = [
+        (f'{metric.name}_bucket', {**labels, 'le': bound if bound == '+Inf' else float(bound)}, count)
+        for bound, count in snapshot['buckets'].items()
+    ]
+    samples.append((f'{metric.name}_sum', labels, snapshot['sum']))
+    samples.append((f'{metric.name}_count', labels, snapshot['count']))
+    return samples
+
+
+def exposition():
+    """Every registered metric in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        children = metric.children() if isinstance(metric, Family) else [({}, metric)]
+        for labels, child in children:
+            for sample, sample_labels, value in _samples(child, labels):
+                lines.append(f'{sample}{_labels(sample_labels)} {value}')
+    return '\n'.join(lines) + '\n'
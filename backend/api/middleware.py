@@ -0,0 +1,59 @@
+"""
+Request metrics and slow-request profiling for every view.
+
+Listed first in MIDDLEWARE so the recorded latency covers the rest of the
+middleware stack. Works for both the WSGI and the ASGI application.
+"""
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import instrumentation
+from .profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = profiler.start() if profiler.enabled else None
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, token)
+        return response
+
+    async def __acall__(self, request):
+        token = profiler.start() if profiler.enabled else None
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, token)
+        return response
+
+    def _record(self, request, response, seconds, token):
+        match = request.resolver_match
+        view = match.url_name if match is not None and match.url_name else 'unmatched'
+        instrumentation.requests.labels(view, request.method, response.status_code).inc()
+        instrumentation.request_seconds.labels(view).observe(seconds)
+        if response.status_code >= 500:
+            instrumentation.request_errors.labels(view).inc()
+
+        if token is None:
+            return
+        samples = profiler.stop(token)
+        duration_ms = seconds * 1000.0
+        if duration_ms >= profiler.threshold_ms and samples:
+            path = profiler.dump(samples, view, duration_ms)
+            logger.warning("Slow request %s %s took %.1fms; sampled stacks in %s",
+                           request.method, request.path, duration_ms, path)
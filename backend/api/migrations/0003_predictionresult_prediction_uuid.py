@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:55
+
+import uuid
+from django.db import migrations, models
+
+
+def populate_prediction_uuid(apps, schema_editor):
+    PredictionResult = apps.get_model('api', 'PredictionResult')
+    batch = []
+    for prediction in PredictionResult.objects.filter(prediction_uuid__isnull=True).only('id').iterator():
+        prediction.prediction_uuid = uuid.uuid4()
+        batch.append(prediction)
+        if len(batch) >= 1000:
+            PredictionResult.objects.bulk_update(batch, ['prediction_uuid'])
+            batch = []
+    if batch:
+        PredictionResult.objects.bulk_update(batch, ['prediction_uuid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_predictionresult_seasonality'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictionresult',
+            name='prediction_uuid',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_prediction_uuid, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='predictionresult',
+            name='prediction_uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
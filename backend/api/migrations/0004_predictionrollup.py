@@ -0,0 +1,50 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:56
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def build_rollups(apps, schema_editor):
+    PredictionResult = apps.get_model('api', 'PredictionResult')
+    PredictionRollup = apps.get_model('api', 'PredictionRollup')
+    totals = {}
+    groups = PredictionResult.objects.order_by().values('category', 'region', 'seasonality').annotate(
+        n=Count('id'),
+        total=Sum('predicted_sales'),
+        total_sq=Sum(F('predicted_sales') * F('predicted_sales')),
+    )
+    for group in groups:
+        key = (group['category'], group['region'], group['seasonality'] or '')
+        count, total, total_sq = totals.get(key, (0, 0.0, 0.0))
+        totals[key] = (count + group['n'], total + (group['total'] or 0.0), total_sq + (group['total_sq'] or 0.0))
+    PredictionRollup.objects.bulk_create([
+        PredictionRollup(category=category, region=region, seasonality=seasonality,
+                         count=count, sum=total, sum_sq=total_sq)
+        for (category, region, seasonality), (count, total, total_sq) in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_predictionresult_prediction_uuid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100)),
+                ('region', models.CharField(max_length=100)),
+                ('seasonality', models.CharField(blank=True, default='', max_length=100)),
+                ('count', models.BigIntegerField(default=0)),
+                ('sum', models.FloatField(default=0.0)),
+                ('sum_sq', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'region', 'seasonality'), name='unique_prediction_rollup_key')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_predictionrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='marketdata',
+            index=models.Index(fields=['-date', 'store_id', 'product_id', 'id'], name='market_ordering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketdata',
+            index=models.Index(fields=['category', 'region', 'seasonality'], name='market_segment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predictionresult',
+            index=models.Index(fields=['-date', 'store_id', 'product_id', 'id'], name='prediction_ordering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predictionresult',
+            index=models.Index(fields=['store_id', 'product_id', 'date'], name='prediction_store_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predictionresult',
+            index=models.Index(fields=['category', 'region', 'seasonality'], name='prediction_segment_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_no_duplicate_market_data(apps, schema_editor):
+    # The unique constraint below cannot be added over duplicate rows. They
+    # are not deleted here: `manage.py dedupe_market_data` reviews them and
+    # removes them on request, keeping a copy of what it removes.
+    MarketData = apps.get_model('api', 'MarketData')
+    duplicates = MarketData.objects.order_by('store_id', 'product_id', 'date').values(
+        'store_id', 'product_id', 'date'
+    ).annotate(n=Count('id')).filter(n__gt=1)
+    total = duplicates.count()
+    if total:
+        keys = ', '.join(
+            f"(store {row['store_id']}, product {row['product_id']}, {row['date']}: {row['n']} rows)"
+            for row in duplicates[:20]
+        )
+        more = f' and {total - 20} more' if total > 20 else ''
+        raise RuntimeError(
+            f'MarketData has {total} duplicated (store_id, product_id, date) keys: {keys}{more}. '
+            f'Run `manage.py dedupe_market_data` to review them and `manage.py dedupe_market_data '
+            f'--delete --backup FILE` to remove them, then migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, unique=True)),
+                ('file_size', models.BigIntegerField()),
+                ('file_mtime', models.FloatField()),
+                ('rows_processed', models.BigIntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(check_no_duplicate_market_data, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='marketdata',
+            constraint=models.UniqueConstraint(fields=('store_id', 'product_id', 'date'), name='unique_market_data_row'),
+        ),
+    ]
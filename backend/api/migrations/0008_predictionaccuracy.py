@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:00
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Abs
+
+
+def build_accuracy(apps, schema_editor):
+    PredictionResult = apps.get_model('api', 'PredictionResult')
+    PredictionAccuracy = apps.get_model('api', 'PredictionAccuracy')
+    totals = {}
+    error = F('predicted_sales') - F('actual_sales')
+    groups = (
+        PredictionResult.objects.filter(actual_sales__isnull=False).order_by()
+        .values('date', 'category', 'region', 'seasonality')
+        .annotate(n=Count('id'), total=Sum(error), total_abs=Sum(Abs(error)),
+                  total_sq=Sum(error * error), total_actual=Sum('actual_sales'))
+    )
+    for group in groups:
+        key = (group['date'], group['category'], group['region'], group['seasonality'] or '')
+        previous = totals.get(key, (0, 0.0, 0.0, 0.0, 0.0))
+        current = (group['n'], group['total'], group['total_abs'], group['total_sq'], group['total_actual'])
+        totals[key] = tuple(a + (b or 0) for a, b in zip(previous, current))
+    PredictionAccuracy.objects.bulk_create([
+        PredictionAccuracy(date=day, category=category, region=region, seasonality=seasonality,
+                           count=count, sum_error=total, sum_abs_error=total_abs,
+                           sum_sq_error=total_sq, sum_actual=total_actual)
+        for (day, category, region, seasonality), (count, total, total_abs, total_sq, total_actual)
+        in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_predictionresult_duplicate_of'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionAccuracy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(max_length=100)),
+                ('region', models.CharField(max_length=100)),
+                ('seasonality', models.CharField(blank=True, default='', max_length=100)),
+                ('count', models.BigIntegerField(default=0)),
+                ('sum_error', models.FloatField(default=0.0)),
+                ('sum_abs_error', models.FloatField(default=0.0)),
+                ('sum_sq_error', models.FloatField(default=0.0)),
+                ('sum_actual', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'category', 'region', 'seasonality'), name='unique_prediction_accuracy_key')],
+            },
+        ),
+        migrations.RunPython(build_accuracy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_predictionaccuracy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketdata',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
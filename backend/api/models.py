@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 class PredictionResult(models.Model):
@@ -10,9 +12,23 @@ class PredictionResult(models.Model):
     actual_sales = models.FloatField(null=True, blank=True)
     seasonality = models.CharField(max_length=100, null=True, blank=True)  # Must be here
     created_at = models.DateTimeField(auto_now_add=True)
+    # Stable id handed to clients before the row is written (write-behind)
+    prediction_uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    # Set when PREDICTION_MEMO_DEDUPE='link' recognises a repeat of an earlier
+    # request. No database constraint: under write-behind the original may
+    # not be inserted yet.
+    duplicate_of = models.ForeignKey('self', to_field='prediction_uuid', null=True, blank=True,
+                                     on_delete=models.SET_NULL, db_constraint=False,
+                                     related_name='duplicates')
     
     class Meta:
         ordering = ['-date', 'store_id', 'product_id']
+        indexes = [
+            # Default ordering plus id, the keyset used to page /api/predictions/
+            models.Index(fields=['-date', 'store_id', 'product_id', 'id'], name='prediction_ordering_idx'),
+            models.Index(fields=['store_id', 'product_id', 'date'], name='prediction_store_product_idx'),
+            models.Index(fields=['category', 'region', 'seasonality'], name='prediction_segment_idx'),
+        ]
     
     def __str__(self):
         return f"Store {self.store_id}, Product {self.product_id}, Date: {self.date}"
@@ -33,10 +49,81 @@ class MarketData(models.Model):
     holiday_promotion = models.CharField(max_length=100)
     competitor_pricing = models.FloatField()
     seasonality = models.CharField(max_length=100)
+    # Lets export_history find the days corrected since its last run
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['-date', 'store_id', 'product_id']
+        indexes = [
+            models.Index(fields=['-date', 'store_id', 'product_id', 'id'], name='market_ordering_idx'),
+            models.Index(fields=['category', 'region', 'seasonality'], name='market_segment_idx'),
+        ]
+        constraints = [
+            # One row per store, product and day; lets re-imports skip rows already loaded
+            models.UniqueConstraint(fields=['store_id', 'product_id', 'date'], name='unique_market_data_row'),
+        ]
+
+
+class PredictionRollup(models.Model):
+    """
+    Running totals of PredictionResult.predicted_sales per
+    (category, region, seasonality), kept in step with every write so the
+    analytics endpoints read O(groups) rows instead of scanning predictions.
+    A missing seasonality is stored as ''.
+    """
+    category = models.CharField(max_length=100)
+    region = models.CharField(max_length=100)
+    seasonality = models.CharField(max_length=100, blank=True, default='')
+    count = models.BigIntegerField(default=0)
+    sum = models.FloatField(default=0.0)
+    sum_sq = models.FloatField(default=0.0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'region', 'seasonality'],
+                                    name='unique_prediction_rollup_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.category} / {self.region} / {self.seasonality}: {self.count}"
+
+
+class PredictionAccuracy(models.Model):
+    """
+    Running error totals of the PredictionResult rows that have an
+    actual_sales, per day and (category, region, seasonality), kept in step
+    the way PredictionRollup is. Error is predicted_sales - actual_sales.
+    A missing seasonality is stored as ''.
+    """
+    date = models.DateField()
+    category = models.CharField(max_length=100)
+    region = models.CharField(max_length=100)
+    seasonality = models.CharField(max_length=100, blank=True, default='')
+    count = models.BigIntegerField(default=0)
+    sum_error = models.FloatField(default=0.0)
+    sum_abs_error = models.FloatField(default=0.0)
+    sum_sq_error = models.FloatField(default=0.0)
+    sum_actual = models.FloatField(default=0.0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category', 'region', 'seasonality'],
+                                    name='unique_prediction_accuracy_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.category} / {self.region} / {self.seasonality}: {self.count}"
 
 
+class DataImport(models.Model):
+    """Checkpoint of an import_data run so an interrupted import can resume."""
+    source = models.CharField(max_length=500, unique=True)
+    file_size = models.BigIntegerField()
+    file_mtime = models.FloatField()
+    rows_processed = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
     
-   
\ No newline at end of file
+    def __str__(self):
+        return f"{self.source}: {self.rows_processed} rows"
+
@@ -0,0 +1,92 @@
+import base64
+import json
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination over (-date, store_id, product_id, id).
+
+    The cursor holds the sort key of the last row on the page and the next
+    page is fetched with a ``WHERE`` on that key, which the
+    ``prediction_ordering_idx`` index serves directly. Every page costs the
+    same no matter how deep into the table it is, unlike OFFSET paging.
+    """
+    ordering = ('-date', 'store_id', 'product_id', 'id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'PREDICTIONS_PAGE_SIZE', 100)
+        max_page_size = getattr(settings, 'PREDICTIONS_MAX_PAGE_SIZE', 1000)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return max(1, min(requested, max_page_size))
+
+    def encode_cursor(self, obj):
+        key = [obj.date.isoformat(), obj.store_id, obj.product_id, obj.id]
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            day, store_id, product_id, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return date.fromisoformat(day), int(store_id), int(product_id), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            day, store_id, product_id, pk = cursor
+            # The leading date__lte gives the planner an index range to scan
+            queryset = queryset.filter(Q(date__lte=day) & (
+                Q(date__lt=day)
+                | Q(date=day, store_id__gt=store_id)
+                | Q(date=day, store_id=store_id, product_id__gt=product_id)
+                | Q(date=day, store_id=store_id, product_id=product_id, id__gt=pk)
+            ))
+
+        # Fetch one extra row to know whether there is a next page
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
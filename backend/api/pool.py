@@ -0,0 +1,75 @@
+"""
+Bounded thread pool for CPU-bound work started from async views.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class PoolSaturated(Exception):
+    """Raised when the pool already has its maximum number of pending tasks."""
+
+
+class InferencePool:
+    """
+    A ThreadPoolExecutor with a cap on queued + running tasks. ``run`` fails
+    fast with PoolSaturated instead of queueing without bound, so callers can
+    shed load (503) rather than build up latency.
+    """
+
+    def __init__(self, size=None, max_pending=None):
+        self._size = size
+        self._max_pending = max_pending
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        if self._size is None:
+            return getattr(settings, 'PREDICTION_POOL_SIZE', 4)
+        return self._size
+
+    @property
+    def max_pending(self):
+        if self._max_pending is None:
+            return getattr(settings, 'PREDICTION_POOL_MAX_PENDING', 64)
+        return self._max_pending
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _get_executor(self):
+        # Executor threads do not survive a fork; make a new pool in the child.
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.size, thread_name_prefix='inference'
+            )
+            self._pid = os.getpid()
+            self._pending = 0
+        return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args):
+        with self._lock:
+            executor = self._get_executor()
+            if self._pending >= self.max_pending:
+                raise PoolSaturated(f"{self._pending} inference tasks already pending")
+            self._pending += 1
+        future = executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+inference_pool = InferencePool()
@@ -0,0 +1,206 @@
+"""
+Vectorized scoring shared by the single-row and batch prediction views.
+
+Rows routed to segment models (see segments.py) are grouped by segment, so
+each model scores its rows in one call; rows without one go to the global
+model.
+"""
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import rollups
+from .instrumentation import batch_rows, stage
+from .memo import MemoEntry, identity, prediction_memo
+from .models import PredictionResult
+from .segments import segment_models
+from .writebehind import write_behind
+
+
+def _predict(bundle, model, fused, matrix):
+    if fused:
+        # The scaler is folded into the model; skip the transform and its copy
+        processed_data = matrix
+    else:
+        with stage('transform'):
+            processed_data = bundle.preprocessor.transform(matrix)
+    with stage('predict'):
+        return np.asarray(model.predict(processed_data), dtype=np.float64)
+
+
+def predict_matrix(bundle, matrix, segments=None):
+    """
+    Run one preprocessor.transform + model.predict over an encoded matrix.
+    ``segments`` names each row's segment model (None: the global model);
+    each model then runs once over its own rows.
+    """
+    batch_rows.observe(len(matrix))
+    if segments is None or not any(segments):
+        return _predict(bundle, bundle.model, bundle.fused, matrix)
+
+    groups = {}
+    for i, name in enumerate(segments):
+        groups.setdefault(name, []).append(i)
+    predictions = np.empty(len(matrix), dtype=np.float64)
+    for name, index in groups.items():
+        segment = segment_models.get(bundle, name) if name is not None else None
+        if segment is None:
+            model, fused = bundle.model, bundle.fused
+        else:
+            model, fused = segment.model, segment.fused
+        predictions[index] = _predict(bundle, model, fused, matrix[index])
+    return predictions
+
+
+def predict_rows(bundle, rows):
+    """Encode validated request dicts into a single matrix and score them, one call per model."""
+    with stage('encode'):
+        matrix = bundle.encoder.encode_many(rows)
+    return predict_matrix(bundle, matrix, segment_models.routes(bundle, rows))
+
+
+def build_result(data, predicted_sales):
+    prediction_result = PredictionResult(
+        store_id=data['store_id'],
+        product_id=data['product_id'],
+        category=data['category'],
+        region=data['region'],
+        date=data['date'],
+        predicted_sales=float(predicted_sales),
+        actual_sales=None,
+        seasonality=data['seasonality'],
+    )
+    if data.get('prediction_uuid') is not None:
+        prediction_result.prediction_uuid = data['prediction_uuid']
+    return prediction_result
+
+
+def _save(prediction_result):
+    """
+    Save a prediction and add it to the rollups. A retried prediction_uuid
+    that is already stored is not saved again; the stored row is returned.
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                prediction_result.save()
+        except IntegrityError:
+            stored = PredictionResult.objects.filter(prediction_uuid=prediction_result.prediction_uuid).first()
+            if stored is None:
+                raise
+            return stored
+        rollups.record([prediction_result])
+    return prediction_result
+
+
+def _timed_save(prediction_result):
+    with stage('save'):
+        return _save(prediction_result)
+
+
+def save_result(prediction_result):
+    """
+    Save one prediction, or buffer it when PREDICTION_WRITE_BEHIND is on.
+    Returns the row id for the response's prediction_id, or None while the
+    row is buffered; the response's prediction_uuid identifies it either way.
+    """
+    if not settings.PREDICTION_WRITE_BEHIND:
+        return _timed_save(prediction_result).id
+    if not write_behind.add(prediction_result):
+        return _timed_save(prediction_result).id
+    return None
+
+
+async def asave_result(prediction_result):
+    """
+    save_result for async views. The save and its rollup update share one
+    transaction, which Django's async ORM cannot open, so the synchronous
+    save runs in a worker thread through sync_to_async.
+    """
+    if not settings.PREDICTION_WRITE_BEHIND or not write_behind.add(prediction_result):
+        return (await sync_to_async(_timed_save)(prediction_result)).id
+    return None
+
+
+def memo_lookup(bundle, data):
+    """
+    Encode and route one request and look it up in the prediction memo.
+    Returns (row, segment or None, key, entry or None).
+    """
+    with stage('encode'):
+        row = bundle.encoder.encode(data)
+    segment, = segment_models.routes(bundle, [data])
+    # Unseen levels encode like the dropped first level; keep their memo entries apart
+    key = prediction_memo.key(bundle.version if segment is None else f'{bundle.version}/{segment}', row)
+    return row, segment, key, prediction_memo.get(key)
+
+
+def _memo_result(entry, data, predicted_sales):
+    """
+    The PredictionResult to save for a memo-path prediction, or the memo
+    entry itself when PREDICTION_MEMO_DEDUPE='skip' and the request repeats
+    it. Requests carrying their own prediction_uuid are always saved.
+    """
+    mode = prediction_memo.dedupe
+    duplicate = (entry is not None and mode != 'off' and data.get('prediction_uuid') is None
+                 and entry.identity == identity(data))
+    if duplicate and mode == 'skip':
+        prediction_memo.duplicates_skipped.inc()
+        return entry
+    prediction_result = build_result(data, predicted_sales)
+    if duplicate:
+        prediction_result.duplicate_of_id = entry.prediction_uuid
+        prediction_memo.duplicates_linked.inc()
+    return prediction_result
+
+
+def _remember(key, entry, data, prediction_result, prediction_id):
+    if entry is None:
+        prediction_memo.put(key, prediction_result.predicted_sales, prediction_id,
+                            str(prediction_result.prediction_uuid), data)
+
+
+def record_prediction(key, entry, data, predicted_sales):
+    """
+    Persist a prediction scored through the memo (``entry`` is the memo hit,
+    or None on a miss, which memoizes it). Returns (prediction_id, prediction_uuid).
+    """
+    prediction_result = _memo_result(entry, data, predicted_sales)
+    if isinstance(prediction_result, MemoEntry):
+        return prediction_result.prediction_id, prediction_result.prediction_uuid
+    prediction_id = save_result(prediction_result)
+    _remember(key, entry, data, prediction_result, prediction_id)
+    return prediction_id, str(prediction_result.prediction_uuid)
+
+
+async def arecord_prediction(key, entry, data, predicted_sales):
+    prediction_result = _memo_result(entry, data, predicted_sales)
+    if isinstance(prediction_result, MemoEntry):
+        return prediction_result.prediction_id, prediction_result.prediction_uuid
+    prediction_id = await asave_result(prediction_result)
+    _remember(key, entry, data, prediction_result, prediction_id)
+    return prediction_id, str(prediction_result.prediction_uuid)
+
+
+def save_results(rows, predictions):
+    """
+    Persist one PredictionResult per row with a single bulk insert. Returns
+    the saved objects; a row whose client-supplied prediction_uuid is
+    already stored returns the stored row instead of a new one.
+    """
+    results = [build_result(data, value) for data, value in zip(rows, predictions)]
+    supplied = [result.prediction_uuid for data, result in zip(rows, results)
+                if data.get('prediction_uuid') is not None]
+    with stage('save'), transaction.atomic():
+        stored = PredictionResult.objects.in_bulk(supplied, field_name='prediction_uuid') if supplied else {}
+        new = []
+        for i, result in enumerate(results):
+            if result.prediction_uuid in stored:
+                results[i] = stored[result.prediction_uuid]
+            else:
+                stored[result.prediction_uuid] = result
+                new.append(result)
+        PredictionResult.objects.bulk_create(new)
+        rollups.record(new)
+    return results
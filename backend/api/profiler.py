@@ -0,0 +1,113 @@
+"""
+Sampling profiler for slow requests.
+
+When ``PROFILE_SLOW_REQUEST_MS`` is set, ``MetricsMiddleware`` registers
+every request's thread with ``profiler`` and one background thread samples
+the stacks of the registered threads every ``PROFILE_SAMPLE_INTERVAL_MS``.
+Requests that end up slower than the threshold have their samples written
+to ``PROFILE_DIR`` in the folded format (``frame;frame;frame count`` per
+line) that flamegraph.pl and speedscope read; faster ones are discarded.
+
+Async views share the event loop thread, so their stacks also contain
+whatever other requests ran on the loop while they were sampled.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+
+def fold(frame):
+    """One stack as 'outermost;...;innermost', each frame as 'function (file:line)'."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+
+    def __init__(self):
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def threshold_ms(self):
+        return getattr(settings, 'PROFILE_SLOW_REQUEST_MS', None)
+
+    @property
+    def interval(self):
+        return getattr(settings, 'PROFILE_SAMPLE_INTERVAL_MS', 5.0) / 1000.0
+
+    @property
+    def directory(self):
+        return getattr(settings, 'PROFILE_DIR', 'profiles')
+
+    @property
+    def enabled(self):
+        return self.threshold_ms is not None
+
+    def _ensure_sampler(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # A forked child inherits neither the thread nor the parent's requests
+            self._active = {}
+            self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def start(self):
+        """Begin sampling the calling thread. Returns a token for ``stop``."""
+        self._ensure_sampler()
+        token = object()
+        with self._lock:
+            self._active[token] = (threading.get_ident(), collections.Counter())
+        self._wake.set()
+        return token
+
+    def stop(self, token):
+        """Stop sampling and return the {folded stack: samples} collected."""
+        with self._lock:
+            _, samples = self._active.pop(token)
+        return samples
+
+    def dump(self, samples, view, duration_ms):
+        """Write folded stacks for one request. Returns the file path."""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%f')
+        path = os.path.join(self.directory, f'{stamp}-{view}-{duration_ms:.0f}ms.folded')
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                active = list(self._active.values())
+            for ident, samples in active:
+                frame = frames.get(ident)
+                if frame is not None and ident != me:
+                    samples[fold(frame)] += 1
+
+
+profiler = SamplingProfiler()
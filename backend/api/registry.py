@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+from django.conf import settings
+
+from .features import FeatureEncoder
+from .instrumentation import record_model
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = 'best_model.pkl'
+# Compact api.serving predictors, preferred over MODEL_FILE when present.
+# The fused one has the preprocessor folded in and takes raw encoded rows.
+FUSED_MODEL_FILE = 'fused_model.joblib'
+SERVING_MODEL_FILE = 'serving_model.joblib'
+PREPROCESSOR_FILE = 'preprocessor.pkl'
+COLUMNS_FILE = 'columns.pkl'
+VERSION_FILE = 'VERSION'
+
+ARTIFACT_FILES = (MODEL_FILE, SERVING_MODEL_FILE, FUSED_MODEL_FILE, PREPROCESSOR_FILE, COLUMNS_FILE)
+
+
+def load_model(directory):
+    """
+    The best model artifact in ``directory``: fused, then compact serving,
+    then best_model.pkl. Returns (model, artifact file name).
+    """
+    artifact = next(
+        (name for name in (FUSED_MODEL_FILE, SERVING_MODEL_FILE) if (directory / name).exists()),
+        MODEL_FILE,
+    )
+    if artifact != MODEL_FILE:
+        # Array-only and uncompressed: the arrays are mapped read-only, so
+        # every worker process shares the same pages
+        return joblib.load(directory / artifact, mmap_mode='r'), artifact
+    return joblib.load(directory / artifact), artifact
+
+
+def _check_feature_names(preprocessor, columns):
+    """
+    The preprocessor was fitted on a DataFrame but is served NumPy rows from
+    the encoder. Verify the column order once here, then drop the names so
+    sklearn does not warn (and re-validate) on every transform call.
+    """
+    names = getattr(preprocessor, 'feature_names_in_', None)
+    if names is None:
+        return
+    if list(names) != list(columns):
+        raise ValueError("Preprocessor feature names do not match columns.pkl")
+    del preprocessor.feature_names_in_
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """An immutable snapshot of the artifacts needed to serve predictions."""
+    model: object
+    preprocessor: object
+    columns: list
+    encoder: FeatureEncoder
+    artifact: str
+    fused: bool
+    version: str
+    loaded_at: datetime
+    load_seconds: float
+    signature: tuple = field(repr=False)
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the serving model.
+
+    Artifacts are loaded once and kept in memory. ``get()`` periodically
+    compares a signature of the model directory against the loaded snapshot
+    and reloads when it changes. When a VERSION file exists the signature is
+    that file alone: data_pipeline.py writes it after every other artifact,
+    so a half-written set never triggers a reload. Without one it falls back
+    to the artifact mtimes. Readers always see either the old or the new
+    bundle, never a partially loaded one.
+    """
+
+    def __init__(self, model_dir=None, reload_interval=None):
+        self._model_dir = Path(model_dir) if model_dir is not None else None
+        self._reload_interval = reload_interval
+        self._bundle = None
+        self._last_check = 0.0
+        self._last_error = None
+        self._failed_signature = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_dir(self):
+        if self._model_dir is None:
+            return Path(settings.MODEL_DIR)
+        return self._model_dir
+
+    @property
+    def reload_interval(self):
+        if self._reload_interval is None:
+            return getattr(settings, 'MODEL_RELOAD_INTERVAL', 5.0)
+        return self._reload_interval
+
+    def _signature(self):
+        try:
+            stat = (self.model_dir / VERSION_FILE).stat()
+        except FileNotFoundError:
+            pass
+        else:
+            return ((VERSION_FILE, stat.st_mtime_ns, stat.st_size),)
+        parts = []
+        for name in ARTIFACT_FILES:
+            path = self.model_dir / name
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                parts.append((name, None, None))
+                continue
+            parts.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(parts)
+
+    def _read_version(self, signature):
+        version_path = self.model_dir / VERSION_FILE
+        if version_path.exists():
+            version = version_path.read_text().strip()
+            if version:
+                return version
+        # No explicit version, fall back to the newest artifact mtime
+        mtimes = [mtime for _, mtime, _ in signature if mtime is not None]
+        if not mtimes:
+            return 'unknown'
+        newest = datetime.fromtimestamp(max(mtimes) / 1e9, tz=timezone.utc)
+        return newest.strftime('%Y%m%d%H%M%S')
+
+    def _load_bundle(self, signature):
+        started = time.perf_counter()
+        model, artifact = load_model(self.model_dir)
+        preprocessor = joblib.load(self.model_dir / PREPROCESSOR_FILE)
+        columns = list(joblib.load(self.model_dir / COLUMNS_FILE))
+        encoder = FeatureEncoder(columns)
+        _check_feature_names(preprocessor, columns)
+        return ModelBundle(
+            model=model,
+            preprocessor=preprocessor,
+            columns=columns,
+            encoder=encoder,
+            artifact=artifact,
+            fused=artifact == FUSED_MODEL_FILE,
+            version=self._read_version(signature),
+            loaded_at=datetime.now(timezone.utc),
+            load_seconds=time.perf_counter() - started,
+            signature=signature,
+        )
+
+    def load(self):
+        """Load the artifacts from disk and swap them in. Returns the new bundle or None."""
+        with self._lock:
+            return self._reload_locked(self._signature())
+
+    def _reload_locked(self, signature):
+        self._last_check = time.monotonic()
+        try:
+            bundle = self._load_bundle(signature)
+        except Exception as e:
+            # Keep serving the previous bundle (if any) and don't retry until
+            # the artifacts change again.
+            self._last_error = str(e)
+            self._failed_signature = signature
+            logger.error("Error loading model, preprocessor, or columns: %s", e)
+            return self._bundle
+        self._last_error = None
+        self._failed_signature = None
+        self._bundle = bundle
+        record_model(bundle)
+        logger.info("Loaded model version %s in %.3fs", bundle.version, bundle.load_seconds)
+        return bundle
+
+    def unload(self):
+        """Drop the loaded bundle; the next ``get()`` loads it again."""
+        with self._lock:
+            self._bundle = None
+            self._last_check = 0.0
+            self._failed_signature = None
+
+    def get(self):
+        """Return the current bundle, reloading it first if the artifacts changed."""
+        bundle = self._bundle
+        # Without a bundle, wait on the lock: another thread may be loading it
+        if bundle is not None and time.monotonic() - self._last_check < self.reload_interval:
+            return bundle
+
+        with self._lock:
+            if time.monotonic() - self._last_check < self.reload_interval:
+                return self._bundle
+            self._last_check = time.monotonic()
+            signature = self._signature()
+            bundle = self._bundle
+            if bundle is not None and bundle.signature == signature:
+                return bundle
+            if signature == self._failed_signature:
+                return bundle
+            return self._reload_locked(signature)
+
+    def info(self):
+        bundle = self._bundle
+        info = {
+            'loaded': bundle is not None,
+            'model_dir': str(self.model_dir),
+            'reload_interval': self.reload_interval,
+            'last_error': self._last_error,
+        }
+        if bundle is not None:
+            info.update({
+                'version': bundle.version,
+                'model_type': type(bundle.model).__name__,
+                'artifact': bundle.artifact,
+                'fused': bundle.fused,
+                'feature_count': len(bundle.columns),
+                'loaded_at': bundle.loaded_at.isoformat(),
+                'load_time_ms': round(bundle.load_seconds * 1000, 3),
+            })
+        return info
+
+
+registry = ModelRegistry()
@@ -0,0 +1,103 @@
+"""
+Incrementally maintained PredictionRollup totals.
+
+Every code path that writes PredictionResult rows calls ``record`` inside the
+same transaction, so the rollups always match the raw table. ``rebuild``
+recomputes them from scratch and ``check`` compares them against the raw
+table; both are exposed through the ``rebuild_rollups`` management command.
+"""
+import math
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .cache import analytics_cache
+from .models import PredictionResult, PredictionRollup
+
+
+def rollup_key(category, region, seasonality):
+    return (category, region, seasonality or '')
+
+
+def _deltas(results, sign):
+    deltas = {}
+    for result in results:
+        key = rollup_key(result.category, result.region, result.seasonality)
+        value = float(result.predicted_sales)
+        count, total, total_sq = deltas.get(key, (0, 0.0, 0.0))
+        deltas[key] = (count + sign, total + sign * value, total_sq + sign * value * value)
+    return deltas
+
+
+def record(results, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) PredictionResult objects from the
+    rollups. Call it in the transaction that writes the rows.
+    """
+    transaction.on_commit(analytics_cache.bump)
+    for (category, region, seasonality), (count, total, total_sq) in _deltas(results, sign).items():
+        key = {'category': category, 'region': region, 'seasonality': seasonality}
+        changes = {
+            'count': F('count') + count,
+            'sum': F('sum') + total,
+            'sum_sq': F('sum_sq') + total_sq,
+        }
+        if PredictionRollup.objects.filter(**key).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                PredictionRollup.objects.create(count=count, sum=total, sum_sq=total_sq, **key)
+        except IntegrityError:
+            # Another writer created the group first
+            PredictionRollup.objects.filter(**key).update(**changes)
+
+
+def aggregate_raw():
+    """Totals per rollup key computed from the raw PredictionResult table."""
+    totals = {}
+    groups = PredictionResult.objects.order_by().values('category', 'region', 'seasonality').annotate(
+        n=Count('id'),
+        total=Sum('predicted_sales'),
+        total_sq=Sum(F('predicted_sales') * F('predicted_sales')),
+    )
+    for group in groups:
+        key = rollup_key(group['category'], group['region'], group['seasonality'])
+        count, total, total_sq = totals.get(key, (0, 0.0, 0.0))
+        totals[key] = (
+            count + group['n'],
+            total + (group['total'] or 0.0),
+            total_sq + (group['total_sq'] or 0.0),
+        )
+    return totals
+
+
+@transaction.atomic
+def rebuild():
+    """Replace all rollups with totals recomputed from the raw table. Returns the group count."""
+    totals = aggregate_raw()
+    PredictionRollup.objects.all().delete()
+    PredictionRollup.objects.bulk_create([
+        PredictionRollup(category=category, region=region, seasonality=seasonality,
+                         count=count, sum=total, sum_sq=total_sq)
+        for (category, region, seasonality), (count, total, total_sq) in totals.items()
+    ])
+    transaction.on_commit(analytics_cache.bump)
+    return len(totals)
+
+
+def check(rel_tol=1e-9, abs_tol=1e-6):
+    """Compare the rollups with the raw table. Returns a list of mismatch descriptions."""
+    expected = aggregate_raw()
+    actual = {
+        rollup_key(rollup.category, rollup.region, rollup.seasonality): (rollup.count, rollup.sum, rollup.sum_sq)
+        for rollup in PredictionRollup.objects.all()
+    }
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, (0, 0.0, 0.0))
+        have = actual.get(key, (0, 0.0, 0.0))
+        if want[0] != have[0] or not all(
+            math.isclose(w, h, rel_tol=rel_tol, abs_tol=abs_tol) for w, h in zip(want[1:], have[1:])
+        ):
+            mismatches.append(f"{key}: expected (count, sum, sum_sq)={want}, rollup has {have}")
+    return mismatches
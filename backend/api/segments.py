@@ -0,0 +1,193 @@
+"""
+Per-segment models (``data_pipeline.py --segments``) for the serving path.
+
+``segments/index.json`` next to the global artifacts names the segments
+that have their own model. A request is routed to the first level of the
+index (most specific first) whose segment has one, e.g.
+``region=North,category=Toys`` before ``region=North``. Otherwise the
+global model serves it.
+
+Segment models share the global bundle's columns and preprocessor, so a
+row is encoded once whatever model scores it. They are loaded lazily on
+first use and kept in a per-process LRU bounded by
+``SEGMENT_MODEL_CACHE_MB``, measured by artifact size on disk. The index
+and the cache belong to one global bundle and are dropped when it is
+reloaded.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+
+from .metrics import Counter, Gauge
+from .registry import FUSED_MODEL_FILE, load_model, registry
+
+logger = logging.getLogger(__name__)
+
+SEGMENTS_DIR = 'segments'
+INDEX_FILE = 'index.json'
+
+
+@dataclass(frozen=True)
+class SegmentModel:
+    name: str
+    model: object
+    artifact: str
+    fused: bool
+    nbytes: int
+    load_seconds: float
+
+
+def route(index, data):
+    """The name of the most specific segment with a model for ``data``, or None."""
+    if index is None:
+        return None
+    for level in index['levels']:
+        name = ','.join(f'{field}={data[field]}' for field in level.split(','))
+        if name in index['segments']:
+            return name
+    return None
+
+
+class SegmentRegistry:
+
+    def __init__(self, model_dir=None):
+        self._model_dir = model_dir
+        self._signature = None
+        self._index = None
+        self._models = OrderedDict()
+        self._failed = set()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.hits = Counter('segment_model_hits_total', 'Segment model lookups served from memory')
+        self.loads = Counter('segment_model_loads_total', 'Segment models loaded from disk')
+        self.evictions = Counter('segment_model_evictions_total',
+                                 'Segment models evicted as least recently used')
+        self.load_errors = Counter('segment_model_load_errors_total',
+                                   'Segment models that failed to load; the global model served instead')
+        self.resident_bytes = Gauge('segment_model_resident_bytes', 'Artifact bytes of the loaded segment models')
+
+    @property
+    def model_dir(self):
+        return Path(self._model_dir) if self._model_dir is not None else registry.model_dir
+
+    @property
+    def capacity_bytes(self):
+        return int(getattr(settings, 'SEGMENT_MODEL_CACHE_MB', 256) * 1024 * 1024)
+
+    def _check_fork(self):
+        # Loaded models are per process; don't inherit the parent's across fork
+        if self._pid != os.getpid():
+            self._signature = None
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    def _reset_locked(self, bundle):
+        self._signature = bundle.signature
+        self._models.clear()
+        self._failed.clear()
+        self._nbytes = 0
+        self.resident_bytes.set(0)
+        self._index = None
+        if not getattr(settings, 'SEGMENT_MODELS', True):
+            return
+        try:
+            with open(self.model_dir / SEGMENTS_DIR / INDEX_FILE) as f:
+                self._index = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error("Ignoring unreadable segment index: %s", e)
+
+    def index(self, bundle):
+        """The segment index that goes with ``bundle``, or None when it has no segments."""
+        self._check_fork()
+        if self._signature != bundle.signature:
+            with self._lock:
+                if self._signature != bundle.signature:
+                    self._reset_locked(bundle)
+        return self._index
+
+    def routes(self, bundle, rows):
+        """The segment name (or None for the global model) of every validated request dict."""
+        index = self.index(bundle)
+        if index is None:
+            return [None] * len(rows)
+        return [route(index, data) for data in rows]
+
+    def get(self, bundle, name):
+        """The loaded model of segment ``name``, or None if it cannot be loaded."""
+        index = self.index(bundle)
+        if index is None or name not in index['segments']:
+            return None
+        with self._lock:
+            segment = self._models.get(name)
+            if segment is not None:
+                self._models.move_to_end(name)
+                self.hits.inc()
+                return segment
+            if name in self._failed:
+                return None
+            # Loaded under the lock: concurrent misses for one segment load it once
+            segment = self._load(name, index['segments'][name])
+            if segment is None:
+                self._failed.add(name)
+                return None
+            self._models[name] = segment
+            self._nbytes += segment.nbytes
+            while self._nbytes > self.capacity_bytes and len(self._models) > 1:
+                _, evicted = self._models.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self.evictions.inc()
+            self.resident_bytes.set(self._nbytes)
+            return segment
+
+    def _load(self, name, entry):
+        started = time.perf_counter()
+        directory = self.model_dir / SEGMENTS_DIR / entry['path']
+        try:
+            model, artifact = load_model(directory)
+            nbytes = (directory / artifact).stat().st_size
+        except Exception as e:
+            self.load_errors.inc()
+            logger.error("Error loading segment model %s: %s", name, e)
+            return None
+        self.loads.inc()
+        return SegmentModel(name, model, artifact, artifact == FUSED_MODEL_FILE, nbytes,
+                            time.perf_counter() - started)
+
+    def clear(self):
+        with self._lock:
+            self._signature = None
+            self._models.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        index = self._index if self._pid == os.getpid() else None
+        models = list(self._models.values()) if self._pid == os.getpid() else []
+        return {
+            'enabled': getattr(settings, 'SEGMENT_MODELS', True),
+            'levels': index['levels'] if index else [],
+            'segments': len(index['segments']) if index else 0,
+            'capacity_bytes': self.capacity_bytes,
+            'resident_bytes': sum(segment.nbytes for segment in models),
+            'loaded': [
+                {'name': segment.name, 'artifact': segment.artifact, 'bytes': segment.nbytes,
+                 'load_time_ms': round(segment.load_seconds * 1000, 3)}
+                for segment in models
+            ],
+            'hits': self.hits.value,
+            'loads': self.loads.value,
+            'evictions': self.evictions.value,
+            'load_errors': self.load_errors.value,
+        }
+
+
+segment_models = SegmentRegistry()
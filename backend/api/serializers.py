@@ -1,10 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
 from rest_framework import serializers
-from .models import PredictionResult
+from .models import MarketData, PredictionResult
 
 class PredictionResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = PredictionResult
         fields = '__all__'
+        read_only_fields = ['duplicate_of']
+
+class MarketDataSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MarketData
+        exclude = ['id']
+        # Rows for an existing (store_id, product_id, date) replace it
+        validators = []
+
+class AccuracyQuerySerializer(serializers.Serializer):
+    """Query parameters of /api/model/accuracy/."""
+    window_days = serializers.IntegerField(min_value=1, max_value=366, default=7)
+    periods = serializers.IntegerField(min_value=1, max_value=366, default=1)
+    date_to = serializers.DateField(required=False)
+    # Comma-separated subset of category, region, seasonality
+    group_by = serializers.CharField(required=False, default='category,region,seasonality')
+
+    def validate_group_by(self, value):
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        unknown = sorted(set(fields) - {'category', 'region', 'seasonality'})
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(unknown)}")
+        return tuple(dict.fromkeys(fields))
 
 class PredictionRequestSerializer(serializers.Serializer):
     store_id = serializers.IntegerField()
@@ -20,4 +46,68 @@ class PredictionRequestSerializer(serializers.Serializer):
     weather_condition = serializers.CharField(max_length=100)
     holiday_promotion = serializers.CharField(max_length=100)
     competitor_pricing = serializers.FloatField()
-    seasonality = serializers.CharField(max_length=100)
\ No newline at end of file
+    seasonality = serializers.CharField(max_length=100)
+    # Optional client-generated id; retries with the same one return the stored row
+    prediction_uuid = serializers.UUIDField(required=False)
+
+
+class ScalarOrSeriesField(serializers.Field):
+    """One value used for every day of a forecast, or a list with one value per day."""
+
+    def __init__(self, child, **kwargs):
+        self.child = child
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            return [self.child.run_validation(item) for item in data]
+        return self.child.run_validation(data)
+
+    def to_representation(self, value):
+        return value
+
+class ForecastRequestSerializer(serializers.Serializer):
+    store_id = serializers.IntegerField()
+    product_id = serializers.IntegerField()
+    category = serializers.CharField(max_length=100)
+    region = serializers.CharField(max_length=100)
+    start_date = serializers.DateField()
+    # Either end_date (inclusive) or days
+    end_date = serializers.DateField(required=False)
+    days = serializers.IntegerField(required=False, min_value=1)
+    inventory_level = ScalarOrSeriesField(serializers.FloatField())
+    units_ordered = ScalarOrSeriesField(serializers.FloatField())
+    demand_forecast = ScalarOrSeriesField(serializers.FloatField())
+    price = ScalarOrSeriesField(serializers.FloatField())
+    discount = ScalarOrSeriesField(serializers.FloatField())
+    weather_condition = ScalarOrSeriesField(serializers.CharField(max_length=100))
+    holiday_promotion = ScalarOrSeriesField(serializers.CharField(max_length=100))
+    competitor_pricing = ScalarOrSeriesField(serializers.FloatField())
+    seasonality = ScalarOrSeriesField(serializers.CharField(max_length=100))
+
+    def validate(self, attrs):
+        start = attrs['start_date']
+        if 'end_date' in attrs:
+            days = (attrs['end_date'] - start).days + 1
+            if 'days' in attrs and attrs['days'] != days:
+                raise serializers.ValidationError("days does not match start_date..end_date")
+        elif 'days' in attrs:
+            days = attrs['days']
+        else:
+            raise serializers.ValidationError("Either end_date or days is required")
+        if days < 1:
+            raise serializers.ValidationError("end_date must not be before start_date")
+        max_days = settings.FORECAST_MAX_DAYS
+        if days > max_days:
+            raise serializers.ValidationError(f"A forecast covers at most {max_days} days")
+
+        errors = {
+            name: f"Expected {days} values (one per day), got {len(value)}"
+            for name, value in attrs.items()
+            if isinstance(value, list) and len(value) != days
+        }
+        if errors:
+            raise serializers.ValidationError(errors)
+        attrs['days'] = days
+        attrs['end_date'] = start + timedelta(days=days - 1)
+        return attrs
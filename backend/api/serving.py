@@ -0,0 +1,210 @@
+"""
+Compact serving predictors exported by data_pipeline.py.
+
+The classes here hold nothing but NumPy arrays, so an uncompressed joblib
+dump of one can be loaded with ``mmap_mode='r'`` and every worker process
+maps the same read-only pages instead of unpickling its own copy. Tree
+ensembles are flattened into one set of node arrays and evaluated for all
+trees at once, which avoids the per-tree Python objects and joblib dispatch
+that make ``RandomForestRegressor.predict`` slow on a single row.
+
+``fuse_scaler`` folds the training StandardScaler into a predictor so the
+API can score raw encoded rows without a ``preprocessor.transform`` call.
+
+Like features.py, this module must not import Django so the training
+pipeline can build the same objects the API loads.
+"""
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge, SGDRegressor
+
+LINEAR_MODELS = (LinearRegression, Ridge, Lasso, ElasticNet, SGDRegressor)
+
+# Rows scored per pass of TreeEnsemblePredictor, bounding its (rows, trees) scratch arrays
+TREE_BATCH_ROWS = 1024
+
+
+class LinearPredictor:
+    """X @ coef + intercept."""
+
+    def __init__(self, coef, intercept):
+        self.coef = np.ascontiguousarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+
+
+class TreeEnsemblePredictor:
+    """
+    Every tree of a forest or boosted ensemble in shared node arrays.
+
+    ``roots`` holds each tree's first node. A prediction walks all trees
+    one level per step and returns ``offset + scale * sum(leaf values)``:
+    the mean for a forest, init + learning_rate * sum for boosting.
+    """
+
+    def __init__(self, feature, threshold, children_left, children_right, value, roots, depth,
+                 scale=1.0, offset=0.0, input_dtype='float32'):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.scale = float(scale)
+        self.offset = float(offset)
+        self.input_dtype = input_dtype
+
+    @classmethod
+    def from_trees(cls, trees, scale=1.0, offset=0.0):
+        """Flatten sklearn ``Tree`` objects (``estimator.tree_``), renumbering child indices."""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        start = 0
+        for tree in trees:
+            is_leaf = tree.children_left < 0
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            # Leaves keep -1 so the walk can tell them apart
+            lefts.append(np.where(is_leaf, -1, tree.children_left + start))
+            rights.append(np.where(is_leaf, -1, tree.children_right + start))
+            values.append(tree.value[:, 0, 0])
+            roots.append(start)
+            start += tree.node_count
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children_left=np.concatenate(lefts).astype(np.intp),
+            children_right=np.concatenate(rights).astype(np.intp),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            depth=max(tree.max_depth for tree in trees),
+            scale=scale,
+            offset=offset,
+        )
+
+    def _predict_block(self, X):
+        rows = np.arange(len(X))[:, None]
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        for _ in range(self.depth):
+            left = self.children_left[nodes]
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(left < 0, nodes, np.where(go_left, left, self.children_right[nodes]))
+        return self.offset + self.scale * self.value[nodes].sum(axis=1)
+
+    def predict(self, X):
+        # sklearn trees compare float32 features with float64 thresholds;
+        # fused predictors compare raw float64 features
+        X = np.asarray(X, dtype=self.input_dtype)
+        if len(X) <= TREE_BATCH_ROWS:
+            return self._predict_block(X)
+        return np.concatenate([
+            self._predict_block(X[start:start + TREE_BATCH_ROWS])
+            for start in range(0, len(X), TREE_BATCH_ROWS)
+        ])
+
+
+def compact_predictor(model):
+    """The array-backed equivalent of a fitted sklearn regressor, or None if it has none."""
+    if isinstance(model, LINEAR_MODELS):
+        return LinearPredictor(np.ravel(model.coef_), np.ravel(model.intercept_)[0])
+    if isinstance(model, RandomForestRegressor):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        return TreeEnsemblePredictor.from_trees(trees, scale=1.0 / len(trees))
+    if isinstance(model, GradientBoostingRegressor) and model.loss == 'squared_error':
+        if model.init_ == 'zero':
+            offset = 0.0
+        else:
+            offset = float(np.ravel(model.init_.predict(np.zeros((1, model.n_features_in_))))[0])
+        trees = [estimator.tree_ for estimator in model.estimators_[:, 0]]
+        return TreeEnsemblePredictor.from_trees(trees, scale=model.learning_rate, offset=offset)
+    return None
+
+
+def _ordered(x):
+    # float64 -> int64 keys in the same order (-0.0 and 0.0 share key 0)
+    bits = x.view(np.int64)
+    magnitude = bits & np.int64(0x7FFFFFFFFFFFFFFF)
+    return np.where(bits < 0, -magnitude, magnitude)
+
+
+def _from_ordered(key):
+    bits = np.where(key < 0, (-key) | np.int64(-0x8000000000000000), key)
+    return bits.view(np.float64)
+
+
+def raw_thresholds(threshold, scale, mean):
+    """
+    The largest float64 x with ``float32((x - mean) / scale) <= threshold``,
+    per element: the raw-unit split that sends exactly the rows sklearn
+    sends left. sklearn scales in float64 and then compares the float32
+    cast, so ``threshold * scale + mean`` can be off by the float32
+    rounding step. Both sides are monotone in x, so this bisects over the
+    ordered float64 values, vectorized over all nodes.
+    """
+    def left(key):
+        with np.errstate(over='ignore', invalid='ignore'):
+            return ((_from_ordered(key) - mean) / scale).astype(np.float32) <= threshold
+
+    finite = np.finfo(np.float64).max
+    low_limit, high_limit = _ordered(np.array([-finite, finite]))
+    guess = _ordered(np.asarray(threshold * scale + mean, dtype=np.float64))
+    # Widen [low, high] around the guess until left(low) and not left(high).
+    # The guess is off by about one float32 step, i.e. up to ~2**29 float64
+    # steps; 2**52 keeps the key arithmetic clear of int64 overflow.
+    low, high = guess, guess
+    for exponent in range(53):
+        low_bad = ~left(low) & (low > low_limit)
+        high_bad = left(high) & (high < high_limit)
+        if not (low_bad.any() or high_bad.any()):
+            break
+        step = np.int64(1) << np.int64(exponent)
+        low = np.where(low_bad, np.maximum(guess - step, low_limit), low)
+        high = np.where(high_bad, np.minimum(guess + step, high_limit), high)
+    # Invariant: left(low), not left(high), for nodes inside the finite range
+    while True:
+        open_ = high - low > 1
+        if not open_.any():
+            break
+        middle = low + (high - low) // 2
+        go_left = left(middle)
+        low = np.where(open_ & go_left, middle, low)
+        high = np.where(open_ & ~go_left, middle, high)
+    result = _from_ordered(low)
+    result = np.where(left(low), result, -np.inf)
+    return np.where(left(high), np.inf, result)
+
+
+def fuse_scaler(predictor, scaler):
+    """
+    Fold a fitted StandardScaler into a compact predictor so it scores raw
+    encoded features: linear coefficients are divided by the scale and the
+    intercept absorbs the mean; tree thresholds are mapped back to raw units
+    with ``raw_thresholds``, so the float64 comparison of a raw feature
+    agrees with sklearn's float32 comparison of the scaled one.
+    """
+    n_features = scaler.n_features_in_
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+    if isinstance(predictor, LinearPredictor):
+        coef = predictor.coef / scale
+        return LinearPredictor(coef, predictor.intercept - coef @ mean)
+    if isinstance(predictor, TreeEnsemblePredictor):
+        internal = predictor.children_left >= 0
+        feature = predictor.feature
+        threshold = np.array(predictor.threshold)
+        threshold[internal] = raw_thresholds(threshold[internal], scale[feature[internal]], mean[feature[internal]])
+        return TreeEnsemblePredictor(
+            feature=np.array(feature),
+            threshold=threshold,
+            children_left=np.array(predictor.children_left),
+            children_right=np.array(predictor.children_right),
+            value=np.array(predictor.value),
+            roots=np.array(predictor.roots),
+            depth=predictor.depth,
+            scale=predictor.scale,
+            offset=predictor.offset,
+            input_dtype='float64',
+        )
+    raise TypeError(f"Cannot fuse a scaler into {type(predictor).__name__}")
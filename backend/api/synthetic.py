@@ -0,0 +1,70 @@
+"""
+Synthetic market data shaped like retail_store_inventory.csv, used by the
+``benchmark`` command so it can run offline and at any size.
+
+Rows enumerate (date, store, product) like the real file: every day has one
+row per store and product, so generated data never collides with the unique
+MarketData constraint. ``offset`` continues the enumeration, which lets large
+tables be generated chunk by chunk with the same result as in one go.
+"""
+import numpy as np
+import pandas as pd
+
+from .features import REQUEST_FIELDS
+
+STORES = 5
+PRODUCTS = 20
+CATEGORIES = ['Clothing', 'Electronics', 'Furniture', 'Groceries', 'Toys']
+REGIONS = ['East', 'North', 'South', 'West']
+WEATHER = ['Cloudy', 'Rainy', 'Snowy', 'Sunny']
+SEASONS = ['Autumn', 'Spring', 'Summer', 'Winter']
+DISCOUNTS = [0, 5, 10, 15, 20]
+START_DATE = np.datetime64('2022-01-01')
+
+
+def market_frame(n_rows, seed=0, offset=0):
+    """``n_rows`` rows with the CSV's column names, starting at row ``offset``."""
+    rng = np.random.default_rng([seed, offset])
+    index = np.arange(offset, offset + n_rows)
+    per_day = STORES * PRODUCTS
+    demand = rng.uniform(0, 500, n_rows).round(2)
+    price = rng.uniform(10, 100, n_rows).round(2)
+    discount = rng.choice(DISCOUNTS, n_rows)
+    holiday = rng.integers(0, 2, n_rows)
+    units_sold = demand * 0.8 - 0.5 * price + 2.0 * discount + 15.0 * holiday + rng.normal(0, 10, n_rows)
+    return pd.DataFrame({
+        'Date': (START_DATE + index // per_day).astype(str),
+        'Store ID': np.char.add('S', np.char.zfill((index % STORES + 1).astype(str), 3)),
+        'Product ID': np.char.add('P', np.char.zfill((index // STORES % PRODUCTS + 1).astype(str), 4)),
+        'Category': rng.choice(CATEGORIES, n_rows),
+        'Region': rng.choice(REGIONS, n_rows),
+        'Inventory Level': rng.integers(50, 500, n_rows),
+        'Units Sold': units_sold.clip(0).round(),
+        'Units Ordered': rng.integers(20, 200, n_rows),
+        'Demand Forecast': demand,
+        'Price': price,
+        'Discount': discount,
+        'Weather Condition': rng.choice(WEATHER, n_rows),
+        'Holiday/Promotion': holiday,
+        'Competitor Pricing': (price * rng.uniform(0.8, 1.2, n_rows)).round(2),
+        'Seasonality': rng.choice(SEASONS, n_rows),
+    })
+
+
+def write_csv(path, n_rows, seed=0, chunk_size=500000):
+    """Write ``n_rows`` synthetic rows to ``path`` in chunks. Returns the path."""
+    for offset in range(0, n_rows, chunk_size):
+        frame = market_frame(min(chunk_size, n_rows - offset), seed, offset)
+        frame.to_csv(path, mode='w' if offset == 0 else 'a', header=offset == 0, index=False)
+    return path
+
+
+def prediction_requests(n_rows, seed=0):
+    """``n_rows`` distinct /api/predict/ payloads."""
+    frame = market_frame(n_rows, seed)
+    frame['Store ID'] = frame['Store ID'].str[1:].astype(int)
+    frame['Product ID'] = frame['Product ID'].str[1:].astype(int)
+    frame['Holiday/Promotion'] = frame['Holiday/Promotion'].astype(str)
+    fields = {column: field for field, column in REQUEST_FIELDS.items()}
+    fields['Date'] = 'date'
+    return frame[list(fields)].rename(columns=fields).to_dict('records')
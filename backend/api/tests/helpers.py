@@ -0,0 +1,105 @@
+"""Request payloads, rows and model fixtures shared by the api tests."""
+import os
+import shutil
+import sys
+import tempfile
+
+import joblib
+import pandas as pd
+from django.test import override_settings
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+from ..features import DATE, TARGET, FeatureEncoder
+from ..memo import prediction_memo
+from ..registry import COLUMNS_FILE, MODEL_FILE, PREPROCESSOR_FILE, registry
+from ..segments import segment_models
+from ..synthetic import market_frame
+
+# The training pipeline's package sits next to backend/ in the repository
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+
+
+def request_data(row, **extra):
+    """The /api/predict/ payload for one synthetic CSV row."""
+    return {
+        'store_id': int(row['Store ID'][1:]),
+        'product_id': int(row['Product ID'][1:]),
+        'category': row['Category'],
+        'region': row['Region'],
+        'date': row[DATE],
+        'inventory_level': float(row['Inventory Level']),
+        'units_ordered': float(row['Units Ordered']),
+        'demand_forecast': float(row['Demand Forecast']),
+        'price': float(row['Price']),
+        'discount': float(row['Discount']),
+        'weather_condition': row['Weather Condition'],
+        'holiday_promotion': str(row['Holiday/Promotion']),
+        'competitor_pricing': float(row['Competitor Pricing']),
+        'seasonality': row['Seasonality'],
+        **extra,
+    }
+
+
+def market_data(row, **extra):
+    """The /api/actuals/ payload (a MarketData row) for one synthetic CSV row."""
+    data = request_data(row)
+    data['units_sold'] = float(row[TARGET])
+    data.update(extra)
+    return data
+
+
+def prediction(day, store_id=1, product_id=1, **fields):
+    """A /api/predictions/ payload."""
+    return {
+        'store_id': store_id,
+        'product_id': product_id,
+        'category': 'Toys',
+        'region': 'North',
+        'date': day.isoformat(),
+        'predicted_sales': 100.0,
+        'seasonality': 'Winter',
+        **fields,
+    }
+
+
+class TrainedModelMixin:
+    """
+    Trains a small LinearRegression on synthetic rows into a temporary
+    MODEL_DIR for the whole class, and starts every test from an unloaded
+    registry and an empty memo.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.model_dir = tempfile.mkdtemp()
+        cls.frame = market_frame(500, seed=4)
+        encoder = FeatureEncoder.fit(cls.frame)
+        X = pd.DataFrame(encoder.transform_frame(cls.frame), columns=encoder.columns)
+        scaler = StandardScaler().fit(X)
+        joblib.dump(LinearRegression().fit(scaler.transform(X), cls.frame[TARGET]), f'{cls.model_dir}/{MODEL_FILE}')
+        joblib.dump(scaler, f'{cls.model_dir}/{PREPROCESSOR_FILE}')
+        joblib.dump(encoder.columns, f'{cls.model_dir}/{COLUMNS_FILE}')
+        cls.row = cls.frame.iloc[0]
+        cls.model_settings = override_settings(MODEL_DIR=cls.model_dir)
+        cls.model_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.model_settings.disable()
+        shutil.rmtree(cls.model_dir, ignore_errors=True)
+        cls.reset()
+        super().tearDownClass()
+
+    @staticmethod
+    def reset():
+        registry.unload()
+        segment_models.clear()
+        prediction_memo.clear()
+
+    def setUp(self):
+        super().setUp()
+        self.reset()
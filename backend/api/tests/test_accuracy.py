@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import accuracy, actuals
+from ..models import MarketData, PredictionResult
+from ..synthetic import market_frame
+from .helpers import market_data, prediction
+from .test_history import market_row
+
+
+class AccuracyConsistencyTests(TestCase):
+    """PredictionAccuracy stays equal to totals recomputed from the raw table."""
+
+    def create(self, day=date(2024, 1, 1), **fields):
+        response = self.client.post('/api/predictions/', prediction(day, **fields), content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def test_create_update_delete(self):
+        ids = [self.create(store_id=i + 1, actual_sales=actual) for i, actual in enumerate((None, 90.0, 120.0))]
+        self.assertEqual(accuracy.check(), [])
+        self.assertEqual(accuracy.drift()['overall']['count'], 2)
+
+        response = self.client.patch(f'/api/predictions/{ids[0]}/', {'actual_sales': 80.0, 'region': 'South'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(accuracy.check(), [])
+
+        response = self.client.patch(f'/api/predictions/{ids[1]}/', {'actual_sales': None},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(accuracy.check(), [])
+
+        self.assertEqual(self.client.delete(f'/api/predictions/{ids[2]}/').status_code, 204)
+        self.assertEqual(accuracy.check(), [])
+        self.assertEqual(accuracy.drift()['overall']['count'], 1)
+
+    def test_ingest_actuals(self):
+        row = market_frame(1, seed=3).iloc[0]
+        self.create(date.fromisoformat(row['Date']), store_id=int(row['Store ID'][1:]),
+                    product_id=int(row['Product ID'][1:]))
+
+        response = self.client.post('/api/actuals/', market_data(row, units_sold=50.0), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {'market_rows': 1, 'predictions_updated': 1})
+        self.assertEqual(PredictionResult.objects.get().actual_sales, 50.0)
+        self.assertEqual(accuracy.check(), [])
+
+        # A correction replaces the earlier figure, in the accuracy totals too
+        self.client.post('/api/actuals/', [market_data(row, units_sold=70.0)], content_type='application/json')
+        self.assertEqual(PredictionResult.objects.get().actual_sales, 70.0)
+        self.assertEqual(MarketData.objects.get().units_sold, 70.0)
+        self.assertEqual(accuracy.check(), [])
+        self.assertEqual(accuracy.drift()['overall']['mae'], 30.0)
+
+    def test_backfill(self):
+        days = [date(2024, 1, 1) + timedelta(days=i) for i in range(5)]
+        for i, day in enumerate(days):
+            self.create(day, actual_sales=95.0 if i == 0 else None)
+        self.create(date(2024, 2, 1))  # no MarketData row: left alone
+        MarketData.objects.bulk_create([market_row(day, units_sold=90.0 + i) for i, day in enumerate(days)])
+
+        call_command('backfill_actuals', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(sorted(PredictionResult.objects.filter(date__month=1).values_list('actual_sales', flat=True)),
+                         [90.0, 91.0, 92.0, 93.0, 94.0])
+        self.assertIsNone(PredictionResult.objects.get(date=date(2024, 2, 1)).actual_sales)
+        self.assertEqual(accuracy.check(), [])
+        # Nothing is stale any more
+        self.assertEqual(actuals.backfill(batch_size=2), 0)
+
+    def test_rolling_windows(self):
+        for i, actual in enumerate((90.0, 110.0, 100.0)):
+            self.create(date(2024, 1, 1) + timedelta(days=i), actual_sales=actual)
+        result = accuracy.rolling(window_days=2, periods=2)
+        self.assertEqual(result['date_to'], date(2024, 1, 3))
+        windows = [(window['date_from'], window['date_to'], window['count'], window['mae'])
+                   for window in result['overall']]
+        self.assertEqual(windows, [(date(2024, 1, 1), date(2024, 1, 2), 2, 10.0),
+                                   (date(2024, 1, 2), date(2024, 1, 3), 2, 5.0)])
+        response = self.client.get('/api/model/accuracy/?window_days=2&periods=2')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['overall']), 2)
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+from django.test import TestCase, override_settings
+
+from ..models import PredictionResult
+from ..predictor import predict_rows
+from ..registry import registry
+from ..serializers import PredictionRequestSerializer
+from .helpers import TrainedModelMixin, request_data
+
+
+@override_settings(PREDICTION_WRITE_BEHIND=False)
+class BatchPredictionTests(TrainedModelMixin, TestCase):
+
+    def payloads(self, n):
+        return [request_data(row) for _, row in self.frame.head(n).iterrows()]
+
+    def expected(self, payloads):
+        validated = []
+        for payload in payloads:
+            serializer = PredictionRequestSerializer(data=payload)
+            serializer.is_valid(raise_exception=True)
+            validated.append(serializer.validated_data)
+        return predict_rows(registry.get(), validated)
+
+    def post(self, rows, **kwargs):
+        return self.client.post('/api/predict/batch/', rows, content_type='application/json', **kwargs)
+
+    def stream(self, response):
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_invalid_row_fails_alone_and_order_is_kept(self):
+        payloads = self.payloads(5)
+        rows = list(payloads)
+        rows[2] = {**payloads[2], 'price': 'not a number'}
+        response = self.post(rows)
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual((body['count'], body['error_count']), (5, 1))
+        results = body['results']
+        self.assertEqual([result['index'] for result in results], list(range(5)))
+        self.assertIn('price', results[2]['errors'])
+        valid = [0, 1, 3, 4]
+        np.testing.assert_allclose([results[i]['predicted_sales'] for i in valid],
+                                   self.expected([payloads[i] for i in valid]))
+        self.assertEqual(PredictionResult.objects.count(), 4)
+
+    @override_settings(PREDICTION_BATCH_MAX_SIZE=3)
+    def test_too_large(self):
+        response = self.post(self.payloads(4))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(PredictionResult.objects.exists())
+        self.assertEqual(self.post(self.payloads(3)).status_code, 200)
+
+    def test_not_a_list(self):
+        self.assertEqual(self.post(self.payloads(1)[0]).status_code, 400)
+
+    def test_ndjson_when_asked(self):
+        payloads = self.payloads(3)
+        response = self.post(payloads, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        results = self.stream(response)
+        self.assertEqual([result['index'] for result in results], [0, 1, 2])
+        np.testing.assert_allclose([result['predicted_sales'] for result in results], self.expected(payloads))
+
+        # NDJSON request bodies are accepted too
+        body = '\n'.join(json.dumps(payload) for payload in payloads)
+        response = self.client.post('/api/predict/batch/', body, content_type='application/x-ndjson',
+                                    HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(len(self.stream(response)), 3)
+
+    @override_settings(PREDICTION_BATCH_STREAM_THRESHOLD=4, PREDICTION_BATCH_CHUNK_SIZE=2)
+    def test_large_batches_stream_in_chunks(self):
+        payloads = self.payloads(5)
+        rows = list(payloads)
+        rows[3] = {**payloads[3], 'store_id': None}
+        response = self.post(rows)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Model-Version'], registry.get().version)
+        results = self.stream(response)
+        # Indexes are of the whole batch, not of each chunk
+        self.assertEqual([result['index'] for result in results], list(range(5)))
+        self.assertIn('errors', results[3])
+        valid = [0, 1, 2, 4]
+        np.testing.assert_allclose([results[i]['predicted_sales'] for i in valid],
+                                   self.expected([payloads[i] for i in valid]))
+
+        # At the threshold the batch is answered as one JSON document
+        response = self.post(payloads[:4])
+        self.assertEqual(response.json()['count'], 4)
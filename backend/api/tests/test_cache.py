@@ -0,0 +1,48 @@
+from datetime import date
+
+from django.core.cache import caches
+from django.test import TestCase
+
+from ..cache import analytics_cache
+from .helpers import prediction
+
+
+class AnalyticsCacheTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def create(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/predictions/', prediction(date(2024, 1, 1), **fields),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_etag_revalidates_with_304(self):
+        self.create()
+        for path in ('/api/stats/', '/api/seasonal-analysis/', '/api/async/stats/'):
+            first = self.client.get(path)
+            self.assertEqual(first.status_code, 200)
+            etag = first['ETag']
+            self.assertEqual(first['Cache-Control'], 'no-cache')
+
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertFalse(response.content)
+            # Weak validators and lists match too
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=f'"other", W/{etag}').status_code, 304)
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_hits_until_a_write(self):
+        self.create()
+        etag = self.client.get('/api/stats/')['ETag']
+        hits = analytics_cache.hits.value
+        self.assertEqual(self.client.get('/api/stats/')['ETag'], etag)
+        self.assertEqual(analytics_cache.hits.value, hits + 1)
+
+        self.create(predicted_sales=300.0)
+        response = self.client.get('/api/stats/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['prediction_count'], 2)
@@ -0,0 +1,63 @@
+import asyncio
+
+import numpy as np
+from django.test import TestCase, override_settings
+
+from ..coalescer import coalescer
+from ..predictor import memo_lookup, predict_rows
+from ..registry import registry
+from ..serializers import PredictionRequestSerializer
+from .helpers import TrainedModelMixin, request_data
+
+
+@override_settings(PREDICTION_COALESCE=True, PREDICTION_COALESCE_WINDOW_MS=100.0, PREDICTION_WRITE_BEHIND=False)
+class CoalescerTests(TrainedModelMixin, TestCase):
+
+    def payloads(self, n):
+        return [request_data(row) for _, row in self.frame.head(n).iterrows()]
+
+    def validated(self, n):
+        validated = []
+        for payload in self.payloads(n):
+            serializer = PredictionRequestSerializer(data=payload)
+            serializer.is_valid(raise_exception=True)
+            validated.append(serializer.validated_data)
+        return validated
+
+    async def test_concurrent_requests_share_a_batch(self):
+        payloads = self.payloads(8)
+        before = coalescer.batch_size.snapshot()
+        responses = await asyncio.gather(*(
+            self.async_client.post('/api/async/predict/', payload, content_type='application/json')
+            for payload in payloads
+        ))
+        after = coalescer.batch_size.snapshot()
+
+        for response in responses:
+            self.assertEqual(response.status_code, 200, response.content)
+        rows = after['sum'] - before['sum']
+        batches = after['count'] - before['count']
+        self.assertEqual(rows, len(payloads))
+        self.assertGreater(rows / batches, 1)
+
+        # Each caller gets its own row's prediction back
+        expected = predict_rows(registry.get(), self.validated(len(payloads)))
+        np.testing.assert_allclose([response.json()['predicted_sales'] for response in responses], expected)
+
+    def test_cancelled_caller_does_not_stop_the_worker(self):
+        bundle = registry.get()
+        rows = [row for row, *_ in (memo_lookup(bundle, data) for data in self.validated(3))]
+        # Both rows land in one window; the first caller goes away before it is scored
+        cancelled = coalescer.submit(bundle, rows[0])
+        self.assertTrue(cancelled.cancel())
+        waiting = coalescer.submit(bundle, rows[1])
+        expected = predict_rows(bundle, self.validated(3))
+        self.assertAlmostEqual(waiting.result(timeout=5), expected[1])
+        self.assertAlmostEqual(coalescer.submit(bundle, rows[2]).result(timeout=5), expected[2])
+        self.assertEqual(coalescer.pending, 0)
+
+    def test_sync_view_is_not_coalesced(self):
+        before = coalescer.batch_size.snapshot()['count']
+        response = self.client.post('/api/predict/', self.payloads(1)[0], content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(coalescer.batch_size.snapshot()['count'], before)
@@ -0,0 +1,42 @@
+import numpy as np
+from django.test import SimpleTestCase
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+
+from ..features import TARGET, FeatureEncoder
+from ..synthetic import market_frame
+from . import helpers  # noqa: F401 - makes the pipeline package importable
+from pipeline.compare import compare_models, predict_latency_ms
+
+TIMING_COLUMNS = ('fit_wall', 'fit_cpu', 'predict_ms', 'batch_us_per_row')
+
+
+class CompareModelsTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frame = market_frame(400, seed=10)
+        X = FeatureEncoder.fit(frame).transform_frame(frame)
+        y = frame[TARGET].to_numpy(dtype=np.float64)
+        cls.data = (X[:300], y[:300], X[300:], y[300:])
+
+    def test_timing_columns(self):
+        models = {'Random Forest': RandomForestRegressor(n_estimators=5, random_state=0),
+                  'Linear Regression': LinearRegression()}
+        results = compare_models(models, *self.data, workers=1)
+        # In the order of ``models``, whichever finished first
+        self.assertEqual(list(results), list(models))
+        for name, result in results.items():
+            for column in TIMING_COLUMNS:
+                self.assertGreater(result[column], 0, f'{name} {column}')
+            self.assertGreater(result['artifact_mb'], 0, name)
+            self.assertTrue(np.isfinite(result['rmse']), name)
+
+    def test_predict_latency_times_single_rows(self):
+        model = LinearRegression().fit(self.data[0], self.data[1])
+        calls = []
+        original = model.predict
+        model.predict = lambda X: calls.append(len(X)) or original(X)
+        self.assertGreater(predict_latency_ms(model, self.data[2], repeats=5), 0)
+        self.assertEqual(calls, [1] * 5)
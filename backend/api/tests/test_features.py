@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from ..features import CATEGORICAL_FEATURES, DATE, TARGET, FeatureEncoder
+from ..serializers import PredictionRequestSerializer
+from ..synthetic import market_frame
+from .helpers import request_data
+
+
+def get_dummies(frame):
+    """The encoding data_pipeline.py trained on before FeatureEncoder existed."""
+    dummies = pd.get_dummies(frame.drop(columns=TARGET), columns=CATEGORICAL_FEATURES, drop_first=True, dtype=float)
+    dates = pd.to_datetime(dummies.pop(DATE))
+    dummies['Day'], dummies['Month'], dummies['Year'] = dates.dt.day, dates.dt.month, dates.dt.year
+    return dummies
+
+
+class FeatureEncoderTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.frame = market_frame(400, seed=1)
+        cls.encoder = FeatureEncoder.fit(cls.frame)
+
+    def test_layout_matches_get_dummies(self):
+        dummies = get_dummies(self.frame)
+        self.assertEqual(self.encoder.columns, list(dummies.columns))
+        np.testing.assert_array_equal(self.encoder.transform_frame(self.frame), dummies.to_numpy(dtype=float))
+
+    def test_integer_levels_sort_like_get_dummies(self):
+        # As strings '10' < '2' < '3', so the baseline would be 10 instead of 2
+        frame = self.frame.head(30).copy()
+        frame['Store ID'] = np.tile([2, 10, 3], 10)
+        encoder = FeatureEncoder.fit(frame)
+        dummies = get_dummies(frame)
+        self.assertEqual(encoder.columns, list(dummies.columns))
+        np.testing.assert_array_equal(encoder.transform_frame(frame), dummies.to_numpy(dtype=float))
+
+    def test_sparse_matches_dense(self):
+        np.testing.assert_array_equal(self.encoder.transform_frame_sparse(self.frame).toarray(),
+                                      self.encoder.transform_frame(self.frame))
+
+    def test_requests_encode_like_training_rows(self):
+        expected = self.encoder.transform_frame(self.frame)
+        for i, row in self.frame.head(50).iterrows():
+            serializer = PredictionRequestSerializer(data=request_data(row))
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            np.testing.assert_array_equal(self.encoder.encode(serializer.validated_data), expected[i])
+
+    def test_unknown_levels_encode_as_baseline(self):
+        row = self.frame.iloc[0]
+        serializer = PredictionRequestSerializer(data=request_data(row, region='Mars', store_id=999))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        encoded = self.encoder.encode(serializer.validated_data)
+        for feature in ('Region', 'Store ID'):
+            columns = [i for i, column in enumerate(self.encoder.columns) if column.startswith(feature + '_')]
+            self.assertFalse(encoded[columns].any())
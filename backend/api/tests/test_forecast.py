@@ -0,0 +1,79 @@
+import os
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..forecast import inputs_hash
+from ..predictor import predict_rows
+from ..registry import VERSION_FILE, registry
+from ..serializers import ForecastRequestSerializer, PredictionRequestSerializer
+from .helpers import TrainedModelMixin, request_data
+
+FORECAST = {
+    'store_id': 1, 'product_id': 1, 'category': 'Toys', 'region': 'North', 'start_date': '2024-01-01',
+    'inventory_level': 200.0, 'units_ordered': 50.0, 'demand_forecast': 120.0, 'price': 30.0,
+    'discount': [0.0, 5.0, 10.0], 'weather_condition': 'Sunny', 'holiday_promotion': '0',
+    'competitor_pricing': 31.0, 'seasonality': 'Winter',
+}
+
+
+def validated(**fields):
+    serializer = ForecastRequestSerializer(data={**FORECAST, **fields})
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+class ForecastCacheKeyTests(SimpleTestCase):
+
+    def test_equivalent_ranges_share_a_key(self):
+        self.assertEqual(inputs_hash(validated(days=3)), inputs_hash(validated(end_date='2024-01-03')))
+        self.assertEqual(inputs_hash(validated(days=3)), inputs_hash(dict(reversed(validated(days=3).items()))))
+
+    def test_any_input_changes_the_key(self):
+        key = inputs_hash(validated(days=3))
+        for fields in ({'price': 31.0}, {'discount': [0.0, 5.0, 15.0]}, {'start_date': '2024-01-02'},
+                       {'store_id': 2}):
+            self.assertNotEqual(inputs_hash(validated(days=3, **fields)), key, fields)
+
+
+@override_settings(MODEL_RELOAD_INTERVAL=0)
+class ForecastCacheTests(TrainedModelMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+    def forecast(self, **fields):
+        response = self.client.post('/api/predict/forecast/', {**FORECAST, 'days': 3, **fields},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_hits_until_the_model_version_changes(self):
+        first = self.forecast()
+        self.assertEqual(first['X-Cache'], 'miss')
+        self.assertEqual(self.forecast()['X-Cache'], 'hit')
+        self.assertEqual(self.forecast(price=35.0)['X-Cache'], 'miss')
+
+        path = os.path.join(self.model_dir, VERSION_FILE)
+        self.addCleanup(os.remove, path)
+        with open(path, 'w') as f:
+            f.write('next-version\n')
+        response = self.forecast()
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertEqual(response.json()['model_version'], 'next-version')
+
+    def test_matches_single_row_predictions(self):
+        body = self.forecast().json()
+        rows = []
+        for i, discount in enumerate(FORECAST['discount']):
+            data = request_data(self.row)
+            data.update({key: FORECAST[key] for key in data if key in FORECAST}, discount=discount,
+                        date=(date(2024, 1, 1) + timedelta(days=i)).isoformat())
+            serializer = PredictionRequestSerializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            rows.append(serializer.validated_data)
+        np.testing.assert_allclose([day['predicted_sales'] for day in body['forecast']],
+                                   predict_rows(registry.get(), rows))
@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .. import columnar, history
+from ..features import NUMERIC_FEATURES, TARGET
+from ..models import MarketData
+from ..synthetic import market_frame
+
+
+def market_row(day, store_id=1, units_sold=10.0):
+    return MarketData(date=day, store_id=store_id, product_id=1, category='Toys', region='North',
+                      inventory_level=100.0, units_sold=units_sold, units_ordered=20.0, demand_forecast=50.0,
+                      price=10.5, discount=0.0, weather_condition='Sunny', holiday_promotion='0',
+                      competitor_pricing=11.0, seasonality='Winter')
+
+
+class ColumnarTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def test_replace_month_swaps_every_file_of_the_month(self):
+        frame = market_frame(300, seed=6)  # 2022-01-01 .. 2022-01-03
+        columnar.append(self.root, frame.iloc[:100])
+        columnar.append(self.root, frame.iloc[100:])
+        self.assertEqual(len(columnar.files(self.root)), 2)
+
+        corrected = frame.copy()
+        corrected['Units Sold'] = 7.0
+        written = columnar.replace_month(self.root, '2022-01', corrected)
+
+        self.assertEqual(columnar.files(self.root), written)
+        self.assertEqual(len(written), 1)
+        # No staging or retired month is left behind
+        self.assertEqual(os.listdir(self.root), ['month=2022-01'])
+        result = columnar.read(self.root)
+        self.assertEqual(len(result), len(frame))
+        self.assertTrue((result['Units Sold'] == 7.0).all())
+
+    def test_float32_files_read_back_as_float64(self):
+        frame = market_frame(10, seed=6)
+        legacy = columnar.to_table(frame)
+        legacy = legacy.cast(pa.schema([
+            pa.field(field.name, pa.float32()) if pa.types.is_floating(field.type) else field
+            for field in legacy.schema
+        ]))
+        os.makedirs(os.path.join(self.root, 'month=2022-01'))
+        pq.write_table(legacy, os.path.join(self.root, 'month=2022-01', 'part-legacy.parquet'))
+        columnar.append(self.root, frame)
+        result = columnar.read(self.root)
+        self.assertEqual(len(result), 20)
+        self.assertEqual(result['Price'].dtype, np.float64)
+
+    def test_scans_skip_dot_directories(self):
+        columnar.append(self.root, market_frame(10, seed=6))
+        columnar.append(os.path.join(self.root, '.staging-test'), market_frame(10, seed=7))
+        self.assertEqual(len(columnar.files(self.root)), 1)
+
+
+class HistoryExportTests(TestCase):
+
+    def setUp(self):
+        self.root = os.path.join(tempfile.mkdtemp(), 'history')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.root), ignore_errors=True)
+        days = [date(2024, 1, 30), date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 2)]
+        MarketData.objects.bulk_create([market_row(day, store_id) for day in days for store_id in (1, 2)])
+        # Written well before the first export
+        MarketData.objects.update(updated_at=timezone.now() - timedelta(days=1))
+
+    def exported(self):
+        frame = columnar.read(self.root)
+        return {(row['Date'].date(), row['Store ID']): row['Units Sold'] for _, row in frame.iterrows()}
+
+    def month_files(self, month):
+        return columnar.files(os.path.join(self.root, f'month={month}'))
+
+    def test_appends_new_days_and_rewrites_corrected_months(self):
+        self.assertEqual(history.export(self.root), (8, 2))
+        self.assertEqual(len(self.exported()), 8)
+        february = self.month_files('2024-02')
+
+        # A corrected January row and a new March day
+        corrected = MarketData.objects.get(date=date(2024, 1, 31), store_id=1)
+        corrected.units_sold = 99.0
+        corrected.save()
+        market_row(date(2024, 3, 1)).save()
+
+        rows, files = history.export(self.root)
+        self.assertEqual((rows, files), (5, 2))  # January rewritten whole, March appended
+        exported = self.exported()
+        self.assertEqual(len(exported), 9)
+        self.assertEqual(exported[(date(2024, 1, 31), 'S001')], 99.0)
+        self.assertEqual(exported[(date(2024, 1, 30), 'S001')], 10.0)
+        self.assertEqual(len(self.month_files('2024-01')), 1)
+        # Untouched months keep their files
+        self.assertEqual(self.month_files('2024-02'), february)
+
+        # Rows changed within WATERMARK_SLACK of an export are rewritten again, to the same data
+        history.export(self.root)
+        self.assertEqual(self.exported(), exported)
+
+    def test_round_trip_matches_the_database(self):
+        # Values float32 would round
+        MarketData.objects.update(price=10.1, units_sold=12.3, discount=0.07)
+        history.export(self.root)
+        expected = history.market_frame(MarketData.objects.order_by('date', 'store_id', 'product_id'))
+        frame = columnar.read(self.root).sort_values(['Date', 'Store ID', 'Product ID'], kind='stable')
+        for column in NUMERIC_FEATURES + [TARGET]:
+            self.assertEqual(frame[column].dtype, np.float64)
+            np.testing.assert_array_equal(frame[column].to_numpy(), expected[column].to_numpy())
+        np.testing.assert_array_equal(frame['Store ID'].astype(str).to_numpy(), expected['Store ID'].to_numpy())
+
+    def test_first_export_of_an_untracked_dataset_only_appends(self):
+        columnar.append(self.root, history.market_frame(MarketData.objects.filter(date__month=1)))
+        self.assertEqual(history.export(self.root), (4, 1))
+        self.assertEqual(len(self.exported()), 8)
+
+    def test_rebuild_drops_deleted_rows(self):
+        history.export(self.root)
+        MarketData.objects.filter(date=date(2024, 2, 2)).delete()
+        history.export(self.root, rebuild=True)
+        exported = self.exported()
+        self.assertEqual(len(exported), 6)
+        self.assertFalse(any(day == date(2024, 2, 2) for day, _ in exported))
+        self.assertEqual(set(exported.values()), {10.0})
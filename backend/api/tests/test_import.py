@@ -0,0 +1,126 @@
+import csv
+import os
+import shutil
+import tempfile
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+import pandas as pd
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+from ..models import DataImport, MarketData
+from ..synthetic import write_csv
+
+
+class ImportResumeTests(TransactionTestCase):
+    """Not a TestCase: the importer sets SQLite pragmas that fail inside a transaction."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = write_csv(os.path.join(self.directory, 'market.csv'), 250, seed=5)
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command('import_data', self.path, '--chunk-size', '100', *args, stdout=out)
+        return out.getvalue()
+
+    def test_resumes_after_the_last_committed_chunk(self):
+        bulk_create = MarketData.objects.bulk_create
+        calls = []
+
+        def crash_on_second_chunk(objects, **kwargs):
+            calls.append(len(objects))
+            if len(calls) == 2:
+                raise RuntimeError('crash')
+            return bulk_create(objects, **kwargs)
+
+        with mock.patch.object(MarketData.objects, 'bulk_create', side_effect=crash_on_second_chunk):
+            with self.assertRaisesMessage(CommandError, 'Error importing data: crash'):
+                self.run_import()
+        checkpoint = DataImport.objects.get()
+        self.assertEqual(checkpoint.rows_processed, 100)
+        self.assertFalse(checkpoint.completed)
+        self.assertEqual(MarketData.objects.count(), 100)
+
+        with mock.patch.object(MarketData.objects, 'bulk_create', wraps=bulk_create) as resumed:
+            self.assertIn('Resuming after 100 rows', self.run_import())
+        # Only the rows after the checkpoint are read again
+        self.assertEqual([len(call.args[0]) for call in resumed.call_args_list], [100, 50])
+        self.assertEqual(MarketData.objects.count(), 250)
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.rows_processed, checkpoint.completed), (250, True))
+
+        self.assertIn('already imported', self.run_import())
+
+    def test_changed_file_is_read_again(self):
+        self.run_import()
+        write_csv(self.path, 300, seed=5)
+        output = self.run_import()
+        self.assertNotIn('Resuming', output)
+        # The first 250 rows are the same and updated in place
+        self.assertEqual(MarketData.objects.count(), 300)
+        self.assertEqual(DataImport.objects.get().rows_processed, 300)
+
+    def test_reimport_updates_corrected_values(self):
+        self.run_import()
+        frame = pd.read_csv(self.path)
+        frame.loc[0, 'Units Sold'] = 12345.0
+        frame.to_csv(self.path, index=False)
+        self.run_import()
+        row = frame.iloc[0]
+        stored = MarketData.objects.get(date=row['Date'], store_id=int(row['Store ID'][1:]),
+                                        product_id=int(row['Product ID'][1:]))
+        self.assertEqual(stored.units_sold, 12345.0)
+        self.assertEqual(MarketData.objects.count(), 250)
+
+
+class DuplicateMarketDataMigrationTests(TransactionTestCase):
+    """0006 refuses to run over duplicates instead of deleting them."""
+
+    before = [('api', '0005_indexes')]
+    after = [('api', '0006_market_data_import')]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_duplicates_stop_the_migration_until_deduplicated(self):
+        apps = self.migrate(self.before)
+        HistoricalMarketData = apps.get_model('api', 'MarketData')
+        row = dict(store_id=1, product_id=2, category='Toys', region='North', inventory_level=1.0,
+                   units_sold=10.0, units_ordered=1.0, demand_forecast=1.0, price=1.0, discount=0.0,
+                   weather_condition='Sunny', holiday_promotion='0', competitor_pricing=1.0,
+                   seasonality='Winter')
+        first = HistoricalMarketData.objects.create(date=date(2024, 1, 1), **row)
+        HistoricalMarketData.objects.create(date=date(2024, 1, 1), **{**row, 'units_sold': 20.0})
+        HistoricalMarketData.objects.create(date=date(2024, 1, 2), **row)
+
+        with self.assertRaisesMessage(RuntimeError, 'store 1, product 2, 2024-01-01: 2 rows'):
+            self.migrate(self.after)
+        self.assertEqual(HistoricalMarketData.objects.count(), 3)
+
+        # Listing alone changes nothing; deleting needs a backup
+        call_command('dedupe_market_data', stdout=StringIO())
+        self.assertEqual(HistoricalMarketData.objects.count(), 3)
+        backup = os.path.join(tempfile.mkdtemp(), 'duplicates.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(backup), ignore_errors=True)
+        call_command('dedupe_market_data', '--delete', '--backup', backup, stdout=StringIO())
+
+        self.assertEqual(HistoricalMarketData.objects.count(), 2)
+        self.assertTrue(HistoricalMarketData.objects.filter(id=first.id).exists())
+        with open(backup) as f:
+            removed, = csv.DictReader(f)
+        self.assertEqual(float(removed['units_sold']), 20.0)
+        self.migrate(self.after)
@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+import joblib
+import numpy as np
+from django.test import SimpleTestCase
+from sklearn.dummy import DummyRegressor
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression, SGDRegressor
+from sklearn.preprocessing import StandardScaler
+
+from ..features import TARGET, FeatureEncoder
+from ..synthetic import market_frame
+from . import helpers  # noqa: F401 - makes the pipeline package importable
+from pipeline import incremental
+
+
+class UpdateTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frame = market_frame(600, seed=8)  # six days
+        cls.columns = FeatureEncoder.fit(frame).columns
+        scaler = StandardScaler().fit(FeatureEncoder(cls.columns).transform_frame(frame))
+        cls.X, _, cls.y, cls.dates = incremental.encode(frame, cls.columns, scaler)
+
+    def test_holdout_days_follow_the_update_days(self):
+        update_idx, holdout_idx = incremental.holdout_split(self.dates, holdout_days=2)
+        self.assertEqual(len(update_idx) + len(holdout_idx), len(self.dates))
+        self.assertLess(self.dates[update_idx].max(), self.dates[holdout_idx].min())
+        self.assertEqual(len(np.unique(self.dates[holdout_idx])), 2)
+        # At least one day is always left to learn from
+        update_idx, holdout_idx = incremental.holdout_split(self.dates, holdout_days=10)
+        self.assertEqual(len(np.unique(self.dates[update_idx])), 1)
+        with self.assertRaises(ValueError):
+            incremental.holdout_split(self.dates[:100])
+
+    def test_partial_fit(self):
+        model = SGDRegressor(random_state=0).fit(self.X[:300], self.y[:300])
+        coef = model.coef_.copy()
+        updated, mode = incremental.update(model, self.X[300:], self.y[300:], epochs=2)
+        self.assertEqual(mode, 'partial_fit')
+        self.assertFalse(np.array_equal(updated.coef_, coef))
+        # The served model is left as it was
+        np.testing.assert_array_equal(model.coef_, coef)
+
+    def test_warm_start_adds_trees(self):
+        model = RandomForestRegressor(n_estimators=5, random_state=0).fit(self.X[:300], self.y[:300])
+        updated, mode = incremental.update(model, self.X[300:], self.y[300:], extra_trees=3)
+        self.assertEqual(mode, 'warm_start')
+        self.assertEqual(len(updated.estimators_), 8)
+        self.assertEqual(len(model.estimators_), 5)
+        self.assertFalse(updated.warm_start)
+
+    def test_window_refit(self):
+        window = mock.Mock(return_value=(self.X, self.y))
+        model = LinearRegression().fit(self.X[:300], self.y[:300])
+        updated, mode = incremental.update(model, self.X[300:], self.y[300:], window)
+        self.assertEqual(mode, 'window_refit')
+        window.assert_called_once_with()
+        np.testing.assert_allclose(updated.coef_, LinearRegression().fit(self.X, self.y).coef_)
+
+        # Tree ensembles past max_trees start over from base_trees
+        forest = RandomForestRegressor(n_estimators=5, random_state=0).fit(self.X[:300], self.y[:300])
+        updated, mode = incremental.update(forest, self.X[300:], self.y[300:], window,
+                                           extra_trees=3, max_trees=6, base_trees=4)
+        self.assertEqual(mode, 'window_refit')
+        self.assertEqual(len(updated.estimators_), 4)
+
+
+class PublishGateTests(SimpleTestCase):
+    """data_pipeline.py --incremental publishes an update only if the holdout does not get worse."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import data_pipeline
+        cls.data_pipeline = data_pipeline
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+        os.makedirs('models')
+
+        frame = market_frame(1000, seed=9)  # 2022-01-01 .. 2022-01-10
+        frame.to_csv('data.csv', index=False)
+        trained = frame[frame['Date'] <= '2022-01-03']
+        encoder = FeatureEncoder.fit(frame)
+        X = encoder.transform_frame(trained)
+        self.scaler = StandardScaler().fit(X)
+        joblib.dump(self.scaler, 'models/preprocessor.pkl')
+        joblib.dump(encoder.columns, 'models/columns.pkl')
+        with open('models/training.json', 'w') as f:
+            json.dump({'version': 'v1', 'model': 'Linear Regression', 'trained_through': '2022-01-03'}, f)
+        with open('models/VERSION', 'w') as f:
+            f.write('v1\n')
+        self.X_trained, self.y_trained = self.scaler.transform(X), trained[TARGET].to_numpy()
+
+    def run_pipeline(self, model, candidate=None):
+        joblib.dump(model, 'models/best_model.pkl')
+        argv = ['data_pipeline.py', '--incremental', '--data', 'data.csv', '--holdout-days', '3']
+        with mock.patch.object(sys, 'argv', argv), redirect_stdout(StringIO()) as out:
+            if candidate is None:
+                self.data_pipeline.train_incremental(self.data_pipeline.parse_args())
+            else:
+                with mock.patch.object(incremental, 'update', return_value=(candidate, 'window_refit')):
+                    self.data_pipeline.train_incremental(self.data_pipeline.parse_args())
+        return out.getvalue()
+
+    def version(self):
+        with open('models/VERSION') as f:
+            return f.read().strip()
+
+    def test_worse_candidate_is_not_published(self):
+        model = LinearRegression().fit(self.X_trained, self.y_trained)
+        worse = DummyRegressor(strategy='constant', constant=1e6).fit(self.X_trained[:1], [1e6])
+        output = self.run_pipeline(model, worse)
+        self.assertIn('Not published', output)
+        self.assertEqual(self.version(), 'v1')
+        self.assertIsInstance(joblib.load('models/best_model.pkl'), LinearRegression)
+
+    def test_better_candidate_bumps_the_version(self):
+        # Fitted to shuffled targets: refitting on the window beats it
+        shuffled = np.random.default_rng(0).permutation(self.y_trained)
+        model = LinearRegression().fit(self.X_trained, shuffled)
+        output = self.run_pipeline(model)
+        self.assertIn('Published model version', output)
+        self.assertNotEqual(self.version(), 'v1')
+        with open('models/training.json') as f:
+            training = json.load(f)
+        self.assertEqual(training['previous_version'], 'v1')
+        self.assertEqual(training['version'], self.version())
+        self.assertEqual(training['trained_through'], '2022-01-07')
+        self.assertLess(training['holdout']['after']['rmse'], training['holdout']['before']['rmse'])
@@ -0,0 +1,93 @@
+import os
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..memo import PredictionMemo, prediction_memo
+from ..models import PredictionResult
+from ..registry import VERSION_FILE
+from .helpers import TrainedModelMixin, request_data
+
+DATA = {'store_id': 1, 'product_id': 1, 'date': None, 'category': 'Toys', 'region': 'North',
+        'seasonality': 'Winter'}
+
+
+def key(version, value):
+    return PredictionMemo.key(version, np.array([value], dtype=np.float64))
+
+
+@override_settings(PREDICTION_MEMO_SIZE=2, PREDICTION_MEMO_TTL=60.0)
+class PredictionMemoTests(SimpleTestCase):
+
+    def setUp(self):
+        prediction_memo.clear()
+        self.addCleanup(prediction_memo.clear)
+
+    def put(self, memo_key, value):
+        prediction_memo.put(memo_key, value, None, f'uuid-{value}', DATA)
+
+    def test_least_recently_used_is_evicted(self):
+        a, b, c = key('v1', 1.0), key('v1', 2.0), key('v1', 3.0)
+        self.put(a, 1.0)
+        self.put(b, 2.0)
+        self.assertEqual(prediction_memo.get(a).predicted_sales, 1.0)  # b is now the oldest
+        evictions = prediction_memo.evictions.value
+        self.put(c, 3.0)
+        self.assertEqual(prediction_memo.evictions.value, evictions + 1)
+        self.assertIsNone(prediction_memo.get(b))
+        self.assertIsNotNone(prediction_memo.get(a))
+        self.assertIsNotNone(prediction_memo.get(c))
+
+    def test_entries_expire_after_the_ttl(self):
+        a = key('v1', 1.0)
+        with mock.patch('api.memo.time.monotonic', return_value=1000.0):
+            self.put(a, 1.0)
+        with mock.patch('api.memo.time.monotonic', return_value=1059.0):
+            self.assertIsNotNone(prediction_memo.get(a))
+        expirations = prediction_memo.expirations.value
+        with mock.patch('api.memo.time.monotonic', return_value=1060.0):
+            self.assertIsNone(prediction_memo.get(a))
+        self.assertEqual(prediction_memo.expirations.value, expirations + 1)
+
+    def test_keys_include_the_model_version(self):
+        self.put(key('v1', 1.0), 1.0)
+        self.assertIsNone(prediction_memo.get(key('v2', 1.0)))
+
+    @override_settings(PREDICTION_MEMO_SIZE=0)
+    def test_size_zero_disables_it(self):
+        self.put(key('v1', 1.0), 1.0)
+        self.assertIsNone(prediction_memo.get(key('v1', 1.0)))
+
+
+@override_settings(PREDICTION_WRITE_BEHIND=False, PREDICTION_COALESCE=False, MODEL_RELOAD_INTERVAL=0)
+class MemoizedPredictionTests(TrainedModelMixin, TestCase):
+
+    def predict(self):
+        response = self.client.post('/api/predict/', request_data(self.row), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_repeat_hits_until_a_new_version(self):
+        hits = prediction_memo.hits.value
+        first = self.predict()
+        second = self.predict()
+        self.assertEqual(prediction_memo.hits.value, hits + 1)
+        self.assertEqual(second['predicted_sales'], first['predicted_sales'])
+        # With PREDICTION_MEMO_DEDUPE='off' both requests are stored
+        self.assertEqual(PredictionResult.objects.count(), 2)
+
+        path = os.path.join(self.model_dir, VERSION_FILE)
+        self.addCleanup(os.remove, path)
+        with open(path, 'w') as f:
+            f.write('next-version\n')
+        self.assertEqual(self.predict()['model_version'], 'next-version')
+        self.assertEqual(prediction_memo.hits.value, hits + 1)
+
+    @override_settings(PREDICTION_MEMO_DEDUPE='skip')
+    def test_skip_returns_the_original_ids(self):
+        first = self.predict()
+        second = self.predict()
+        self.assertEqual((second['prediction_id'], second['prediction_uuid']),
+                         (first['prediction_id'], first['prediction_uuid']))
+        self.assertEqual(PredictionResult.objects.count(), 1)
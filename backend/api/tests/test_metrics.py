@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from ..metrics import REGISTRY, Counter, Family, Histogram, exposition
+from ..middleware import MetricsMiddleware
+from .helpers import TrainedModelMixin, request_data
+
+
+def sample(text, name):
+    """The value of the exposition line for sample ``name`` (with its labels)."""
+    for line in text.splitlines():
+        if line.startswith(name + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+class ExpositionTests(SimpleTestCase):
+
+    def test_text_format(self):
+        histogram = Histogram('test_seconds', 'A histogram', (0.1, 1.0), register=False)
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+        counter = Counter('test_total', 'A counter', register=False)
+        counter.inc(3)
+        with mock.patch.dict(REGISTRY, {'test_seconds': histogram, 'test_total': counter}, clear=True):
+            # Families always register themselves
+            Family(Counter, 'test_labelled_total', 'A family', ['path']).labels('say "hi"\n').inc()
+            text = exposition()
+
+        self.assertEqual(text.splitlines(), [
+            '# HELP test_labelled_total A family',
+            '# TYPE test_labelled_total counter',
+            'test_labelled_total{path="say \\"hi\\"\\n"} 1',
+            '# HELP test_seconds A histogram',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1.0"} 2',
+            'test_seconds_bucket{le="+Inf"} 3',
+            'test_seconds_sum 5.55',
+            'test_seconds_count 3',
+            '# HELP test_total A counter',
+            '# TYPE test_total counter',
+            'test_total 3',
+        ])
+        self.assertTrue(text.endswith('\n'))
+
+
+class MetricsEndpointTests(TrainedModelMixin, TestCase):
+
+    def metrics(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def test_requests_and_stages_are_counted(self):
+        before = self.metrics()
+        response = self.client.post('/api/predict/', request_data(self.row), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        after = self.metrics()
+
+        requests = 'api_requests_total{view="predict_sales",method="POST",status="200"}'
+        self.assertEqual(sample(after, requests), (sample(before, requests) or 0) + 1)
+        latency = 'api_request_seconds_count{view="predict_sales"}'
+        self.assertEqual(sample(after, latency), (sample(before, latency) or 0) + 1)
+        self.assertIsNotNone(sample(after, 'api_request_seconds_bucket{view="predict_sales",le="+Inf"}'))
+        for stage in ('validate', 'encode', 'transform', 'predict'):
+            name = f'api_stage_seconds_count{{stage="{stage}"}}'
+            self.assertGreater(sample(after, name), sample(before, name) or 0, stage)
+        self.assertIn('# TYPE api_stage_seconds histogram', after)
+
+
+def slow_view(request):
+    time.sleep(0.05)
+    return HttpResponse('ok')
+
+
+class SlowRequestProfilerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.request = RequestFactory().get('/slow/')
+
+    def test_slow_request_is_dumped(self):
+        with override_settings(PROFILE_SLOW_REQUEST_MS=10, PROFILE_SAMPLE_INTERVAL_MS=1.0,
+                               PROFILE_DIR=self.directory):
+            with self.assertLogs('api.middleware', 'WARNING'):
+                MetricsMiddleware(slow_view)(self.request)
+        dumps = os.listdir(self.directory)
+        self.assertEqual(len(dumps), 1)
+        self.assertRegex(dumps[0], r'-unmatched-\d+ms\.folded$')
+        with open(os.path.join(self.directory, dumps[0])) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        # Folded format: 'outer;...;inner count', with the view's frame innermost
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        self.assertTrue(any(line.rsplit(' ', 1)[0].split(';')[-1].startswith('slow_view (') for line in lines))
+
+    def test_fast_request_is_not_dumped(self):
+        with override_settings(PROFILE_SLOW_REQUEST_MS=10000, PROFILE_SAMPLE_INTERVAL_MS=1.0,
+                               PROFILE_DIR=self.directory):
+            MetricsMiddleware(slow_view)(self.request)
+        self.assertEqual(os.listdir(self.directory), [])
@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+from django.test import TestCase
+
+from ..models import PredictionResult
+from .helpers import prediction
+
+
+def stored(day, **fields):
+    return PredictionResult(**{**prediction(day, **fields), 'date': day})
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        start = date(2024, 1, 1)
+        PredictionResult.objects.bulk_create([
+            stored(start + timedelta(days=i % 4), store_id=i % 3, product_id=i % 2) for i in range(25)
+        ])
+
+    def walk(self, url):
+        ids = []
+        while url:
+            body = self.client.get(url).json()
+            ids.extend(result['id'] for result in body['results'])
+            url = body['next']
+        return ids
+
+    def test_pages_cover_the_ordering_once(self):
+        expected = list(PredictionResult.objects.order_by('-date', 'store_id', 'product_id', 'id')
+                        .values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/predictions/?page_size=7'), expected)
+
+    def test_cursor_is_stable_under_inserts(self):
+        first = self.client.get('/api/predictions/?page_size=10').json()
+        seen = [result['id'] for result in first['results']]
+        # Sorts before the cursor (newer day): must not appear on later pages.
+        # Sorts after it (older day): must.
+        newer = stored(date(2024, 2, 1))
+        older = stored(date(2023, 12, 1))
+        newer.save()
+        older.save()
+
+        rest = self.walk(first['next'])
+        self.assertFalse(set(seen) & set(rest))
+        self.assertNotIn(newer.id, rest)
+        self.assertEqual(rest[-1], older.id)
+        self.assertEqual(len(seen) + len(rest), 26)
+
+    def test_filters_combine_with_the_cursor(self):
+        expected = list(PredictionResult.objects.filter(store_id=1).order_by('-date', 'store_id', 'product_id', 'id')
+                        .values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/predictions/?store_id=1&page_size=3'), expected)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/predictions/?cursor=not-a-cursor').status_code, 404)
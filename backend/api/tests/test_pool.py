@@ -0,0 +1,52 @@
+import threading
+import time
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..pool import InferencePool, PoolSaturated, inference_pool
+from .helpers import TrainedModelMixin, request_data
+
+
+def wait_for_idle(pool, timeout=5.0):
+    # A slot is released by a done callback, which may run just after result() returns
+    deadline = time.monotonic() + timeout
+    while pool.pending and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class InferencePoolTests(SimpleTestCase):
+
+    def test_submit_fails_fast_once_full(self):
+        pool = InferencePool(size=1, max_pending=2)
+        release = threading.Event()
+        futures = [pool.submit(release.wait) for _ in range(2)]
+        with self.assertRaises(PoolSaturated):
+            pool.submit(release.wait)
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        wait_for_idle(pool)
+        # Finished tasks give their slots back
+        self.assertEqual(pool.pending, 0)
+        self.assertEqual(pool.submit(lambda: 1).result(timeout=5), 1)
+
+
+@override_settings(PREDICTION_POOL_MAX_PENDING=1, PREDICTION_COALESCE=False, PREDICTION_WRITE_BEHIND=False)
+class PoolSaturationTests(TrainedModelMixin, TestCase):
+
+    async def test_saturated_pool_answers_503(self):
+        release = threading.Event()
+        busy = inference_pool.submit(release.wait)
+        try:
+            response = await self.async_client.post('/api/async/predict/', request_data(self.row),
+                                                    content_type='application/json')
+        finally:
+            release.set()
+            busy.result(timeout=5)
+            wait_for_idle(inference_pool)
+        self.assertEqual(response.status_code, 503, response.content)
+        self.assertEqual(response['Retry-After'], '1')
+
+        response = await self.async_client.post('/api/async/predict/', request_data(self.row),
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
@@ -0,0 +1,34 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase, override_settings
+
+from ..registry import VERSION_FILE, registry
+from .helpers import TrainedModelMixin
+
+
+class ModelRegistryTests(TrainedModelMixin, SimpleTestCase):
+
+    def test_concurrent_first_gets_wait_for_the_load(self):
+        start = threading.Barrier(8)
+
+        def get():
+            start.wait()
+            return registry.get()
+
+        with ThreadPoolExecutor(8) as executor:
+            bundles = list(executor.map(lambda _: get(), range(8)))
+        self.assertNotIn(None, bundles)
+        self.assertEqual(len({id(bundle) for bundle in bundles}), 1)
+
+    @override_settings(MODEL_RELOAD_INTERVAL=0)
+    def test_reloads_on_a_new_version(self):
+        path = os.path.join(self.model_dir, VERSION_FILE)
+        self.addCleanup(os.remove, path)
+        with open(path, 'w') as f:
+            f.write('v1\n')
+        self.assertEqual(registry.get().version, 'v1')
+        with open(path, 'w') as f:
+            f.write('v2-new\n')
+        self.assertEqual(registry.get().version, 'v2-new')
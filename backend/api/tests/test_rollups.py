@@ -0,0 +1,48 @@
+from datetime import date
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import rollups
+from ..models import PredictionResult, PredictionRollup
+from .helpers import prediction
+
+
+class RollupConsistencyTests(TestCase):
+    """PredictionRollup stays equal to totals recomputed from the raw table."""
+
+    def setUp(self):
+        # on_commit never runs in a TestCase, so writes do not bump the analytics cache
+        caches['default'].clear()
+
+    def create(self, **fields):
+        response = self.client.post('/api/predictions/', prediction(date(2024, 1, 1), **fields),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def test_create_update_delete(self):
+        ids = [self.create(store_id=i + 1, predicted_sales=value) for i, value in enumerate((100.0, 50.0, 25.0))]
+        self.assertEqual(rollups.check(), [])
+
+        response = self.client.patch(f'/api/predictions/{ids[0]}/', {'predicted_sales': 80.0, 'region': 'South'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(rollups.check(), [])
+
+        self.assertEqual(self.client.delete(f'/api/predictions/{ids[2]}/').status_code, 204)
+        self.assertEqual(rollups.check(), [])
+
+        stats = self.client.get('/api/stats/').json()
+        self.assertEqual(stats['prediction_count'], 2)
+        self.assertEqual(stats['avg_predicted_sales'], 65.0)
+
+    def test_rebuild(self):
+        self.create()
+        PredictionResult.objects.update(predicted_sales=10.0)  # bypasses record()
+        self.assertNotEqual(rollups.check(), [])
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(rollups.check(), [])
+        self.assertEqual(PredictionRollup.objects.get().sum, 10.0)
@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+
+import joblib
+from django.test import SimpleTestCase, TestCase, override_settings
+from sklearn.dummy import DummyRegressor
+
+from ..memo import prediction_memo
+from ..registry import MODEL_FILE
+from ..segments import INDEX_FILE, SEGMENTS_DIR, route, segment_models
+from .helpers import TrainedModelMixin, request_data
+
+INDEX = {
+    'levels': ['region,category', 'region'],
+    'segments': {'region=North,category=Toys': {}, 'region=North': {}},
+}
+
+
+class RouteTests(SimpleTestCase):
+
+    def test_most_specific_level_first(self):
+        self.assertEqual(route(INDEX, {'region': 'North', 'category': 'Toys'}), 'region=North,category=Toys')
+        self.assertEqual(route(INDEX, {'region': 'North', 'category': 'Clothing'}), 'region=North')
+        self.assertIsNone(route(INDEX, {'region': 'South', 'category': 'Toys'}))
+        self.assertIsNone(route(None, {'region': 'North', 'category': 'Toys'}))
+
+
+class SegmentServingTests(TrainedModelMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.region = self.row['Region']
+        self.other = self.frame[self.frame['Region'] != self.region].iloc[0]
+        self.addCleanup(shutil.rmtree, os.path.join(self.model_dir, SEGMENTS_DIR), True)
+
+    def write_segments(self, models):
+        """Write {segment name: model, or None for a corrupt artifact} and their index."""
+        directory = os.path.join(self.model_dir, SEGMENTS_DIR)
+        index = {'levels': ['region'], 'segments': {}}
+        for i, (name, model) in enumerate(models.items()):
+            path = os.path.join(directory, f'segment{i}')
+            os.makedirs(path)
+            if model is None:
+                with open(os.path.join(path, MODEL_FILE), 'w') as f:
+                    f.write('not a model')
+            else:
+                joblib.dump(model, os.path.join(path, MODEL_FILE))
+            index['segments'][name] = {'path': f'segment{i}', 'level': 'region'}
+        with open(os.path.join(directory, INDEX_FILE), 'w') as f:
+            json.dump(index, f)
+
+    def predict(self, row):
+        response = self.client.post('/api/predict/', request_data(row), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['predicted_sales']
+
+    def constant(self, value):
+        return DummyRegressor(strategy='constant', constant=value).fit([[0.0]], [value])
+
+    def test_routed_rows_use_the_segment_model(self):
+        global_prediction = self.predict(self.other)
+        self.reset()
+        self.write_segments({f'region={self.region}': self.constant(1234.0)})
+        loads = segment_models.loads.value
+        self.assertEqual(self.predict(self.row), 1234.0)
+        # Rows outside every segment fall back to the global model
+        self.assertEqual(self.predict(self.other), global_prediction)
+        self.assertEqual(segment_models.loads.value, loads + 1)
+
+        response = self.client.post('/api/predict/batch/', [request_data(self.row), request_data(self.other)],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([result['predicted_sales'] for result in response.json()['results']],
+                         [1234.0, global_prediction])
+        self.assertEqual(segment_models.loads.value, loads + 1)
+
+    def test_unloadable_segment_falls_back_to_the_global_model(self):
+        global_prediction = self.predict(self.row)
+        self.reset()
+        self.write_segments({f'region={self.region}': None})
+        errors = segment_models.load_errors.value
+        with self.assertLogs('api.segments', 'ERROR'):
+            self.assertEqual(self.predict(self.row), global_prediction)
+        # The failure is remembered: no retry until the model is reloaded
+        prediction_memo.clear()
+        self.assertEqual(self.predict(self.row), global_prediction)
+        self.assertEqual(segment_models.load_errors.value, errors + 1)
+
+    @override_settings(SEGMENT_MODELS=False)
+    def test_disabled(self):
+        self.write_segments({f'region={self.region}': self.constant(1234.0)})
+        self.assertNotEqual(self.predict(self.row), 1234.0)
+
+    @override_settings(SEGMENT_MODEL_CACHE_MB=0)
+    def test_least_recently_used_model_is_evicted(self):
+        self.write_segments({f'region={self.region}': self.constant(1.0),
+                             f'region={self.other["Region"]}': self.constant(2.0)})
+        evictions = segment_models.evictions.value
+        self.assertEqual(self.predict(self.row), 1.0)
+        self.assertEqual(self.predict(self.other), 2.0)
+        self.assertEqual(segment_models.evictions.value, evictions + 1)
+        self.assertEqual([model['name'] for model in segment_models.stats()['loaded']],
+                         [f'region={self.other["Region"]}'])
@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase
+
+from . import helpers  # noqa: F401 - makes the pipeline package importable
+from pipeline.selection import select_model
+
+RESULTS = {
+    'Gradient Boosting': {'r2': 0.95, 'predict_ms': 8.0, 'batch_us_per_row': 40.0, 'artifact_mb': 30.0},
+    'Random Forest': {'r2': 0.93, 'predict_ms': 3.0, 'batch_us_per_row': 20.0, 'artifact_mb': 120.0},
+    'Ridge Regression': {'r2': 0.80, 'predict_ms': 0.05, 'batch_us_per_row': 0.1, 'artifact_mb': 0.01},
+}
+
+
+class SelectModelTests(SimpleTestCase):
+
+    def test_most_accurate_model_within_the_budget(self):
+        self.assertEqual(select_model(RESULTS), ('Gradient Boosting', True))
+        self.assertEqual(select_model(RESULTS, max_predict_ms=5.0), ('Random Forest', True))
+        self.assertEqual(select_model(RESULTS, max_predict_ms=5.0, max_artifact_mb=50.0), ('Ridge Regression', True))
+        self.assertEqual(select_model(RESULTS, max_batch_us=30.0), ('Random Forest', True))
+
+    def test_fastest_model_when_none_meets_the_budget(self):
+        self.assertEqual(select_model(RESULTS, max_predict_ms=0.01), ('Ridge Regression', False))
+        self.assertEqual(select_model(RESULTS, max_predict_ms=5.0, max_artifact_mb=0.001),
+                         ('Ridge Regression', False))
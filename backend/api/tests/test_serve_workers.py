@@ -0,0 +1,48 @@
+import os
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from ..registry import registry
+from .helpers import TrainedModelMixin
+
+
+class ServeWorkersDryRunTests(TrainedModelMixin, SimpleTestCase):
+
+    def dry_run(self, *args):
+        out = StringIO()
+        with mock.patch('os.fork') as fork:
+            call_command('serve_workers', '--dry-run', *args, stdout=out)
+        fork.assert_not_called()
+        return out.getvalue().splitlines()
+
+    def test_preloaded(self):
+        with mock.patch.dict(os.environ, {'GUNICORN_WORKERS': '3'}):
+            lines = self.dry_run('--port', '9000')
+        version = registry.get().version
+        self.assertEqual(lines, [
+            f'Would start 3 workers on http://127.0.0.1:9000/ (model {version} (best_model.pkl) preloaded before fork)',
+            'gunicorn equivalent: GUNICORN_WORKERS=3 GUNICORN_BIND=127.0.0.1:9000 '
+            'gunicorn -c gunicorn.conf.py backend.wsgi',
+        ])
+
+    def test_worker_count(self):
+        with mock.patch.dict(os.environ, {'GUNICORN_WORKERS': '3'}):
+            self.assertIn('Would start 6 workers', self.dry_run('--workers', '6')[0])
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertIn('Would start 4 workers', self.dry_run()[0])
+        with self.assertRaisesMessage(CommandError, '--workers must be at least 1'):
+            self.dry_run('--workers', '0')
+
+    def test_per_worker_load(self):
+        self.assertEqual(self.dry_run('--no-preload', '--workers', '2', '--host', '0.0.0.0'),
+                         ['Would start 2 workers on http://0.0.0.0:8000/ (model loaded per worker)'])
+        self.assertFalse(registry.info()['loaded'])
+
+    def test_unloadable_model(self):
+        with mock.patch.object(registry, 'get', return_value=None), \
+                self.assertRaisesMessage(CommandError, 'Model could not be loaded'):
+            self.dry_run()
@@ -0,0 +1,40 @@
+import numpy as np
+from django.test import SimpleTestCase
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.preprocessing import StandardScaler
+
+from ..features import TARGET, FeatureEncoder
+from ..serving import compact_predictor, fuse_scaler
+from ..synthetic import market_frame
+
+
+class FusedPredictorTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frame = market_frame(3000, seed=2)
+        X = FeatureEncoder.fit(frame).transform_frame(frame)
+        cls.y = frame[TARGET].to_numpy(dtype=np.float64)
+        cls.X_train, cls.X_test = X[:2000], X[2000:]
+        cls.scaler = StandardScaler().fit(cls.X_train)
+
+    def assertFusedMatches(self, model):
+        model.fit(self.scaler.transform(self.X_train), self.y[:2000])
+        fused = fuse_scaler(compact_predictor(model), self.scaler)
+        expected = model.predict(self.scaler.transform(self.X_test))
+        np.testing.assert_allclose(fused.predict(self.X_test), expected, rtol=1e-9, atol=1e-6)
+        # Rows sitting exactly on a split threshold, in raw units
+        np.testing.assert_allclose(fused.predict(self.X_train), model.predict(self.scaler.transform(self.X_train)),
+                                   rtol=1e-9, atol=1e-6)
+
+    def test_linear(self):
+        self.assertFusedMatches(LinearRegression())
+        self.assertFusedMatches(Ridge(alpha=1.0))
+
+    def test_random_forest(self):
+        self.assertFusedMatches(RandomForestRegressor(n_estimators=10, random_state=0))
+
+    def test_gradient_boosting(self):
+        self.assertFusedMatches(GradientBoostingRegressor(n_estimators=50, random_state=0))
@@ -0,0 +1,97 @@
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from . import helpers  # noqa: F401 - makes the pipeline package importable
+from pipeline.stages import StageCache
+
+
+def shift(loaded):
+    return {'y': loaded['X'] + 1}
+
+
+class StageCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.calls = []
+
+    def cache(self, **kwargs):
+        return StageCache(os.path.join(self.root, 'cache'), **kwargs)
+
+    def stage(self, scale=1.0):
+        self.calls.append(scale)
+        return {'X': np.arange(4.0) * scale, 'frame': pd.DataFrame({'a': [1, 2]}), 'meta': {'scale': scale}}
+
+    def run_stage(self, cache, *args, **kwargs):
+        with redirect_stdout(StringIO()):
+            return cache.run(*args, **kwargs)
+
+    def test_hit_after_miss(self):
+        first = self.run_stage(self.cache(), 'load', self.stage, params={'scale': 2.0})
+        self.assertFalse(first.cached)
+        second = self.run_stage(self.cache(), 'load', self.stage, params={'scale': 2.0})
+        self.assertTrue(second.cached)
+        self.assertEqual(self.calls, [2.0])
+        self.assertEqual(second.key, first.key)
+        np.testing.assert_array_equal(second['X'], [0.0, 2.0, 4.0, 6.0])
+        pd.testing.assert_frame_equal(second['frame'], pd.DataFrame({'a': [1, 2]}))
+        self.assertEqual(second['meta'], {'scale': 2.0})
+
+    def test_params_and_inputs_change_the_key(self):
+        cache = self.cache()
+        upstream = self.run_stage(cache, 'load', self.stage, params={'scale': 1.0})
+        downstream = self.run_stage(cache, 'scale', shift, [upstream])
+        self.assertTrue(self.run_stage(cache, 'scale', shift, [upstream]).cached)
+
+        changed = self.run_stage(cache, 'load', self.stage, params={'scale': 3.0})
+        self.assertFalse(changed.cached)
+        rerun = self.run_stage(cache, 'scale', shift, [changed])
+        self.assertFalse(rerun.cached)
+        self.assertNotEqual(rerun.key, downstream.key)
+        np.testing.assert_array_equal(rerun['y'], [1.0, 4.0, 7.0, 10.0])
+
+    def test_dependency_change_invalidates(self):
+        module_dir = tempfile.mkdtemp(dir=self.root)
+        name = f'stage_dep_{uuid.uuid4().hex[:8]}'
+        path = os.path.join(module_dir, f'{name}.py')
+        sys.path.insert(0, module_dir)
+        self.addCleanup(sys.path.remove, module_dir)
+        self.addCleanup(sys.modules.pop, name, None)
+        with open(path, 'w') as f:
+            f.write('def helper(x):\n    return x\n')
+        module = importlib.import_module(name)
+
+        def compute():
+            return {'value': module.helper(1)}
+
+        self.assertFalse(self.run_stage(self.cache(), 'encode', compute, deps=(module.helper,)).cached)
+        self.assertTrue(self.run_stage(self.cache(), 'encode', compute, deps=(module.helper,)).cached)
+
+        with open(path, 'w') as f:
+            f.write('def helper(x):\n    return x + 1  # changed\n')
+        module = importlib.reload(module)
+        result = self.run_stage(self.cache(), 'encode', compute, deps=(module.helper,))
+        self.assertFalse(result.cached)
+        self.assertEqual(result['value'], 2)
+
+    def test_force_and_invalidate(self):
+        self.run_stage(self.cache(), 'load', self.stage)
+        self.assertFalse(self.run_stage(self.cache(force=['load']), 'load', self.stage).cached)
+        self.assertEqual(self.cache().invalidate('load'), 1)
+        self.assertFalse(self.run_stage(self.cache(), 'load', self.stage).cached)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_disabled_cache_writes_nothing(self):
+        self.run_stage(self.cache(enabled=False), 'load', self.stage)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'cache')))
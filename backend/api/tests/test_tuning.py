@@ -0,0 +1,56 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+from sklearn.linear_model import LinearRegression, Ridge
+
+from ..features import DATE, TARGET, FeatureEncoder
+from ..synthetic import market_frame
+from . import helpers  # noqa: F401 - makes the pipeline package importable
+from pipeline import tuning
+
+
+class TimeFoldTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frame = market_frame(1000, seed=11).sample(frac=1, random_state=0)  # ten days, shuffled
+        cls.X = FeatureEncoder.fit(frame).transform_frame(frame)
+        cls.y = frame[TARGET].to_numpy(dtype=np.float64)
+        cls.dates = frame[DATE].to_numpy(dtype='datetime64[D]')
+
+    def test_validation_follows_training(self):
+        folds = tuning.time_folds(self.dates, n_splits=4)
+        self.assertEqual(len(folds), 4)
+        previous = 0
+        for train, val in folds:
+            self.assertGreater(len(train), previous)  # expanding window
+            previous = len(train)
+            self.assertLess(self.dates[train].max(), self.dates[val].min())
+            self.assertFalse(set(train) & set(val))
+        # Together the validation blocks cover every day after the first block
+        covered = np.unique(self.dates[np.concatenate([val for _, val in folds])])
+        self.assertEqual(covered[0], np.unique(self.dates)[2])
+        with self.assertRaises(ValueError):
+            tuning.time_folds(self.dates, n_splits=10)
+
+    def test_search_uses_the_time_folds(self):
+        spaces = {
+            'Linear Regression': (LinearRegression(), {'fit_intercept': [True]}, 'n_samples', 'auto'),
+            'Ridge Regression': (Ridge(), {'alpha': [0.1, 1.0, 10.0]}, 'n_samples', 'auto'),
+        }
+        with mock.patch.object(tuning, 'search_spaces', return_value=spaces), \
+                mock.patch.object(tuning, 'HalvingRandomSearchCV', wraps=tuning.HalvingRandomSearchCV) as search, \
+                mock.patch('builtins.print'):
+            tuned = tuning.tune(self.X, self.y, self.dates, n_splits=3, n_candidates=3, workers=1)
+
+        self.assertEqual(set(tuned), set(spaces))
+        expected = tuning.time_folds(self.dates, n_splits=3)
+        self.assertEqual(search.call_count, 2)
+        for call in search.call_args_list:
+            folds = call.kwargs['cv']
+            self.assertEqual(len(folds), len(expected))
+            for (train, val), (want_train, want_val) in zip(folds, expected):
+                np.testing.assert_array_equal(train, want_train)
+                np.testing.assert_array_equal(val, want_val)
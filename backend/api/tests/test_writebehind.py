@@ -0,0 +1,151 @@
+import uuid
+from datetime import date
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+
+from .. import rollups
+from ..models import PredictionResult
+from ..predictor import build_result
+from ..writebehind import write_behind
+from .helpers import TrainedModelMixin, request_data
+
+
+def result(store_id=1, **fields):
+    data = {'store_id': store_id, 'product_id': 1, 'category': 'Toys', 'region': 'North',
+            'date': date(2024, 1, 1), 'seasonality': 'Winter'}
+    prediction_result = build_result(data, 100.0)
+    for name, value in fields.items():
+        setattr(prediction_result, name, value)
+    return prediction_result
+
+
+@override_settings(PREDICTION_WRITE_BEHIND_MAX_ATTEMPTS=2, PREDICTION_WRITE_BEHIND_MAX_PENDING=100)
+class WriteBehindBufferTests(TestCase):
+    """Flushes are driven by the tests; the background thread is not started."""
+
+    def setUp(self):
+        patcher = mock.patch.object(write_behind, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(write_behind._attempts.clear)
+        self.addCleanup(setattr, write_behind, '_pending', [])
+
+    def test_flush_writes_rows_and_rollups(self):
+        for store_id in range(3):
+            self.assertTrue(write_behind.add(result(store_id)))
+        self.assertEqual(PredictionResult.objects.count(), 0)
+        self.assertEqual(write_behind.flush(), 3)
+        self.assertEqual(PredictionResult.objects.count(), 3)
+        self.assertEqual(write_behind.depth, 0)
+        self.assertEqual(rollups.check(), [])
+
+    def test_locked_database_requeues_the_batch(self):
+        for store_id in range(3):
+            write_behind.add(result(store_id))
+        with mock.patch.object(write_behind, '_write', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('api.writebehind', 'ERROR'):
+            self.assertEqual(write_behind.flush(), 0)
+        self.assertEqual(write_behind.depth, 3)
+        self.assertEqual(write_behind.flush(), 3)
+        self.assertEqual(PredictionResult.objects.count(), 3)
+
+    def test_poison_row_does_not_block_the_rest(self):
+        poison = result(store_id=None)
+        write_behind.add(result(1))
+        write_behind.add(poison)
+        write_behind.add(result(2))
+        failed = write_behind.rows_failed.value
+        dropped = write_behind.rows_dropped.value
+
+        # The good rows are written row by row; the bad one is retried once more
+        with self.assertLogs('api.writebehind', 'ERROR'):
+            self.assertEqual(write_behind.flush(), 2)
+        self.assertEqual(write_behind.depth, 1)
+        with self.assertLogs('api.writebehind', 'ERROR') as logs:
+            self.assertEqual(write_behind.flush(), 0)
+        self.assertIn(f'Dropping buffered prediction {poison.prediction_uuid}', logs.output[-1])
+        self.assertEqual(write_behind.depth, 0)
+        self.assertEqual(write_behind.rows_failed.value, failed + 1)
+        # Counted once: dropped is only for rows the full buffer turned away
+        self.assertEqual(write_behind.rows_dropped.value, dropped)
+        self.assertEqual(set(PredictionResult.objects.values_list('store_id', flat=True)), {1, 2})
+        self.assertEqual(rollups.check(), [])
+
+    def test_requeue_past_the_buffer_limit_drops_rows(self):
+        for store_id in range(3):
+            write_behind.add(result(store_id))
+        dropped = write_behind.rows_dropped.value
+        with override_settings(PREDICTION_WRITE_BEHIND_MAX_PENDING=2), \
+                mock.patch.object(write_behind, '_write', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('api.writebehind', 'ERROR'):
+            self.assertEqual(write_behind.flush(), 0)
+        self.assertEqual(write_behind.depth, 2)
+        self.assertEqual(write_behind.rows_dropped.value, dropped + 1)
+
+    def test_full_buffer_refuses_rows(self):
+        with override_settings(PREDICTION_WRITE_BEHIND_MAX_PENDING=1):
+            self.assertTrue(write_behind.add(result(1)))
+            self.assertFalse(write_behind.add(result(2)))
+
+    def test_stored_uuid_is_not_written_twice(self):
+        prediction_uuid = uuid.uuid4()
+        write_behind.add(result(1, prediction_uuid=prediction_uuid))
+        write_behind.flush()
+        write_behind.add(result(1, prediction_uuid=prediction_uuid))
+        write_behind.flush()
+        self.assertEqual(PredictionResult.objects.count(), 1)
+        self.assertEqual(rollups.check(), [])
+
+
+@override_settings(PREDICTION_WRITE_BEHIND=True, PREDICTION_COALESCE=False)
+class WriteBehindResponseTests(TrainedModelMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(write_behind, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, write_behind, '_pending', [])
+
+    def test_buffered_prediction_has_no_id_yet(self):
+        for path in ('/api/predict/', '/api/async/predict/'):
+            response = self.client.post(path, request_data(self.row, prediction_uuid=str(uuid.uuid4())),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 200, response.content)
+            body = response.json()
+            self.assertIsNone(body['prediction_id'])
+            write_behind.flush()
+            self.assertTrue(PredictionResult.objects.filter(prediction_uuid=body['prediction_uuid']).exists())
+
+
+@override_settings(PREDICTION_WRITE_BEHIND=False, PREDICTION_COALESCE=False)
+class PredictionIdempotencyTests(TrainedModelMixin, TestCase):
+    """A retried request with the same prediction_uuid returns the stored prediction."""
+
+    def predict(self, path, **extra):
+        response = self.client.post(path, request_data(self.row, **extra), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_retry_returns_the_stored_row(self):
+        prediction_uuid = str(uuid.uuid4())
+        for path in ('/api/predict/', '/api/predict/', '/api/async/predict/'):
+            body = self.predict(path, prediction_uuid=prediction_uuid)
+            self.assertEqual(body['prediction_uuid'], prediction_uuid)
+            self.assertEqual(body['prediction_id'], PredictionResult.objects.get(prediction_uuid=prediction_uuid).id)
+        self.assertEqual(PredictionResult.objects.count(), 1)
+        self.assertEqual(rollups.check(), [])
+
+    def test_batch_retry(self):
+        prediction_uuid = str(uuid.uuid4())
+        self.predict('/api/predict/', prediction_uuid=prediction_uuid)
+        rows = [request_data(self.row, prediction_uuid=prediction_uuid), request_data(self.row)]
+        response = self.client.post('/api/predict/batch/', rows, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        results = response.json()['results']
+        self.assertEqual(results[0]['prediction_id'], PredictionResult.objects.get(prediction_uuid=prediction_uuid).id)
+        self.assertNotEqual(results[1]['prediction_id'], results[0]['prediction_id'])
+        self.assertEqual(PredictionResult.objects.count(), 2)
+        self.assertEqual(rollups.check(), [])
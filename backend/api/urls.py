@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'predictions', views.PredictionResultViewSet)
@@ -8,6 +8,22 @@ router.register(r'predictions', views.PredictionResultViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('predict/', views.predict_sales, name='predict_sales'),
+    path('predict/batch/', views.predict_sales_batch, name='predict_sales_batch'),
+    path('predict/forecast/', views.forecast_sales, name='forecast_sales'),
+    path('predict/forecast/cache/', views.forecast_cache_stats, name='forecast_cache_stats'),
+    path('predict/memo/', views.prediction_memo_stats, name='prediction_memo_stats'),
+    path('predict/coalescer/', views.coalescer_stats, name='coalescer_stats'),
+    path('predict/write-behind/', views.write_behind_stats, name='write_behind_stats'),
     path('stats/', views.get_stats, name='get_stats'),
     path('seasonal-analysis/', views.seasonal_analysis, name='seasonal_analysis'),
+    path('analytics/cache/', views.analytics_cache_stats, name='analytics_cache_stats'),
+    path('model/', views.model_info, name='model_info'),
+    path('model/segments/', views.segment_model_stats, name='segment_model_stats'),
+    path('model/drift/', views.model_drift, name='model_drift'),
+    path('model/accuracy/', views.model_accuracy, name='model_accuracy'),
+    path('actuals/', views.ingest_actuals, name='ingest_actuals'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('async/predict/', async_views.predict_sales, name='async_predict_sales'),
+    path('async/stats/', async_views.get_stats, name='async_get_stats'),
+    path('async/seasonal-analysis/', async_views.seasonal_analysis, name='async_seasonal_analysis'),
 ]
\ No newline at end of file
@@ -1,150 +1,320 @@
+import json
+import logging
+from datetime import date
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes, renderer_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
 from .models import PredictionResult
-from .serializers import PredictionResultSerializer, PredictionRequestSerializer
-import joblib
-import pandas as pd
-from datetime import datetime
+from .serializers import (AccuracyQuerySerializer, ForecastRequestSerializer, MarketDataSerializer,
+                          PredictionResultSerializer, PredictionRequestSerializer)
+from . import accuracy, actuals, rollups
+from .analytics import seasonal_data, stats_data
+from .cache import analytics_cache, etag_matches
+from .coalescer import coalescer
+from .forecast import forecast_cache
+from .instrumentation import stage
+from .metrics import exposition
+from .pagination import KeysetPagination
+from .parsers import NDJSONParser
+from .renderers import NDJSONRenderer
+from .memo import prediction_memo
+from .predictor import memo_lookup, predict_matrix, predict_rows, record_prediction, save_results
+from .registry import registry
+from .segments import segment_models
+from .writebehind import write_behind
 
-# Load the model, preprocessor, and columns
-MODEL_PATH = '../models/best_model.pkl'
-PREPROCESSOR_PATH = '../models/preprocessor.pkl'
-COLUMNS_PATH = '../models/columns.pkl'
-
-def load_model_and_preprocessor():
-    try:
-        model = joblib.load(MODEL_PATH)
-        preprocessor = joblib.load(PREPROCESSOR_PATH)
-        columns = joblib.load(COLUMNS_PATH)
-        return model, preprocessor, columns
-    except Exception as e:
-        print(f"Error loading model, preprocessor, or columns: {e}")
-        return None, None, None
+logger = logging.getLogger(__name__)
 
 class PredictionResultViewSet(viewsets.ModelViewSet):
     queryset = PredictionResult.objects.all()
     serializer_class = PredictionResultSerializer
+    pagination_class = KeysetPagination
+    
+    def get_queryset(self):
+        # ?store_id=&product_id=&date_from=&date_to= filters for listing
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        filters = {}
+        for param, lookup, parse in (
+            ('store_id', 'store_id', int),
+            ('product_id', 'product_id', int),
+            ('date_from', 'date__gte', date.fromisoformat),
+            ('date_to', 'date__lte', date.fromisoformat),
+        ):
+            if params.get(param):
+                try:
+                    filters[lookup] = parse(params[param])
+                except ValueError:
+                    raise ValidationError({param: f"Invalid value: {params[param]}"})
+        return queryset.filter(**filters)
+    
+    # Keep the analytics rollups and accuracy totals in step with writes made through the API
+    @transaction.atomic
+    def perform_create(self, serializer):
+        instance = serializer.save()
+        rollups.record([instance])
+        accuracy.record([instance])
+    
+    @transaction.atomic
+    def perform_update(self, serializer):
+        previous = PredictionResult.objects.get(pk=serializer.instance.pk)
+        rollups.record([previous], sign=-1)
+        accuracy.record([previous], sign=-1)
+        instance = serializer.save()
+        rollups.record([instance])
+        accuracy.record([instance])
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        rollups.record([instance], sign=-1)
+        accuracy.record([instance], sign=-1)
+        instance.delete()
 
 @api_view(['POST'])
 def predict_sales(request):
     serializer = PredictionRequestSerializer(data=request.data)
+    with stage('validate'):
+        valid = serializer.is_valid()
     
-    if serializer.is_valid():
-        model, preprocessor, expected_columns = load_model_and_preprocessor()
+    if valid:
+        bundle = registry.get()
         
-        if model is None or preprocessor is None or expected_columns is None:
+        if bundle is None:
             return Response({"error": "Model, preprocessor, or columns not available"}, 
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        # Prepare data for prediction
-        input_data = pd.DataFrame([serializer.validated_data])
-        
-        # Convert date to datetime and extract features
-        input_data['Date'] = pd.to_datetime(input_data['date'])
-        input_data['Year'] = input_data['Date'].dt.year
-        input_data['Month'] = input_data['Date'].dt.month
-        input_data['Day'] = input_data['Date'].dt.day
-        input_data['DayOfWeek'] = input_data['Date'].dt.dayofweek
-        
-        # Drop unnecessary columns
-        input_data = input_data.drop(['date', 'Date'], axis=1)
-        
-        # Rename columns to match training data
-        column_mapping = {
-            'store_id': 'Store ID',
-            'product_id': 'Product ID',
-            'category': 'Category',
-            'region': 'Region',
-            'inventory_level': 'Inventory Level',
-            'units_ordered': 'Units Ordered',
-            'demand_forecast': 'Demand Forecast',
-            'price': 'Price',
-            'discount': 'Discount',
-            'weather_condition': 'Weather Condition',
-            'holiday_promotion': 'Holiday/Promotion',
-            'competitor_pricing': 'Competitor Pricing',
-            'seasonality': 'Seasonality'
-        }
-        input_data = input_data.rename(columns=column_mapping)
-        
-        # Perform one-hot encoding to match training data
-        input_data_encoded = pd.get_dummies(input_data)
-        
-        # Ensure all expected columns are present
-        for col in expected_columns:
-            if col not in input_data_encoded.columns:
-                input_data_encoded[col] = 0
-        
-        # Reorder columns to match training data
-        input_data_encoded = input_data_encoded[expected_columns]
-        
-        # Make prediction
+        # Make prediction, unless the memo already holds this feature row.
+        # Never coalesced: sync views handle one request per thread, so the
+        # coalescer would only add its window (see coalescer.py).
         try:
-            processed_data = preprocessor.transform(input_data_encoded)
-            prediction = model.predict(processed_data)
+            data = serializer.validated_data
+            row, segment, key, entry = memo_lookup(bundle, data)
+            if entry is not None:
+                predicted_sales = entry.predicted_sales
+            else:
+                predicted_sales = float(predict_matrix(bundle, row[None, :], [segment])[0])
             
             # Save prediction to database
-            prediction_result = PredictionResult(
-                store_id=serializer.validated_data['store_id'],
-                product_id=serializer.validated_data['product_id'],
-                category=serializer.validated_data['category'],
-                region=serializer.validated_data['region'],
-                date=serializer.validated_data['date'],
-                predicted_sales=float(prediction[0]),
-                actual_sales=None,
-                seasonality=serializer.validated_data['seasonality']  # Save seasonality here
-            )
-            prediction_result.save()
+            prediction_id, prediction_uuid = record_prediction(key, entry, data, predicted_sales)
             
             return Response({
-                "predicted_sales": float(prediction[0]),
-                "prediction_id": prediction_result.id
+                "predicted_sales": predicted_sales,
+                "prediction_id": prediction_id,
+                "prediction_uuid": prediction_uuid,
+                "model_version": bundle.version
             })
         except Exception as e:
+            logger.exception("Prediction failed")
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     else:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _score_batch(bundle, rows):
+    """
+    Validate every row, score the valid ones with a single vectorized predict
+    and bulk insert them. Returns one result dict per input row, in order.
+    """
+    results = [None] * len(rows)
+    valid_index = []
+    valid_rows = []
+    with stage('validate'):
+        for i, row in enumerate(rows):
+            serializer = PredictionRequestSerializer(data=row)
+            if serializer.is_valid():
+                valid_index.append(i)
+                valid_rows.append(serializer.validated_data)
+            else:
+                results[i] = {"index": i, "errors": serializer.errors}
+    
+    if valid_rows:
+        predictions = predict_rows(bundle, valid_rows)
+        saved = save_results(valid_rows, predictions)
+        for i, value, prediction_result in zip(valid_index, predictions, saved):
+            results[i] = {
+                "index": i,
+                "predicted_sales": float(value),
+                "prediction_id": prediction_result.id,
+                "prediction_uuid": str(prediction_result.prediction_uuid)
+            }
+    return results
+
+def _stream_batch(bundle, rows, chunk_size):
+    for start in range(0, len(rows), chunk_size):
+        try:
+            results = _score_batch(bundle, rows[start:start + chunk_size])
+        except Exception as e:
+            logger.exception("Streaming batch prediction failed at row %d", start)
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+        for result in results:
+            result["index"] += start
+            yield json.dumps(result) + "\n"
+
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, NDJSONRenderer])
+def predict_sales_batch(request):
+    rows = request.data
+    if not isinstance(rows, list):
+        return Response({"error": "Expected a list of prediction requests"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    max_size = settings.PREDICTION_BATCH_MAX_SIZE
+    if len(rows) > max_size:
+        return Response({"error": f"Batch of {len(rows)} rows exceeds the maximum of {max_size}"},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
+    bundle = registry.get()
+    if bundle is None:
+        return Response({"error": "Model, preprocessor, or columns not available"}, 
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    # Large batches are scored chunk by chunk and streamed as NDJSON
+    wants_ndjson = request.accepted_renderer.format == NDJSONRenderer.format
+    if wants_ndjson or len(rows) > settings.PREDICTION_BATCH_STREAM_THRESHOLD:
+        response = StreamingHttpResponse(
+            _stream_batch(bundle, rows, settings.PREDICTION_BATCH_CHUNK_SIZE),
+            content_type=NDJSONRenderer.media_type
+        )
+        response['X-Model-Version'] = bundle.version
+        return response
+    
+    try:
+        results = _score_batch(bundle, rows)
+    except Exception as e:
+        logger.exception("Batch prediction failed")
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({
+        "model_version": bundle.version,
+        "count": len(results),
+        "error_count": sum(1 for result in results if "errors" in result),
+        "results": results
+    })
+
+@api_view(['POST'])
+def forecast_sales(request):
+    serializer = ForecastRequestSerializer(data=request.data)
+    with stage('validate'):
+        valid = serializer.is_valid()
+    if not valid:
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    bundle = registry.get()
+    if bundle is None:
+        return Response({"error": "Model, preprocessor, or columns not available"}, 
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    try:
+        cached, data = forecast_cache.get_or_compute(bundle, serializer.validated_data)
+    except Exception as e:
+        logger.exception("Forecast failed")
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    response = Response(data)
+    response['X-Cache'] = 'hit' if cached else 'miss'
+    return response
+
 @api_view(['GET'])
-def seasonal_analysis(request):
+def forecast_cache_stats(request):
+    return Response(forecast_cache.stats())
+
+@api_view(['GET'])
+def model_info(request):
+    return Response(registry.info())
+
+@api_view(['GET'])
+def segment_model_stats(request):
+    return Response(segment_models.stats())
+
+@api_view(['GET'])
+def model_drift(request):
+    # ?date_from=&date_to= limit the prediction dates compared
+    window = {}
+    for param in ('date_from', 'date_to'):
+        if request.query_params.get(param):
+            try:
+                window[param] = date.fromisoformat(request.query_params[param])
+            except ValueError:
+                return Response({param: f"Invalid value: {request.query_params[param]}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+    return Response(accuracy.drift(**window))
+
+@api_view(['GET'])
+def model_accuracy(request):
+    # ?window_days=&periods=&date_to=&group_by= (see AccuracyQuerySerializer)
+    serializer = AccuracyQuerySerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    with stage('analytics_query'):
+        return Response(accuracy.rolling(**serializer.validated_data))
+
+@api_view(['POST'])
+def ingest_actuals(request):
+    # One row or a list of rows
+    serializer = MarketDataSerializer(data=request.data, many=isinstance(request.data, list))
+    with stage('validate'):
+        valid = serializer.is_valid()
+    if not valid:
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    rows = serializer.validated_data if isinstance(request.data, list) else [serializer.validated_data]
     try:
-        from django.db import models as django_models
-        seasonal_data = PredictionResult.objects.values('category', 'seasonality').annotate(
-            total_predicted_sales=django_models.Sum('predicted_sales'),  # Changed to Sum
-            # avg_satisfaction=django_models.Avg('customer_satisfaction'),
-            # total_records=django_models.Count('id')
-        ).order_by('category', 'seasonality')
-        
-        result = list(seasonal_data)
-        return Response(result)
+        with stage('save'):
+            market_rows, predictions = actuals.ingest(rows)
     except Exception as e:
+        logger.exception("Ingesting actuals failed")
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({"market_rows": market_rows, "predictions_updated": predictions})
 
 @api_view(['GET'])
-def get_stats(request):
+def coalescer_stats(request):
+    return Response(coalescer.stats())
+
+@api_view(['GET'])
+def write_behind_stats(request):
+    return Response(write_behind.stats())
+
+@api_view(['GET'])
+def prediction_memo_stats(request):
+    return Response(prediction_memo.stats())
+
+@require_GET
+def metrics(request):
+    # Prometheus text format rather than a DRF response, so scrapers need no Accept header
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _analytics_response(request, name, compute):
     try:
-        from django.db import models as django_models
-        prediction_count = PredictionResult.objects.count()
-        avg_predicted_sales = PredictionResult.objects.all().aggregate(
-            django_models.Avg('predicted_sales')
-        )['predicted_sales__avg'] or 0
-        
-        top_categories = list(PredictionResult.objects.values('category').annotate(
-            total_sales=django_models.Sum('predicted_sales')
-        ).order_by('-total_sales')[:5])
-        
-        top_regions = list(PredictionResult.objects.values('region').annotate(
-            total_sales=django_models.Sum('predicted_sales')
-        ).order_by('-total_sales')[:5])
-        
-        return Response({
-            "prediction_count": prediction_count,
-            "avg_predicted_sales": avg_predicted_sales,
-            "top_categories": top_categories,
-            "top_regions": top_regions
-        })
+        etag, data = analytics_cache.get_or_compute(name, compute)
     except Exception as e:
+        logger.exception("Computing %s failed", name)
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    
\ No newline at end of file
+    if etag_matches(request, etag):
+        analytics_cache.not_modified.inc()
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@api_view(['GET'])
+def seasonal_analysis(request):
+    return _analytics_response(request, 'seasonal_analysis', seasonal_data)
+
+@api_view(['GET'])
+def get_stats(request):
+    return _analytics_response(request, 'stats', stats_data)
+
+@api_view(['GET'])
+def analytics_cache_stats(request):
+    return Response(analytics_cache.stats())
@@ -0,0 +1,227 @@
+"""
+Write-behind buffer for PredictionResult rows.
+
+Predictions are appended to an in-memory buffer and a background thread
+writes them with ``bulk_create`` once ``PREDICTION_WRITE_BEHIND_FLUSH_SIZE``
+rows are waiting or every ``PREDICTION_WRITE_BEHIND_FLUSH_INTERVAL`` seconds,
+so SQLite commits once per flush instead of once per request. Callers hand
+out the row's ``prediction_uuid``, which is assigned before the insert.
+
+The buffer never holds more than ``PREDICTION_WRITE_BEHIND_MAX_PENDING`` rows;
+``add`` returns False when it is full and the caller saves synchronously.
+Pending rows are flushed at interpreter exit.
+
+A batch that fails with OperationalError (database locked or unreachable)
+is re-queued whole. Any other failure is retried row by row, so one bad
+row cannot block the rest. A row that fails
+``PREDICTION_WRITE_BEHIND_MAX_ATTEMPTS`` writes is logged and dropped.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, transaction
+
+from . import rollups
+from .metrics import Counter, Histogram
+from .models import PredictionResult
+
+logger = logging.getLogger(__name__)
+
+FLUSH_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class WriteBehindBuffer:
+
+    def __init__(self, flush_size=None, flush_interval=None, max_pending=None, max_attempts=None):
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._max_attempts = max_attempts
+        self._pending = []
+        # prediction_uuid -> failed writes of a row retried on its own
+        self._attempts = {}
+        self._lock = threading.Lock()
+        # Serializes flushes between the background thread and atexit
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.flush_latency = Histogram(
+            'prediction_write_behind_flush_seconds',
+            'Time spent writing one batch of buffered predictions',
+            FLUSH_LATENCY_BUCKETS,
+        )
+        self.rows_flushed = Counter(
+            'prediction_write_behind_rows_flushed_total',
+            'Buffered predictions handed to bulk_create',
+        )
+        self.rows_dropped = Counter(
+            'prediction_write_behind_rows_dropped_total',
+            'Buffered predictions lost because the buffer was full when re-queueing them',
+        )
+        self.rows_failed = Counter(
+            'prediction_write_behind_rows_failed_total',
+            'Buffered predictions dropped after failing every write attempt',
+        )
+
+    @property
+    def flush_size(self):
+        if self._flush_size is None:
+            return getattr(settings, 'PREDICTION_WRITE_BEHIND_FLUSH_SIZE', 500)
+        return self._flush_size
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is None:
+            return getattr(settings, 'PREDICTION_WRITE_BEHIND_FLUSH_INTERVAL', 1.0)
+        return self._flush_interval
+
+    @property
+    def max_pending(self):
+        if self._max_pending is None:
+            return getattr(settings, 'PREDICTION_WRITE_BEHIND_MAX_PENDING', 10000)
+        return self._max_pending
+
+    @property
+    def max_attempts(self):
+        if self._max_attempts is None:
+            return getattr(settings, 'PREDICTION_WRITE_BEHIND_MAX_ATTEMPTS', 3)
+        return self._max_attempts
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is None:
+                atexit.register(self.flush)
+            else:
+                # Rows buffered by the parent are the parent's to write
+                self._pending = []
+                self._attempts = {}
+            self._thread = threading.Thread(
+                target=self._run, name='prediction-write-behind', daemon=True
+            )
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def add(self, prediction_result):
+        """Buffer an unsaved PredictionResult. Returns False if the buffer is full."""
+        self._ensure_worker()
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                return False
+            self._pending.append(prediction_result)
+            depth = len(self._pending)
+        if depth >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self._write(batch)
+            except OperationalError:
+                logger.exception("Error flushing %d buffered predictions; re-queued", len(batch))
+                self._requeue(batch)
+                return 0
+            except Exception:
+                logger.exception("Error flushing %d buffered predictions; retrying row by row", len(batch))
+                written = self._write_rows(batch)
+            else:
+                written = len(batch)
+            self.flush_latency.observe(time.perf_counter() - started)
+            self.rows_flushed.inc(written)
+            return written
+
+    def _write_rows(self, batch):
+        """Write a failed batch one row at a time. Returns the number of rows written."""
+        written = 0
+        retry = []
+        for prediction in batch:
+            key = prediction.prediction_uuid
+            try:
+                self._write([prediction])
+            except Exception as e:
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts < self.max_attempts:
+                    self._attempts[key] = attempts
+                    retry.append(prediction)
+                else:
+                    self._attempts.pop(key, None)
+                    self.rows_failed.inc()
+                    logger.error("Dropping buffered prediction %s after %d failed writes: %s", key, attempts, e)
+            else:
+                self._attempts.pop(key, None)
+                written += 1
+        if retry:
+            self._requeue(retry)
+        return written
+
+    def _write(self, batch):
+        # A retried client-supplied prediction_uuid that is already stored is
+        # skipped, so it is neither inserted nor counted in the rollups twice.
+        uuids = [prediction.prediction_uuid for prediction in batch]
+        existing = set(PredictionResult.objects.filter(
+            prediction_uuid__in=uuids
+        ).values_list('prediction_uuid', flat=True))
+        new = []
+        for prediction in batch:
+            if prediction.prediction_uuid not in existing:
+                existing.add(prediction.prediction_uuid)
+                new.append(prediction)
+        with transaction.atomic():
+            PredictionResult.objects.bulk_create(new)
+            rollups.record(new)
+
+    def _requeue(self, batch):
+        with self._lock:
+            room = max(self.max_pending - len(self._pending), 0)
+            self._pending[:0] = batch[:room]
+        if len(batch) > room:
+            self.rows_dropped.inc(len(batch) - room)
+            for prediction in batch[room:]:
+                self._attempts.pop(prediction.prediction_uuid, None)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def stats(self):
+        return {
+            'enabled': getattr(settings, 'PREDICTION_WRITE_BEHIND', False),
+            'queue_depth': self.depth,
+            'max_pending': self.max_pending,
+            'flush_size': self.flush_size,
+            'flush_interval': self.flush_interval,
+            'rows_flushed': self.rows_flushed.value,
+            'rows_dropped': self.rows_dropped.value,
+            'rows_failed': self.rows_failed.value,
+            'max_attempts': self.max_attempts,
+            'flush_latency_seconds': self.flush_latency.snapshot(),
+        }
+
+
+write_behind = WriteBehindBuffer()
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so request latency in /api/metrics/ includes the other middleware
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +92,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'market-pred',
+    },
+    # Shared between worker processes; select it with ANALYTICS_CACHE_ALIAS
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -130,3 +148,135 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Model serving
+# Trained artifacts are written by ../data_pipeline.py into ../models/
+
+MODEL_DIR = BASE_DIR.parent / 'models'
+
+# Load the model artifacts once when the app registry is ready instead of on
+# the first request. Under manage.py this only happens for the commands in
+# MODEL_PRELOAD_COMMANDS; the others (migrate, backfill_actuals, ...) load
+# the model lazily if they need it. serve_workers loads it itself.
+MODEL_PRELOAD = True
+MODEL_PRELOAD_COMMANDS = ('runserver',)
+
+# Minimum number of seconds between checks of the VERSION file (or, without
+# one, the artifact mtimes). A changed signature triggers a reload and an
+# atomic swap of the model. data_pipeline.py writes VERSION last, so only a
+# complete artifact set is picked up.
+MODEL_RELOAD_INTERVAL = 5.0
+
+# Batch prediction (/api/predict/batch/)
+# Requests with more rows than PREDICTION_BATCH_MAX_SIZE are rejected with 413.
+PREDICTION_BATCH_MAX_SIZE = 10000
+
+# A full batch of JSON rows is a few MB, above Django's 2.5 MB default.
+DATA_UPLOAD_MAX_MEMORY_SIZE = 16 * 1024 * 1024
+
+# Batches larger than this (or requested with Accept: application/x-ndjson)
+# are scored PREDICTION_BATCH_CHUNK_SIZE rows at a time and streamed back as
+# newline-delimited JSON.
+PREDICTION_BATCH_STREAM_THRESHOLD = 1000
+PREDICTION_BATCH_CHUNK_SIZE = 1000
+
+# Micro-batching for /api/async/predict/ under an ASGI server. When enabled,
+# concurrent single-row requests are collected for up to
+# PREDICTION_COALESCE_WINDOW_MS (or PREDICTION_COALESCE_MAX_BATCH rows) and
+# scored with one model.predict call. The sync /api/predict/ view never
+# coalesces: it sees one request at a time per thread.
+PREDICTION_COALESCE = False
+PREDICTION_COALESCE_WINDOW_MS = 2.0
+PREDICTION_COALESCE_MAX_BATCH = 64
+# Rows queued in or being scored by the coalescer. Past this,
+# /api/async/predict/ answers 503 instead of queueing.
+PREDICTION_COALESCE_MAX_PENDING = 256
+
+# Async views (/api/async/...) run model inference in a bounded thread pool.
+# Once PREDICTION_POOL_MAX_PENDING tasks are queued or running, new requests
+# get 503 instead of waiting.
+PREDICTION_POOL_SIZE = 4
+PREDICTION_POOL_MAX_PENDING = 64
+
+# Write-behind persistence of PredictionResult rows. When enabled, predictions
+# are buffered and written with bulk_create every
+# PREDICTION_WRITE_BEHIND_FLUSH_INTERVAL seconds or once
+# PREDICTION_WRITE_BEHIND_FLUSH_SIZE rows are waiting. The response's
+# prediction_id is then null (the row has no id yet); its prediction_uuid
+# identifies the row once written. At most
+# PREDICTION_WRITE_BEHIND_MAX_PENDING rows are held; beyond that rows are
+# saved synchronously. When a flush fails for any reason other than a locked
+# or unreachable database, its rows are retried one at a time; a row that
+# fails PREDICTION_WRITE_BEHIND_MAX_ATTEMPTS writes is logged and dropped.
+PREDICTION_WRITE_BEHIND = False
+PREDICTION_WRITE_BEHIND_FLUSH_SIZE = 500
+PREDICTION_WRITE_BEHIND_FLUSH_INTERVAL = 1.0
+PREDICTION_WRITE_BEHIND_MAX_PENDING = 10000
+PREDICTION_WRITE_BEHIND_MAX_ATTEMPTS = 3
+
+# Response cache for /api/stats/ and /api/seasonal-analysis/. Entries are
+# invalidated when predictions are written; ANALYTICS_CACHE_TIMEOUT bounds how
+# stale another process's local-memory cache can get. Use the 'file' alias to
+# share the cache between workers.
+ANALYTICS_CACHE_ALIAS = 'default'
+ANALYTICS_CACHE_TIMEOUT = 60
+
+# /api/predictions/ is keyset-paginated; clients may ask for up to
+# PREDICTIONS_MAX_PAGE_SIZE rows with ?page_size=
+PREDICTIONS_PAGE_SIZE = 100
+PREDICTIONS_MAX_PAGE_SIZE = 1000
+
+# /api/predict/forecast/ scores up to FORECAST_MAX_DAYS days per request.
+# Forecasts are cached per (model version, inputs) in FORECAST_CACHE_ALIAS
+# for FORECAST_CACHE_TIMEOUT seconds; a new model version never hits old entries.
+FORECAST_MAX_DAYS = 366
+FORECAST_CACHE_ALIAS = 'default'
+FORECAST_CACHE_TIMEOUT = 3600
+
+# Per-process memo of /api/predict/ results keyed by model version and the
+# encoded feature row. At most PREDICTION_MEMO_SIZE entries (0 disables it),
+# each reused for PREDICTION_MEMO_TTL seconds. PREDICTION_MEMO_DEDUPE handles
+# exact repeats: 'off' stores every prediction, 'skip' stores none and returns
+# the original's ids, 'link' stores it with duplicate_of set to the original.
+PREDICTION_MEMO_SIZE = 10000
+PREDICTION_MEMO_TTL = 300.0
+PREDICTION_MEMO_DEDUPE = 'off'
+
+# Application logs (model loads, prediction errors, slow requests) go to the
+# console at LOG_LEVEL.
+LOG_LEVEL = 'INFO'
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s [%(process)d] %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Sampling profiler for slow requests. When PROFILE_SLOW_REQUEST_MS is set,
+# request stacks are sampled every PROFILE_SAMPLE_INTERVAL_MS and requests
+# slower than the threshold are written to PROFILE_DIR as folded stacks
+# (flamegraph.pl / speedscope input). None disables sampling entirely.
+PROFILE_SLOW_REQUEST_MS = None
+PROFILE_SAMPLE_INTERVAL_MS = 5.0
+PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Month-partitioned Parquet copy of MarketData (needs pyarrow). Filled by
+# `manage.py export_history` or `import_data --export-history` and read by
+# `data_pipeline.py --history`. Each export also rewrites the months whose
+# MarketData rows changed since the previous one.
+MARKET_HISTORY_DIR = BASE_DIR.parent / 'data' / 'market_history'
+
+# Per-segment models written by `data_pipeline.py --segments` under
+# MODEL_DIR/segments. Loaded on first use and kept in a per-process LRU of
+# at most SEGMENT_MODEL_CACHE_MB of artifacts; requests without a segment
+# model (or with SEGMENT_MODELS off) use the global model.
+SEGMENT_MODELS = True
+SEGMENT_MODEL_CACHE_MB = 256
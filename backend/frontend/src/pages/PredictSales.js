@@ -298,7 +298,7 @@ function PredictSales() {
                   Predicted Units to be Sold
                 </Typography>
                 <Typography variant="body2" sx={{ mt: 2 }}>
-                  Prediction ID: {result.prediction_id}
+                  Prediction ID: {result.prediction_id ?? result.prediction_uuid}
                 </Typography>
               </CardContent>
             </Card>
@@ -0,0 +1,28 @@
+"""
+Gunicorn settings for serving the API from several workers that share one
+copy of the model.
+
+``preload_app`` imports the WSGI app, and with it the model (see
+MODEL_PRELOAD), in the master before any worker is forked. The compact
+model artifacts are memory-mapped and the loaded objects are frozen out of
+the garbage collector before each fork, so the workers keep sharing those
+pages instead of copying them. ``manage.py serve_workers --measure`` reports
+the resulting per-worker memory.
+
+    gunicorn -c gunicorn.conf.py backend.wsgi
+"""
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+preload_app = True
+
+
+def pre_fork(server, worker):
+    from django.db import connections
+
+    # Workers must open their own database connections
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
@@ -1,165 +1,552 @@
+import argparse
+import json
+import os
+from datetime import date, timedelta
+from functools import partial
+
 import pandas as pd
 import numpy as np
 import joblib
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression, Ridge, Lasso
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# Load the dataset
-print("Loading data...")
-df = pd.read_csv('retail_store_inventory.csv')
-
-# Step 1: Data Cleaning
-print("Cleaning data...")
-df.fillna({
-    'Inventory Level': df['Inventory Level'].mean(),
-    'Units Sold': df['Units Sold'].mean(),
-    'Units Ordered': df['Units Ordered'].mean(),
-    'Demand Forecast': df['Demand Forecast'].mean(),
-    'Price': df['Price'].mean(),
-    'Discount': 0,
-    'Competitor Pricing': df['Competitor Pricing'].mean()
-}, inplace=True)
-
-# Convert categorical columns to numerical (one-hot encoding)
-categorical_cols = ['Store ID', 'Product ID', 'Category', 'Region', 'Weather Condition', 'Holiday/Promotion', 'Seasonality']
-df = pd.get_dummies(df, columns=categorical_cols, drop_first=True)
-
-# Convert Date to numerical features
-df['Date'] = pd.to_datetime(df['Date'])
-df['Day'] = df['Date'].dt.day
-df['Month'] = df['Date'].dt.month
-df['Year'] = df['Date'].dt.year
-df.drop('Date', axis=1, inplace=True)
-
-# Step 2: Define Features (X) and Target (y)
-X = df.drop('Units Sold', axis=1)
-y = df['Units Sold']
-
-# Step 3: Split the Data
-print("Splitting data...")
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Step 4: Scale Numerical Features
-print("Applying preprocessing transformations...")
-scaler = StandardScaler()
-X_train_processed = scaler.fit_transform(X_train)
-X_test_processed = scaler.transform(X_test)
-
-# Save preprocessed data (optional, for consistency with the example)
-joblib.dump((X_train, X_test, y_train, y_test), 'data/train_test_data.pkl')
-joblib.dump(scaler, 'models/preprocessor.pkl')
-
-# Step 5: Train Multiple Models and Compare
-print("Training models...")
-models = {
-    'Linear Regression': LinearRegression(),
-    'Ridge Regression': Ridge(alpha=1.0),
-    'Lasso Regression': Lasso(alpha=0.1),
-    'Random Forest': RandomForestRegressor(n_estimators=100, random_state=42),
-    'Gradient Boosting': GradientBoostingRegressor(n_estimators=100, random_state=42)
-}
-
-results = {}
-
-for name, model in models.items():
-    print(f"Training {name}...")
-    model.fit(X_train_processed, y_train)
-    
-    # Make predictions
-    y_pred = model.predict(X_test_processed)
-    
-    # Calculate metrics
-    mse = mean_squared_error(y_test, y_pred)
-    rmse = np.sqrt(mse)
-    mae = mean_absolute_error(y_test, y_pred)
-    r2 = r2_score(y_test, y_pred)
-    
-    results[name] = {
-        'model': model,
-        'mse': mse,
-        'rmse': rmse,
-        'mae': mae,
-        'r2': r2
-    }
-    
-    print(f"{name} - RMSE: {rmse:.2f}, MAE: {mae:.2f}, R²: {r2:.2f}")
-
-# Step 6: Compare Models
-print("\nModel comparison:")
-results_df = pd.DataFrame({
-    'Model': list(results.keys()),
-    'RMSE': [results[m]['rmse'] for m in results],
-    'MAE': [results[m]['mae'] for m in results],
-    'R²': [results[m]['r2'] for m in results]
-})
-print(results_df)
-
-# Plot model comparison
-plt.figure(figsize=(12, 6))
-sns.barplot(x='Model', y='R²', data=results_df)
-plt.title('Model Comparison - R² Score')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig('models/model_comparison_r2.png')
-
-plt.figure(figsize=(12, 6))
-sns.barplot(x='Model', y='RMSE', data=results_df)
-plt.title('Model Comparison - RMSE')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig('models/model_comparison_rmse.png')
-
-# Step 7: Select and Save Best Model
-best_model_name = results_df.loc[results_df['R²'].idxmax(), 'Model']
-best_model = results[best_model_name]['model']
-print(f"\nBest model: {best_model_name} with R² = {results[best_model_name]['r2']:.2f}")
-
-joblib.dump(best_model, 'models/best_model.pkl')
-print("Best model saved to models/best_model.pkl")
-
-# Step 8: Save Preprocessor and Column Names
-joblib.dump(scaler, 'models/preprocessor.pkl')  # Overwrites earlier save for consistency
-joblib.dump(X.columns.tolist(), 'models/columns.pkl')
-
-# Step 9: Create and Save Prediction Function
-def predict_sales(data, preprocessor=scaler, model=best_model):
+import pipeline  # noqa: F401 - makes backend/ importable
+from api.features import DATE, FeatureEncoder, TARGET
+from pipeline.compare import compare_models, default_workers, fit_one
+from api import columnar, serving
+from pipeline.data import fill_values, read_csv, read_history
+from pipeline.export import (SERVING_MODEL_FILE, export_fused, export_serving, publish_version, read_training,
+                             serving_predictor)
+from pipeline.resources import peak_rss_mb, timed
+from pipeline.segments import LEVELS as SEGMENT_LEVELS, export_segments, remove_segments, train_segments
+from pipeline.selection import select_model
+from pipeline.stages import StageCache, code_hash
+from pipeline.tuning import tune, tuned_models
+
+STAGES = ['load', 'clean', 'encode', 'split', 'scale', 'tune', 'train']
+
+# settings.MARKET_HISTORY_DIR, relative to the repository root this runs from
+DEFAULT_HISTORY = os.path.join('data', 'market_history')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train and compare sales prediction models')
+    parser.add_argument('--data', default='retail_store_inventory.csv', help='Training CSV')
+    parser.add_argument('--history', default=None, metavar='DIR',
+                        help='Train from the Parquet market history in DIR (manage.py export_history) instead of --data')
+    parser.add_argument('--start', type=date.fromisoformat, default=None,
+                        help='With --history, only read rows on or after this date')
+    parser.add_argument('--end', type=date.fromisoformat, default=None,
+                        help='With --history, only read rows on or before this date')
+    parser.add_argument('--region', action='append', default=None,
+                        help='With --history, only read this region (repeatable)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes used to fit the candidate models (default: one per model, up to the CPU count)')
+    parser.add_argument('--tune', action='store_true',
+                        help='Search hyperparameters on time-ordered folds with successive halving before training')
+    parser.add_argument('--cv-folds', type=int, default=4, help='Expanding-window time folds used by --tune')
+    parser.add_argument('--candidates', type=int, default=12,
+                        help='Random configurations per model family that --tune starts from')
+    parser.add_argument('--slo-ms', type=float, default=5.0,
+                        help='Serving budget: median single-row predict time in milliseconds')
+    parser.add_argument('--max-batch-us', type=float, default=None,
+                        help='Serving budget: batch predict time per row in microseconds')
+    parser.add_argument('--max-artifact-mb', type=float, default=None,
+                        help='Serving budget: size of the model artifact the API loads')
+    parser.add_argument('--cache-dir', default=os.path.join('cache', 'pipeline'),
+                        help='Where stage outputs are cached')
+    parser.add_argument('--no-cache', action='store_true', help='Run every stage without reading or writing the cache')
+    parser.add_argument('--force', action='append', default=[], choices=STAGES + ['all'], metavar='STAGE',
+                        help='Re-run STAGE even if it is cached (repeatable; "all" re-runs everything)')
+    parser.add_argument('--list-stages', action='store_true', help='List cached stage outputs and exit')
+    parser.add_argument('--invalidate', action='append', default=[], choices=STAGES + ['all'], metavar='STAGE',
+                        help='Delete the cached outputs of STAGE and exit (repeatable; "all" clears the cache)')
+    parser.add_argument('--timings', default=None, metavar='PATH',
+                        help='Write the wall time of every stage that ran to PATH as JSON')
+    parser.add_argument('--chunked', action='store_true',
+                        help='Stream the CSV in chunks into sparse partial_fit models (bounded memory)')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='Rows per chunk with --chunked')
+    parser.add_argument('--epochs', type=int, default=5,
+                        help='partial_fit passes over the data with --chunked or --incremental')
+    parser.add_argument('--segments', action='append', default=None, choices=sorted(SEGMENT_LEVELS), metavar='LEVEL',
+                        help='Also fit the selected model per segment at LEVEL: region, category or '
+                             '"region,category" (repeatable); kept only where it beats the global model')
+    parser.add_argument('--segment-min-rows', type=int, default=1000,
+                        help='With --segments, skip segments with fewer training rows')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Update the current model with the rows dated after the ones it was trained on')
+    parser.add_argument('--window-days', type=int, default=365,
+                        help='With --incremental, days of history a model without partial_fit/warm_start is refitted on')
+    parser.add_argument('--window-history', default=None, metavar='DIR',
+                        help='With --incremental, Parquet market history the refit window is read from '
+                             f'(default: --history, else {DEFAULT_HISTORY} if it exists, else --data)')
+    parser.add_argument('--extra-trees', type=int, default=25,
+                        help='With --incremental, trees or boosting stages added to a tree ensemble')
+    parser.add_argument('--max-trees', type=int, default=300,
+                        help='With --incremental, tree ensembles past this size are refitted on the window instead')
+    parser.add_argument('--holdout-days', type=int, default=None,
+                        help='With --incremental, newest days held out to check the update (default: 20%%)')
+    parser.add_argument('--max-regression', type=float, default=0.05,
+                        help='With --incremental, publish only if holdout RMSE is at most this much worse')
+    parser.add_argument('--force-publish', action='store_true',
+                        help='With --incremental, publish the update even if it scores worse on the holdout')
+    return parser.parse_args()
+
+
+def predict_sales(data, preprocessor, model):
     """
     Make predictions using the trained model
-    
+
     Parameters:
     data (pd.DataFrame): Input data with all required features
     preprocessor: The fitted preprocessor (scaler)
     model: The trained model
-    
+
     Returns:
     np.array: Predictions
     """
     processed_data = preprocessor.transform(data)
     return model.predict(processed_data)
 
-joblib.dump(predict_sales, 'models/predict_function.pkl')
-print("Prediction function saved to models/predict_function.pkl")
-
-# Step 10: Feature Importance (if applicable)
-if hasattr(best_model, 'feature_importances_'):
-    feature_names = X.columns.tolist()
-    importances = best_model.feature_importances_
-    
-    # Top 20 features
-    indices = np.argsort(importances)[-20:]
-    
-    plt.figure(figsize=(12, 10))
-    plt.barh(range(len(indices)), importances[indices], align='center')
-    plt.yticks(range(len(indices)), [feature_names[i] for i in indices])
-    plt.xlabel('Feature Importance')
-    plt.title('Top 20 Most Important Features')
+
+def train_chunked(args):
+    from pipeline.chunked import train_out_of_core
+
+    print(f"Training out of core on {args.data} in chunks of {args.chunk_size} rows...")
+    encoder, scaler, results, timings, X_check = train_out_of_core(args.data, args.chunk_size, args.epochs)
+    results_df = pd.DataFrame({
+        'Model': list(results.keys()),
+        'RMSE': [results[m]['rmse'] for m in results],
+        'MAE': [results[m]['mae'] for m in results],
+        'R²': [results[m]['r2'] for m in results]
+    })
+    print(results_df)
+    best_model_name = results_df.loc[results_df['R²'].idxmax(), 'Model']
+    print(f"\nBest model: {best_model_name} with R² = {results[best_model_name]['r2']:.2f}")
+    joblib.dump(results[best_model_name]['model'], 'models/best_model.pkl')
+    # Checked on real held-out rows, which follow realistic split paths
+    export_serving(results[best_model_name]['model'], 'models', scaler.transform(X_check))
+    export_fused(results[best_model_name]['model'], scaler, 'models', X_check)
+    joblib.dump(scaler, 'models/preprocessor.pkl')
+    joblib.dump(encoder.columns, 'models/columns.pkl')
+    remove_segments('models')
+    version = publish_version('models', {
+        'mode': 'chunked',
+        'model': best_model_name,
+        'source': os.path.abspath(args.data),
+        'trained_through': pd.to_datetime(read_csv(args.data, usecols=[DATE])[DATE]).max().date(),
+    })
+    print(f"Published model version {version}")
+    print("Timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    print(f"Peak RSS: {peak_rss_mb():.0f} MB")
+    if args.timings:
+        with open(args.timings, 'w') as f:
+            json.dump({'stages': timings, 'peak_rss_mb': peak_rss_mb()}, f, indent=1)
+
+
+def check_history(path):
+    if path and not columnar.HAS_ARROW:
+        raise SystemExit(f"Reading the Parquet market history {path} needs pyarrow (pip install pyarrow)")
+
+
+def read_rows(args, start=None, end=None, history=None):
+    """Rows of ``history`` (default: --history), or of --data without one, dated in [start, end]."""
+    history = history or args.history
+    if history:
+        check_history(history)
+        return read_history(history, start, end, args.region)
+    frame = read_csv(args.data)
+    dates = pd.to_datetime(frame[DATE]).dt.date
+    keep = np.ones(len(frame), dtype=bool)
+    if start is not None:
+        keep &= (dates >= start).to_numpy()
+    if end is not None:
+        keep &= (dates <= end).to_numpy()
+    return frame[keep].reset_index(drop=True)
+
+
+def train_incremental(args):
+    from pipeline import incremental
+
+    training = read_training('models')
+    if not training or not training.get('trained_through'):
+        raise SystemExit("models/training.json has no trained_through date: run the full pipeline first")
+    trained_through = date.fromisoformat(training['trained_through'])
+    model = joblib.load('models/best_model.pkl')
+    scaler = joblib.load('models/preprocessor.pkl')
+    columns = joblib.load('models/columns.pkl')
+
+    with timed('Load new rows'):
+        frame = read_rows(args, start=trained_through + timedelta(days=1), end=args.end)
+    if frame.empty:
+        print(f"No rows after {trained_through}; nothing to do")
+        return
+    X, X_raw, y, dates = incremental.encode(frame, columns, scaler)
+    update_idx, holdout_idx = incremental.holdout_split(dates, args.holdout_days)
+    # Rows the update learns from; the held-out days are learnt next run
+    learnt_through = pd.Timestamp(dates[update_idx].max()).date()
+    print(f"{len(frame)} new rows after {trained_through}: learning from {len(update_idx)}, "
+          f"checking on {len(holdout_idx)} (from {pd.Timestamp(dates[holdout_idx].min()).date()})")
+
+    def window():
+        # The window spans older days than the new rows, so read it from the
+        # full history rather than from a --data file that may hold only them
+        start = incremental.window_start(learnt_through, args.window_days)
+        history = args.window_history or args.history or (DEFAULT_HISTORY if os.path.isdir(DEFAULT_HISTORY) else None)
+        source = history or args.data
+        rows = read_rows(args, start, learnt_through, history=history)
+        if rows.empty:
+            raise SystemExit(f"No rows dated {start}..{learnt_through} in {source} to refit on")
+        days = pd.to_datetime(rows[DATE]).dt.date
+        first, last = days.min(), days.max()
+        print(f"Refitting on {len(rows)} rows dated {first}..{last} from {source}")
+        if first > start:
+            print(f"Warning: the {args.window_days}-day window starts at {start}, but {source} has no rows "
+                  f"before {first}; pass --window-history with the full market history")
+        X_window, _, y_window, _ = incremental.encode(rows, columns, scaler)
+        return X_window, y_window
+
+    with timed('Update'):
+        updated, mode = incremental.update(
+            model, X[update_idx], y[update_idx], window, epochs=args.epochs,
+            extra_trees=args.extra_trees, max_trees=args.max_trees, base_trees=training.get('base_trees'))
+    before = incremental.score(model, X[holdout_idx], y[holdout_idx])
+    after = incremental.score(updated, X[holdout_idx], y[holdout_idx])
+    print(f"{type(model).__name__} updated by {mode}: holdout RMSE {before['rmse']:.3f} -> {after['rmse']:.3f}, "
+          f"MAE {before['mae']:.3f} -> {after['mae']:.3f}")
+    if after['rmse'] > before['rmse'] * (1 + args.max_regression) and not args.force_publish:
+        print(f"Not published: holdout RMSE regressed by more than {args.max_regression:.0%}")
+        return
+
+    joblib.dump(updated, 'models/best_model.pkl')
+    export_serving(updated, 'models', X[holdout_idx])
+    export_fused(updated, scaler, 'models', pd.DataFrame(X_raw[holdout_idx], columns=columns))
+    version = publish_version('models', {
+        'mode': f'incremental ({mode})',
+        'model': training.get('model'),
+        'source': os.path.abspath(args.history or args.data),
+        'trained_through': learnt_through,
+        'previous_version': training.get('version'),
+        'rows': int(len(update_idx)),
+        'holdout': {'before': before, 'after': after},
+        'base_trees': training.get('base_trees'),
+        # Segment models keep serving as trained: they share the fixed columns
+        'segments': training.get('segments', []),
+    })
+    print(f"Published model version {version} (trained through {learnt_through}, peak RSS {peak_rss_mb():.0f} MB)")
+    if args.timings:
+        with open(args.timings, 'w') as f:
+            json.dump({'mode': mode, 'holdout': {'before': before, 'after': after},
+                       'peak_rss_mb': peak_rss_mb()}, f, indent=1)
+
+
+def load_stage(path, sha256):
+    # sha256 only keys the cache on the file's contents
+    with timed('Load'):
+        return {'frame': read_csv(path)}
+
+
+def load_history_stage(root, signature, start, end, regions):
+    # signature only keys the cache on the dataset's files; the date and
+    # region filters are pushed down into the Parquet scan
+    with timed('Load'):
+        return {'frame': read_history(root, start, end, regions)}
+
+
+def clean_stage(loaded):
+    frame = loaded['frame']
+    return {'frame': frame.fillna(fill_values(frame))}
+
+
+def encode_stage(cleaned):
+    # Encode features with the same FeatureEncoder the Django API uses for serving
+    # (one-hot with the first level dropped, then Day/Month/Year from Date) so the
+    # training and serving layouts cannot drift apart.
+    frame = cleaned['frame']
+    encoder = FeatureEncoder.fit(frame)
+    return {
+        'X': encoder.transform_frame(frame),
+        'y': frame[TARGET].to_numpy(dtype=np.float64),
+        'dates': pd.to_datetime(frame[DATE]).to_numpy(dtype='datetime64[D]'),
+        'columns': encoder.columns,
+    }
+
+
+def split_stage(encoded, test_size):
+    # Hold out the most recent dates: a random split would train on rows
+    # from after the ones the models are scored on.
+    dates = encoded['dates']
+    days = np.unique(dates)
+    cutoff = days[int(len(days) * (1 - test_size))]
+    return {'train_idx': np.flatnonzero(dates < cutoff), 'test_idx': np.flatnonzero(dates >= cutoff)}
+
+
+def scale_stage(encoded, split):
+    X, y, columns = encoded['X'], encoded['y'], encoded['columns']
+    train_idx, test_idx = split['train_idx'], split['test_idx']
+    scaler = StandardScaler()
+    return {
+        'scaler': scaler,
+        'X_train': scaler.fit_transform(pd.DataFrame(X[train_idx], columns=columns)),
+        'X_test': scaler.transform(pd.DataFrame(X[test_idx], columns=columns)),
+        'y_train': y[train_idx],
+        'y_test': y[test_idx],
+    }
+
+
+def tune_stage(scaled, encoded, split, n_splits, n_candidates, workers=None):
+    dates = encoded['dates'][split['train_idx']]
+    tuned = tune(np.asarray(scaled['X_train']), np.asarray(scaled['y_train']), dates,
+                 n_splits=n_splits, n_candidates=n_candidates, workers=workers or -1)
+    return {'tuned': tuned}
+
+
+def train_stage(cache, scaled, models, workers):
+    """
+    Fit the models whose (estimator, params, scaled data) entry is not cached,
+    in parallel, and return {name: result} for all of them.
+    """
+    code = code_hash(fit_one, deps=(fit_one, serving_predictor, serving))
+    keys, results, missing = {}, {}, {}
+    for name, model in models.items():
+        params = {'model': name, 'estimator': type(model).__name__, 'params': model.get_params()}
+        keys[name] = (cache.key('train', code, params, [scaled]), params)
+        cached = cache.lookup('train', keys[name][0])
+        if cached is not None:
+            print(f"[train] {name} cached ({keys[name][0][:12]})")
+            results[name] = cached['result']
+        else:
+            missing[name] = model
+
+    if missing:
+        workers = workers or default_workers(len(missing))
+        print(f"Training {len(missing)} model(s) with {workers} worker(s)...")
+        with timed('Model comparison'):
+            fitted = compare_models(missing, scaled['X_train'], scaled['y_train'],
+                                    scaled['X_test'], scaled['y_test'], workers=workers)
+        for name, result in fitted.items():
+            key, params = keys[name]
+            cache.store('train', key, {'result': result}, params, result['fit_wall'])
+            results[name] = result
+    return {name: results[name] for name in models}
+
+
+def manage_cache(cache, args):
+    if args.list_stages:
+        entries = cache.entries()
+        if not entries:
+            print(f"No cached stages in {cache.root}")
+        for meta in entries:
+            params = {k: v for k, v in meta['params'].items() if k != 'params'}
+            print(f"{meta['stage']:<8} {meta['key'][:12]}  {meta['created'][:19]}  "
+                  f"{meta['seconds']:8.2f}s  {meta['bytes'] / 1e6:9.1f} MB  {params}")
+    for stage in args.invalidate:
+        print(f"Removed {cache.invalidate(stage)} cached {stage} entries")
+
+
+def main():
+    args = parse_args()
+    check_history(args.history)
+    check_history(args.window_history)
+    if args.chunked:
+        train_chunked(args)
+        return
+    if args.incremental:
+        train_incremental(args)
+        return
+
+    cache = StageCache(args.cache_dir, force=args.force, enabled=not args.no_cache)
+    if args.list_stages or args.invalidate:
+        manage_cache(cache, args)
+        return
+
+    # Steps 1-4 run as cached stages: each is re-run only when its code,
+    # parameters or upstream outputs changed.
+    print("Loading data...")
+    if args.history:
+        loaded = cache.run('load', load_history_stage, params={
+            'root': os.path.abspath(args.history),
+            'signature': columnar.signature(args.history),
+            'start': args.start,
+            'end': args.end,
+            'regions': sorted(args.region) if args.region else None,
+        }, deps=(read_history, columnar))
+    else:
+        loaded = cache.run('load', load_stage, params={
+            'path': os.path.abspath(args.data),
+            'sha256': cache.file_digest(args.data),
+        }, deps=(read_csv,))
+
+    # Step 1: Data Cleaning
+    cleaned = cache.run('clean', clean_stage, [loaded], deps=(fill_values,))
+
+    # Step 2: Encode features and define target (y)
+    encoded = cache.run('encode', encode_stage, [cleaned], deps=(FeatureEncoder,))
+    columns = encoded['columns']
+
+    # Step 3: Split the Data
+    split = cache.run('split', split_stage, [encoded], {'test_size': 0.2})
+
+    # Step 4: Scale Numerical Features
+    scaled = cache.run('scale', scale_stage, [encoded, split])
+    scaler = scaled['scaler']
+
+    # Save preprocessed data (optional, for consistency with the example)
+    X, y = encoded['X'], encoded['y']
+    train_idx, test_idx = split['train_idx'], split['test_idx']
+    joblib.dump((
+        pd.DataFrame(X[train_idx], columns=columns, index=train_idx),
+        pd.DataFrame(X[test_idx], columns=columns, index=test_idx),
+        pd.Series(y[train_idx], index=train_idx, name=TARGET),
+        pd.Series(y[test_idx], index=test_idx, name=TARGET),
+    ), 'data/train_test_data.pkl')
+
+    # Step 5: Train Multiple Models and Compare
+    # Each model is fitted in its own process against memory-mapped copies of
+    # the scaled data, so the stage takes about as long as the slowest model.
+    # Models whose hyperparameters and data are unchanged come from the cache.
+    if args.tune:
+        tuned = cache.run('tune', tune_stage, [scaled, encoded, split],
+                          {'n_splits': args.cv_folds, 'n_candidates': args.candidates},
+                          deps=(tune,), workers=args.workers)['tuned']
+        models = tuned_models(tuned)
+    else:
+        tuned = None
+        models = {
+            'Linear Regression': LinearRegression(),
+            'Ridge Regression': Ridge(alpha=1.0),
+            'Lasso Regression': Lasso(alpha=0.1),
+            'Random Forest': RandomForestRegressor(n_estimators=100, random_state=42),
+            'Gradient Boosting': GradientBoostingRegressor(n_estimators=100, random_state=42)
+        }
+    with timed('train', cache.timings):
+        results = train_stage(cache, scaled, models, args.workers)
+
+    # Step 6: Compare Models
+    results_df = pd.DataFrame({
+        'Model': list(results.keys()),
+        'RMSE': [results[m]['rmse'] for m in results],
+        'MAE': [results[m]['mae'] for m in results],
+        'R²': [results[m]['r2'] for m in results],
+        'Fit wall (s)': [results[m]['fit_wall'] for m in results],
+        'Fit CPU (s)': [results[m]['fit_cpu'] for m in results],
+        'Predict 1 row (ms)': [results[m]['predict_ms'] for m in results],
+        'Batch (µs/row)': [results[m]['batch_us_per_row'] for m in results],
+        'Artifact (MB)': [results[m]['artifact_mb'] for m in results]
+    })
+    if tuned is not None:
+        results_df['CV RMSE'] = [tuned[m]['cv_rmse'] for m in results]
+        results_df['Params'] = [tuned[m]['params'] for m in results]
+
+    # Leaderboard: holdout accuracy next to what each model costs to serve
+    leaderboard = results_df.sort_values('RMSE').reset_index(drop=True)
+    print("\nModel comparison (most recent dates held out):")
+    print(leaderboard.drop(columns='Params', errors='ignore').to_string())
+    leaderboard.to_csv('models/leaderboard.csv', index=False)
+
+    # Plot model comparison
+    plt.figure(figsize=(12, 6))
+    sns.barplot(x='Model', y='R²', data=results_df)
+    plt.title('Model Comparison - R² Score')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig('models/model_comparison_r2.png')
+
+    plt.figure(figsize=(12, 6))
+    sns.barplot(x='Model', y='RMSE', data=results_df)
+    plt.title('Model Comparison - RMSE')
+    plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig('models/feature_importance.png')
-    print("Feature importance plot saved to models/feature_importance.png")
+    plt.savefig('models/model_comparison_rmse.png')
+
+    # Step 7: Select and Save Best Model
+    # The most accurate model that meets the serving budget, measured on the
+    # compact predictor the API loads
+    best_model_name, met_slo = select_model(results, args.slo_ms, args.max_batch_us, args.max_artifact_mb)
+    best_model = results[best_model_name]['model']
+    if not met_slo:
+        print("\nNo model meets the serving SLO; falling back to the fastest one")
+    print(f"\nBest model: {best_model_name} with R² = {results[best_model_name]['r2']:.2f}, "
+          f"{results[best_model_name]['predict_ms']:.2f}ms/row, {results[best_model_name]['artifact_mb']:.1f} MB")
+
+    joblib.dump(best_model, 'models/best_model.pkl')
+    print("Best model saved to models/best_model.pkl")
+    if export_serving(best_model, 'models', scaled['X_test']):
+        print(f"Compact serving model saved to models/{SERVING_MODEL_FILE}")
+
+    # Step 8: Save Preprocessor and Column Names
+    joblib.dump(scaler, 'models/preprocessor.pkl')
+    joblib.dump(columns, 'models/columns.pkl')
+
+    # Fold the scaler into the served model and prove it on the test split
+    fused_path, difference = export_fused(best_model, scaler, 'models',
+                                          pd.DataFrame(X[test_idx], columns=columns))
+    if fused_path:
+        print(f"Fused predictor saved to {fused_path} (max |difference| on the test split {difference:.2e})")
+    elif difference is not None:
+        print(f"Fused predictor not saved: max |difference| on the test split is {difference:.2e}")
+
+    if args.timings:
+        with open(args.timings, 'w') as f:
+            json.dump({
+                'stages': cache.timings,
+                'fit_wall': {name: result['fit_wall'] for name, result in results.items()},
+                'peak_rss_mb': peak_rss_mb(),
+            }, f, indent=1)
+
+    # Step 9: Save Prediction Function
+    joblib.dump(partial(predict_sales, preprocessor=scaler, model=best_model), 'models/predict_function.pkl')
+    print("Prediction function saved to models/predict_function.pkl")
+
+    # Optional per-segment models on the same columns and scaler; segments
+    # left over from an earlier run may not match the new columns
+    segment_names = []
+    if args.segments:
+        levels = sorted(set(args.segments))
+        with timed('segments', cache.timings):
+            segments = train_segments(best_model, cleaned['frame'], split, scaled, levels, args.segment_min_rows)
+            index = export_segments('models', segments, levels, scaler, np.asarray(scaled['X_test']),
+                                    pd.DataFrame(X[test_idx], columns=columns))
+        segment_names = sorted(index['segments'])
+        print(f"{len(segment_names)} segment model(s) saved to models/segments")
+    else:
+        remove_segments('models')
+
+    # Written last: VERSION tells the API the new artifacts are complete, and
+    # training.json is where --incremental picks up from
+    version = publish_version('models', {
+        'mode': 'full',
+        'model': best_model_name,
+        'source': os.path.abspath(args.history or args.data),
+        'trained_through': pd.Timestamp(encoded['dates'].max()).date(),
+        'rows': int(len(y)),
+        'base_trees': getattr(best_model, 'n_estimators', None),
+        'segments': segment_names,
+    })
+    print(f"Published model version {version}")
+
+    # Step 10: Feature Importance (if applicable)
+    if hasattr(best_model, 'feature_importances_'):
+        feature_names = list(columns)
+        importances = best_model.feature_importances_
+
+        # Top 20 features
+        indices = np.argsort(importances)[-20:]
+
+        plt.figure(figsize=(12, 10))
+        plt.barh(range(len(indices)), importances[indices], align='center')
+        plt.yticks(range(len(indices)), [feature_names[i] for i in indices])
+        plt.xlabel('Feature Importance')
+        plt.title('Top 20 Most Important Features')
+        plt.tight_layout()
+        plt.savefig('models/feature_importance.png')
+        print("Feature importance plot saved to models/feature_importance.png")
+
+    print(f"\nModel training and evaluation completed! (peak RSS {peak_rss_mb():.0f} MB)")
+
 
-print("\nModel training and evaluation completed!")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
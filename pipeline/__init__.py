@@ -0,0 +1,11 @@
+"""
+Helpers for data_pipeline.py (training). Shared feature code lives in the
+Django app's ``api`` package, which is importable without Django, so make
+``backend/`` importable wherever the pipeline is run from.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
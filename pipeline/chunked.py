@@ -0,0 +1,137 @@
+"""
+Out-of-core training for data_pipeline.py --chunked.
+
+The CSV is streamed in chunks with compact dtypes, encoded into sparse
+one-hot blocks against a fixed vocabulary and fed to estimators through
+``partial_fit``, so peak memory follows the chunk size instead of the
+number of rows. Blocks are only densified one chunk at a time, for the
+centring scaler the serving code expects. Every ``test_every``-th row is
+held out for evaluation.
+
+Passes over the file:
+1. vocabulary of every categorical feature and the fillna means
+2. ``StandardScaler.partial_fit`` on the training rows
+3. ``epochs`` passes of ``partial_fit`` for each candidate model
+4. streaming RMSE / MAE / R² on the held-out rows
+"""
+import time
+
+import numpy as np
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+
+from api.features import CATEGORICAL_FEATURES, TARGET, FeatureEncoder
+
+from .data import CHUNKED_DTYPES, RunningFillValues, read_csv
+from .resources import peak_rss_mb
+
+
+def candidate_models():
+    return {
+        'SGD Regression': SGDRegressor(penalty='l2', alpha=1e-4, random_state=42),
+        'SGD Huber Regression': SGDRegressor(loss='huber', epsilon=10.0, penalty='l2',
+                                             alpha=1e-4, random_state=42),
+    }
+
+
+def scan(path, chunk_size):
+    """Pass 1: fixed vocabulary, fillna values and row count."""
+    levels = {feature: set() for feature in CATEGORICAL_FEATURES}
+    fills = RunningFillValues()
+    rows = 0
+    for chunk in read_csv(path, chunksize=chunk_size, dtypes=CHUNKED_DTYPES):
+        fills.update(chunk)
+        for feature in CATEGORICAL_FEATURES:
+            levels[feature].update(chunk[feature].dropna().astype(str).unique())
+        rows += len(chunk)
+    return FeatureEncoder.from_levels(levels), fills.values(), rows
+
+
+def iter_blocks(path, encoder, fills, chunk_size, test_every):
+    """Yield (X, y, is_test) per chunk with X a CSR block in the encoder's layout."""
+    offset = 0
+    for chunk in read_csv(path, chunksize=chunk_size, dtypes=CHUNKED_DTYPES):
+        chunk = chunk.fillna(fills)
+        X = encoder.transform_frame_sparse(chunk)
+        y = chunk[TARGET].to_numpy(dtype=np.float64)
+        is_test = np.arange(offset, offset + len(chunk)) % test_every == 0
+        offset += len(chunk)
+        yield X, y, is_test
+
+
+class StreamingMetrics:
+    """RMSE, MAE and R² accumulated over blocks."""
+
+    def __init__(self):
+        self.n = 0
+        self.sse = self.sae = self.sum_y = self.sum_y2 = 0.0
+
+    def update(self, y_true, y_pred):
+        error = y_true - y_pred
+        self.n += len(y_true)
+        self.sse += float(error @ error)
+        self.sae += float(np.abs(error).sum())
+        self.sum_y += float(y_true.sum())
+        self.sum_y2 += float(y_true @ y_true)
+
+    def result(self):
+        if not self.n:
+            return {'mse': np.nan, 'rmse': np.nan, 'mae': np.nan, 'r2': np.nan}
+        mse = self.sse / self.n
+        total = self.sum_y2 - self.sum_y ** 2 / self.n
+        return {
+            'mse': mse,
+            'rmse': np.sqrt(mse),
+            'mae': self.sae / self.n,
+            'r2': 1 - self.sse / total if total else np.nan,
+        }
+
+
+def train_out_of_core(path, chunk_size=100000, epochs=5, test_every=5, models=None, check_rows=1000):
+    """
+    Run all passes and return (encoder, scaler, results, timings, X_check)
+    where results maps model name -> {'model', 'mse', 'rmse', 'mae', 'r2'}
+    and X_check holds up to ``check_rows`` unscaled held-out rows, for
+    checking the exported serving models.
+    """
+    models = models or candidate_models()
+    timings = {}
+
+    started = time.perf_counter()
+    encoder, fills, rows = scan(path, chunk_size)
+    timings['scan'] = time.perf_counter() - started
+    print(f"Scanned {rows} rows, {encoder.n_features} features in {timings['scan']:.2f}s "
+          f"(peak RSS {peak_rss_mb():.0f} MB)")
+
+    started = time.perf_counter()
+    scaler = StandardScaler()
+    for X, _, is_test in iter_blocks(path, encoder, fills, chunk_size, test_every):
+        scaler.partial_fit(X[~is_test].toarray())
+    timings['scale'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for epoch in range(epochs):
+        for X, y, is_test in iter_blocks(path, encoder, fills, chunk_size, test_every):
+            X_train = scaler.transform(X[~is_test].toarray())
+            for model in models.values():
+                model.partial_fit(X_train, y[~is_test])
+        print(f"Epoch {epoch + 1}/{epochs} done (peak RSS {peak_rss_mb():.0f} MB)")
+    timings['train'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    metrics = {name: StreamingMetrics() for name in models}
+    check = []
+    kept = 0
+    for X, y, is_test in iter_blocks(path, encoder, fills, chunk_size, test_every):
+        X_raw = X[is_test].toarray()
+        if kept < check_rows:
+            check.append(X_raw[:check_rows - kept])
+            kept += len(check[-1])
+        X_test = scaler.transform(X_raw)
+        for name, model in models.items():
+            metrics[name].update(y[is_test], model.predict(X_test))
+    timings['evaluate'] = time.perf_counter() - started
+
+    results = {name: dict(model=models[name], **metrics[name].result()) for name in models}
+    X_check = np.vstack(check) if check else np.empty((0, encoder.n_features))
+    return encoder, scaler, results, timings, X_check
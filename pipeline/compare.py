@@ -0,0 +1,98 @@
+"""
+Parallel model comparison.
+
+Each candidate is fitted in its own worker process. The scaled train/test
+matrices are written once as .npy files and every worker opens them with
+``mmap_mode='r'``, so the data is shared through the page cache instead of
+being pickled into each process. Wall time is close to the slowest model.
+"""
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from .export import artifact_bytes, serving_predictor
+
+# Single-row predicts timed per model for the latency column
+LATENCY_REPEATS = 200
+
+
+def default_workers(n_models):
+    return max(1, min(n_models, os.cpu_count() or 1))
+
+
+def predict_latency_ms(model, X, repeats=LATENCY_REPEATS):
+    """Median wall time of a single-row predict, as the API serves it."""
+    row = np.asarray(X[:1])
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.predict(row)
+        samples.append(time.perf_counter() - started)
+    return float(np.median(samples)) * 1000
+
+
+def fit_one(name, model, paths):
+    X_train, y_train, X_test, y_test = (np.load(path, mmap_mode='r') for path in paths)
+    wall, cpu = time.perf_counter(), time.process_time()
+    model.fit(X_train, y_train)
+    fit_wall, fit_cpu = time.perf_counter() - wall, time.process_time() - cpu
+    y_pred = model.predict(X_test)
+    mse = mean_squared_error(y_test, y_pred)
+    # Latency and size are measured on what the API will actually load
+    served = serving_predictor(model, X_test, expected=y_pred)
+    started = time.perf_counter()
+    served.predict(X_test)
+    batch_seconds = time.perf_counter() - started
+    return name, {
+        'model': model,
+        'mse': mse,
+        'rmse': np.sqrt(mse),
+        'mae': mean_absolute_error(y_test, y_pred),
+        'r2': r2_score(y_test, y_pred),
+        'fit_wall': fit_wall,
+        'fit_cpu': fit_cpu,
+        'compact': served is not model,
+        'predict_ms': predict_latency_ms(served, X_test),
+        'batch_us_per_row': batch_seconds / len(y_test) * 1e6,
+        'artifact_mb': artifact_bytes(served) / 1e6,
+    }
+
+
+def _report(outcomes):
+    for name, result in outcomes:
+        print(f"{name} - RMSE: {result['rmse']:.2f}, MAE: {result['mae']:.2f}, R²: {result['r2']:.2f} "
+              f"(fit {result['fit_wall']:.2f}s wall, {result['fit_cpu']:.2f}s CPU, "
+              f"predict {result['predict_ms']:.2f}ms/row)")
+        yield name, result
+
+
+def compare_models(models, X_train, y_train, X_test, y_test, workers=None):
+    """
+    Fit every model in ``models`` ({name: estimator}) concurrently and return
+    {name: {'model', 'mse', 'rmse', 'mae', 'r2', 'fit_wall', 'fit_cpu', 'compact',
+    'predict_ms', 'batch_us_per_row', 'artifact_mb'}} in
+    the order of ``models``. ``workers=1`` fits in this process.
+    """
+    workers = workers or default_workers(len(models))
+    shared = tempfile.mkdtemp(prefix='market-pred-')
+    try:
+        paths = []
+        for label, array in (('X_train', X_train), ('y_train', y_train), ('X_test', X_test), ('y_test', y_test)):
+            path = os.path.join(shared, f'{label}.npy')
+            np.save(path, np.ascontiguousarray(array))
+            paths.append(path)
+
+        if workers == 1:
+            done = dict(_report(fit_one(name, model, paths) for name, model in models.items()))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(fit_one, name, model, paths) for name, model in models.items()]
+                done = dict(_report(future.result() for future in as_completed(futures)))
+        return {name: done[name] for name in models}
+    finally:
+        shutil.rmtree(shared, ignore_errors=True)
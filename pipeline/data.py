@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from api import columnar
+from api.features import CATEGORICAL_FEATURES, DATE, NUMERIC_FEATURES, TARGET
+
+# Dtypes for retail_store_inventory.csv: categoricals instead of object
+# strings. Numeric columns stay float64, the precision the API scores
+# requests in, so in-memory models train on the values they will serve.
+CSV_DTYPES = {feature: 'category' for feature in CATEGORICAL_FEATURES}
+CSV_DTYPES.update({feature: 'float64' for feature in NUMERIC_FEATURES + [TARGET]})
+CSV_DTYPES[DATE] = 'string'
+
+# --chunked trades that for half the memory per chunk: its SGD models are
+# linear, so float32 rounding of the inputs moves predictions negligibly.
+CHUNKED_DTYPES = {**CSV_DTYPES, **{feature: 'float32' for feature in NUMERIC_FEATURES + [TARGET]}}
+
+CSV_COLUMNS = [DATE] + CATEGORICAL_FEATURES + NUMERIC_FEATURES + [TARGET]
+
+# Discount is filled with 0, every other numeric column with its mean
+FILL_ZERO = ['Discount']
+FILL_MEAN = [column for column in NUMERIC_FEATURES + [TARGET] if column not in FILL_ZERO]
+
+
+def read_csv(path, chunksize=None, usecols=None, dtypes=CSV_DTYPES):
+    """Read the training CSV with ``dtypes``, optionally as a chunk iterator."""
+    usecols = usecols or CSV_COLUMNS
+    return pd.read_csv(
+        path,
+        usecols=usecols,
+        dtype={column: dtypes[column] for column in usecols},
+        chunksize=chunksize,
+    )
+
+
+def read_history(root, start=None, end=None, regions=None):
+    """
+    Read the Parquet market history (see api.columnar) with the CSV's
+    columns, keeping only dates in [start, end] and the given regions.
+    """
+    return columnar.read(root, columns=CSV_COLUMNS, start=start, end=end,
+                         where={'Region': regions} if regions else None)
+
+
+def fill_values(frame):
+    values = {column: frame[column].mean() for column in FILL_MEAN}
+    values.update({column: 0 for column in FILL_ZERO})
+    return values
+
+
+class RunningFillValues:
+    """Accumulates the fillna values (column means) over chunks."""
+
+    def __init__(self):
+        self.sums = {column: 0.0 for column in FILL_MEAN}
+        self.counts = {column: 0 for column in FILL_MEAN}
+
+    def update(self, chunk):
+        for column in FILL_MEAN:
+            values = chunk[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            present = ~np.isnan(values)
+            self.sums[column] += values[present].sum()
+            self.counts[column] += int(present.sum())
+
+    def values(self):
+        values = {
+            column: self.sums[column] / self.counts[column] if self.counts[column] else 0.0
+            for column in FILL_MEAN
+        }
+        values.update({column: 0 for column in FILL_ZERO})
+        return values
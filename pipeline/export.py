@@ -0,0 +1,120 @@
+"""
+Serving artifacts written next to best_model.pkl.
+
+``serving_model.joblib`` is an uncompressed joblib dump of an
+``api.serving`` predictor so the API can load it with ``mmap_mode='r'``.
+It is only written when the compact predictor reproduces the fitted
+model's predictions; otherwise any stale copy is removed and the API falls
+back to best_model.pkl.
+
+``fused_model.joblib`` is the same predictor with the StandardScaler folded
+in, so the API scores raw encoded rows without ``preprocessor.transform``.
+It is verified against ``model.predict(scaler.transform(X))`` on the test
+split before it is written.
+
+``publish_version`` finishes a training run: ``training.json`` records what
+the model was trained on (incremental runs continue after its
+``trained_through`` date) and ``VERSION`` names it for the API.
+"""
+import io
+import json
+import os
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+
+from api.serving import compact_predictor, fuse_scaler
+
+# Must match api.registry and api.segments
+MODEL_FILE = 'best_model.pkl'
+SERVING_MODEL_FILE = 'serving_model.joblib'
+FUSED_MODEL_FILE = 'fused_model.joblib'
+VERSION_FILE = 'VERSION'
+SEGMENTS_DIR = 'segments'
+SEGMENTS_INDEX_FILE = 'index.json'
+TRAINING_FILE = 'training.json'
+
+
+def serving_predictor(model, X_check, expected=None, rtol=1e-9, atol=1e-6):
+    """The compact predictor for ``model`` if it matches it on ``X_check``, else ``model`` itself."""
+    predictor = compact_predictor(model)
+    if predictor is None:
+        return model
+    if expected is None:
+        expected = model.predict(X_check)
+    if not np.allclose(predictor.predict(X_check), expected, rtol=rtol, atol=atol):
+        return model
+    return predictor
+
+
+def artifact_bytes(obj):
+    """Size of ``obj`` as an uncompressed joblib dump."""
+    buffer = io.BytesIO()
+    joblib.dump(obj, buffer)
+    return buffer.getbuffer().nbytes
+
+
+def _write(predictor, path):
+    """Dump ``predictor`` to ``path``, or remove a stale file when it is None."""
+    if predictor is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    joblib.dump(predictor, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def export_serving(model, model_dir, X_check):
+    """Write (or remove) serving_model.joblib for ``model``. Returns the path written or None."""
+    predictor = serving_predictor(model, X_check)
+    return _write(predictor if predictor is not model else None, os.path.join(model_dir, SERVING_MODEL_FILE))
+
+
+def export_fused(model, scaler, model_dir, X_raw, rtol=1e-9, atol=1e-6):
+    """
+    Write (or remove) fused_model.joblib for ``model`` and ``scaler``.
+    Returns (path or None, max absolute difference on ``X_raw`` or None).
+    """
+    path = os.path.join(model_dir, FUSED_MODEL_FILE)
+    predictor = compact_predictor(model)
+    if predictor is None:
+        return _write(None, path), None
+    fused = fuse_scaler(predictor, scaler)
+    expected = model.predict(scaler.transform(X_raw))
+    actual = fused.predict(np.asarray(X_raw, dtype=np.float64))
+    difference = float(np.max(np.abs(actual - expected))) if len(X_raw) else 0.0
+    if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+        return _write(None, path), difference
+    return _write(fused, path), difference
+
+
+def new_version():
+    return datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+
+
+def read_training(model_dir):
+    """The training.json of the current model, or None for models trained before it existed."""
+    try:
+        with open(os.path.join(model_dir, TRAINING_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def publish_version(model_dir, meta):
+    """
+    Write training.json and then VERSION, after every other artifact, so the
+    API picks the new version up with its final files. Returns the version.
+    """
+    meta = {'version': new_version(), 'created': datetime.now(timezone.utc).isoformat(), **meta}
+    path = os.path.join(model_dir, TRAINING_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=1, default=str)
+    os.replace(path + '.tmp', path)
+    path = os.path.join(model_dir, VERSION_FILE)
+    with open(path + '.tmp', 'w') as f:
+        f.write(meta['version'] + '\n')
+    os.replace(path + '.tmp', path)
+    return meta['version']
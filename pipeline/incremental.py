@@ -0,0 +1,108 @@
+"""
+Incremental retraining for data_pipeline.py --incremental.
+
+Only rows dated after the current model's ``trained_through`` are read. The
+model is updated in place, in the cheapest way its type allows:
+
+- ``partial_fit`` estimators (the SGD models of --chunked) take a few more
+  passes over the new rows.
+- RandomForest and GradientBoosting grow ``extra_trees`` more trees or
+  boosting stages on the new rows with ``warm_start``. Once that would pass
+  ``max_trees``, they are refitted on the recent window instead.
+- Everything else is refitted on the last ``window_days`` of history.
+
+The scaler and the column layout stay fixed, so an update can reuse the
+served preprocessor. A categorical level never seen in training encodes
+as all zeros until the next full run.
+
+The most recent new days are held out. The update is only published if
+it does not do worse than the current model on them.
+"""
+import copy
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+from api.features import DATE, TARGET, FeatureEncoder
+
+from .data import fill_values
+
+
+def encode(frame, columns, scaler):
+    """(scaled X, raw X, y, dates) for a frame with the CSV columns, in an existing layout."""
+    frame = frame.fillna(fill_values(frame))
+    X_raw = FeatureEncoder(columns).transform_frame(frame)
+    # Scalers fitted on a DataFrame (the full pipeline) expect the column names
+    scaler_input = pd.DataFrame(X_raw, columns=columns) if hasattr(scaler, 'feature_names_in_') else X_raw
+    return (
+        scaler.transform(scaler_input),
+        X_raw,
+        frame[TARGET].to_numpy(dtype=np.float64),
+        pd.to_datetime(frame[DATE]).to_numpy(dtype='datetime64[D]'),
+    )
+
+
+def holdout_split(dates, holdout_days=None, fraction=0.2):
+    """
+    Indexes of (update rows, holdout rows): the last ``holdout_days`` distinct
+    dates (default ``fraction`` of them, at least one) are held out.
+    """
+    days = np.unique(dates)
+    if len(days) < 2:
+        raise ValueError("Incremental training needs at least two new days: one to learn from, one to check")
+    n_holdout = holdout_days or max(1, int(round(len(days) * fraction)))
+    cutoff = days[-min(n_holdout, len(days) - 1)]
+    return np.flatnonzero(dates < cutoff), np.flatnonzero(dates >= cutoff)
+
+
+def window_start(until, window_days):
+    """First date of the ``window_days`` long refit window ending at ``until``."""
+    return (pd.Timestamp(until) - timedelta(days=window_days - 1)).date()
+
+
+def update_mode(model, extra_trees, max_trees):
+    if hasattr(model, 'partial_fit'):
+        return 'partial_fit'
+    if isinstance(model, (RandomForestRegressor, GradientBoostingRegressor)):
+        if model.n_estimators + extra_trees <= max_trees:
+            return 'warm_start'
+    return 'window_refit'
+
+
+def update(model, X_new, y_new, window=None, epochs=5, extra_trees=25, max_trees=300, base_trees=None):
+    """
+    Return (updated model, mode). ``model`` itself is left untouched.
+    ``window`` is a callable returning (X, y) for the refit window, only
+    called when a refit is needed. ``base_trees`` is the tree count a refit
+    starts from again.
+    """
+    mode = update_mode(model, extra_trees, max_trees)
+    if mode == 'partial_fit':
+        # partial_fit and warm_start change the estimator they are called on
+        updated = copy.deepcopy(model)
+        for _ in range(epochs):
+            updated.partial_fit(X_new, y_new)
+    elif mode == 'warm_start':
+        updated = copy.deepcopy(model)
+        updated.set_params(warm_start=True, n_estimators=model.n_estimators + extra_trees)
+        updated.fit(X_new, y_new)
+        updated.set_params(warm_start=False)
+    else:
+        X_window, y_window = window()
+        updated = clone(model)
+        if base_trees and isinstance(model, (RandomForestRegressor, GradientBoostingRegressor)):
+            updated.set_params(n_estimators=base_trees)
+        updated.fit(X_window, y_window)
+    return updated, mode
+
+
+def score(model, X, y):
+    predictions = model.predict(X)
+    return {
+        'rmse': float(np.sqrt(mean_squared_error(y, predictions))),
+        'mae': float(mean_absolute_error(y, predictions)),
+    }
@@ -0,0 +1,22 @@
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+@contextmanager
+def timed(label, timings=None):
+    """Print (and optionally record into ``timings``) the wall time of a block."""
+    started = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - started
+    if timings is not None:
+        timings[label] = elapsed
+    print(f"{label}: {elapsed:.2f}s (peak RSS {peak_rss_mb():.0f} MB)")
@@ -0,0 +1,132 @@
+"""
+Per-segment models for data_pipeline.py --segments.
+
+A segment is the set of rows sharing a region, a category, or both. For
+each segment with enough training rows, a fresh copy of the selected global
+model is fitted on that segment's rows. The copy is kept only if it beats
+the global model on the segment's held-out rows. Segment models reuse the
+global scaler and column layout, so the API encodes a request once and
+only switches the estimator.
+
+Layout, next to the global artifacts::
+
+    segments/index.json
+    segments/<segment>/best_model.pkl (+ serving/fused artifacts)
+
+``index.json`` lists the levels from most to least specific. The API
+routes a request to the first level whose segment has a model, and falls
+back to the global model otherwise.
+"""
+import json
+import os
+import re
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import mean_squared_error
+
+from .export import MODEL_FILE, SEGMENTS_DIR, SEGMENTS_INDEX_FILE, export_fused, export_serving
+
+# Level name -> (API field, CSV column) pairs
+LEVELS = {
+    'region': (('region', 'Region'),),
+    'category': (('category', 'Category'),),
+    'region,category': (('region', 'Region'), ('category', 'Category')),
+}
+
+
+def segment_names(frame, level):
+    """The segment name of every row at ``level``, e.g. 'region=North,category=Toys'."""
+    names = None
+    for field, column in LEVELS[level]:
+        part = f'{field}=' + frame[column].astype(str)
+        names = part if names is None else names + ',' + part
+    return names.to_numpy()
+
+
+def _rmse(y, predictions):
+    return float(np.sqrt(mean_squared_error(y, predictions)))
+
+
+def train_segments(model, frame, split, scaled, levels, min_rows=1000):
+    """
+    Fit one copy of ``model`` per segment of ``levels`` with at least
+    ``min_rows`` training rows. Returns {name: result} for the segments
+    whose model scores a lower test RMSE than ``model`` on the same rows.
+    """
+    train_idx, test_idx = split['train_idx'], split['test_idx']
+    X_train, X_test = np.asarray(scaled['X_train']), np.asarray(scaled['X_test'])
+    y_train, y_test = scaled['y_train'], scaled['y_test']
+    global_predictions = model.predict(X_test)
+    kept = {}
+    for level in levels:
+        names = segment_names(frame, level)
+        train_names, test_names = names[train_idx], names[test_idx]
+        for name in pd.unique(train_names):
+            train_rows = np.flatnonzero(train_names == name)
+            test_rows = np.flatnonzero(test_names == name)
+            if len(train_rows) < min_rows or not len(test_rows):
+                continue
+            segment_model = clone(model).fit(X_train[train_rows], y_train[train_rows])
+            rmse = _rmse(y_test[test_rows], segment_model.predict(X_test[test_rows]))
+            global_rmse = _rmse(y_test[test_rows], global_predictions[test_rows])
+            print(f"[segments] {name}: {len(train_rows)} rows, RMSE {rmse:.3f} vs global {global_rmse:.3f}"
+                  + ("" if rmse < global_rmse else " (not kept)"))
+            if rmse < global_rmse:
+                kept[name] = {
+                    'level': level,
+                    'model': segment_model,
+                    'rows': int(len(train_rows)),
+                    'test_rows': test_rows,
+                    'rmse': rmse,
+                    'global_rmse': global_rmse,
+                }
+    return kept
+
+
+def _directory_name(name):
+    return re.sub(r'[^A-Za-z0-9=,_-]', '_', name)
+
+
+def export_segments(model_dir, segments, levels, scaler, X_test, X_raw_test):
+    """
+    Write the segment models and their index to a staging directory and
+    swap it in place of ``<model_dir>/segments``. Returns the index.
+    """
+    target = os.path.join(model_dir, SEGMENTS_DIR)
+    staging = target + '.new'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    index = {
+        # Most specific first: the API takes the first level that has a model
+        'levels': sorted(levels, key=lambda level: -len(LEVELS[level])),
+        'segments': {},
+    }
+    for name, segment in sorted(segments.items()):
+        directory = _directory_name(name)
+        path = os.path.join(staging, directory)
+        os.makedirs(path)
+        rows = segment['test_rows']
+        joblib.dump(segment['model'], os.path.join(path, MODEL_FILE))
+        export_serving(segment['model'], path, X_test[rows])
+        export_fused(segment['model'], scaler, path, X_raw_test.iloc[rows])
+        index['segments'][name] = {
+            'path': directory,
+            'level': segment['level'],
+            'rows': segment['rows'],
+            'rmse': segment['rmse'],
+            'global_rmse': segment['global_rmse'],
+        }
+    with open(os.path.join(staging, SEGMENTS_INDEX_FILE), 'w') as f:
+        json.dump(index, f, indent=1)
+    remove_segments(model_dir)
+    os.replace(staging, target)
+    return index
+
+
+def remove_segments(model_dir):
+    """Drop segment models trained against an older column layout."""
+    shutil.rmtree(os.path.join(model_dir, SEGMENTS_DIR), ignore_errors=True)
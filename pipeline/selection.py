@@ -0,0 +1,27 @@
+"""
+Latency-aware model selection.
+
+The most accurate model (highest R²) is only picked if it also meets the
+serving budget: median single-row predict time, batch cost per row and the
+size of the artifact the API loads, all measured on the served form of the
+model. When nothing meets the budget the fastest single-row model wins.
+"""
+
+
+def meets_slo(result, max_predict_ms=None, max_batch_us=None, max_artifact_mb=None):
+    return (
+        (max_predict_ms is None or result['predict_ms'] <= max_predict_ms)
+        and (max_batch_us is None or result['batch_us_per_row'] <= max_batch_us)
+        and (max_artifact_mb is None or result['artifact_mb'] <= max_artifact_mb)
+    )
+
+
+def select_model(results, max_predict_ms=None, max_batch_us=None, max_artifact_mb=None):
+    """Return (name, met_slo) for the model to ship from {name: result}."""
+    eligible = [
+        name for name, result in results.items()
+        if meets_slo(result, max_predict_ms, max_batch_us, max_artifact_mb)
+    ]
+    if eligible:
+        return max(eligible, key=lambda name: results[name]['r2']), True
+    return min(results, key=lambda name: results[name]['predict_ms']), False
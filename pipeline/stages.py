@@ -0,0 +1,234 @@
+"""
+Content-addressed stage cache for data_pipeline.py.
+
+Each stage's outputs are stored under ``<cache_dir>/<stage>/<key>/`` where
+the key is a SHA-256 of the stage name, the source code of the function
+that computes it and of the modules it calls into (``deps``), its
+parameters and the keys of the stages it reads. A
+stage whose key is already on disk is not re-run; its outputs are loaded
+lazily, so a run where only a model hyperparameter changed never touches
+the CSV, the encoded matrix or the scaler.
+
+Outputs are stored by type: arrays as .npy (loaded with ``mmap_mode='r'``),
+DataFrames as Parquet when pyarrow is installed (pickle otherwise) and
+anything else with joblib.
+"""
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+META_FILE = 'meta.json'
+FILES_INDEX = 'files.json'
+
+
+def _hash(payload):
+    body = json.dumps(payload, sort_keys=True, default=repr).encode()
+    return hashlib.sha256(body).hexdigest()
+
+
+def code_hash(func, deps=()):
+    """
+    SHA-256 of ``func``'s source and of the whole source of the module
+    defining each of ``deps`` (modules, functions or classes), so a change
+    to a helper such as the feature encoder invalidates the stage too.
+    """
+    digest = hashlib.sha256(inspect.getsource(func).encode())
+    modules = {inspect.getmodule(dep) for dep in deps}
+    for module in sorted(modules, key=lambda module: module.__name__):
+        digest.update(module.__name__.encode())
+        digest.update(inspect.getsource(module).encode())
+    return digest.hexdigest()
+
+
+def _dump(directory, name, value):
+    if isinstance(value, np.ndarray):
+        filename = f'{name}.npy'
+        np.save(os.path.join(directory, filename), value)
+    elif isinstance(value, pd.DataFrame) and HAS_PARQUET:
+        filename = f'{name}.parquet'
+        value.to_parquet(os.path.join(directory, filename))
+    elif isinstance(value, pd.DataFrame):
+        filename = f'{name}.pkl'
+        value.to_pickle(os.path.join(directory, filename))
+    else:
+        filename = f'{name}.joblib'
+        joblib.dump(value, os.path.join(directory, filename))
+    return filename
+
+
+def _load(path):
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.pkl'):
+        return pd.read_pickle(path)
+    return joblib.load(path)
+
+
+class Result:
+    """Outputs of one stage. Cached outputs are loaded on first access."""
+
+    def __init__(self, stage, key, directory, files, values=None, cached=False):
+        self.stage = stage
+        self.key = key
+        self.directory = directory
+        self.files = files
+        self.values = dict(values or {})
+        self.cached = cached
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            self.values[name] = _load(os.path.join(self.directory, self.files[name]))
+        return self.values[name]
+
+
+class StageCache:
+
+    def __init__(self, root, force=(), enabled=True):
+        self.root = root
+        self.force = set(force)
+        self.enabled = enabled
+        # stage -> seconds spent computing it in this process (cached stages are absent)
+        self.timings = {}
+
+    def _directory(self, stage, key):
+        return os.path.join(self.root, stage, key)
+
+    def file_digest(self, path):
+        """SHA-256 of a file's contents, remembered per (size, mtime) so unchanged files are not re-read."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        index_path = os.path.join(self.root, FILES_INDEX)
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        entry = index.get(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        index[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+        if self.enabled:
+            os.makedirs(self.root, exist_ok=True)
+            with open(index_path + '.tmp', 'w') as f:
+                json.dump(index, f, indent=1)
+            os.replace(index_path + '.tmp', index_path)
+        return index[path]['sha256']
+
+    def key(self, stage, code, params=None, inputs=()):
+        return _hash({
+            'stage': stage,
+            'code': code,
+            'params': params or {},
+            'inputs': [result.key for result in inputs],
+        })
+
+    def lookup(self, stage, key):
+        """The cached Result for (stage, key), or None on a miss or when the stage is forced."""
+        if not self.enabled or stage in self.force or 'all' in self.force:
+            return None
+        directory = self._directory(stage, key)
+        try:
+            with open(os.path.join(directory, META_FILE)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return Result(stage, key, directory, meta['outputs'], cached=True)
+
+    def store(self, stage, key, outputs, params=None, seconds=0.0):
+        """Write a stage's outputs ({name: value}) and return them as a Result."""
+        directory = self._directory(stage, key)
+        if not self.enabled:
+            return Result(stage, key, directory, {}, values=outputs)
+
+        staging = f'{directory}.tmp-{os.getpid()}'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        files = {name: _dump(staging, name, value) for name, value in outputs.items()}
+        meta = {
+            'stage': stage,
+            'key': key,
+            'params': params or {},
+            'outputs': files,
+            'seconds': seconds,
+            'created': datetime.now(timezone.utc).isoformat(),
+        }
+        with open(os.path.join(staging, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=1, default=repr)
+        # Swap the complete directory in so readers never see a partial entry
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+        return Result(stage, key, directory, files, values=outputs)
+
+    def run(self, stage, func, inputs=(), params=None, deps=(), **options):
+        """
+        Return the outputs of ``func(*inputs, **params, **options)`` (a dict),
+        from the cache when the stage's key is already stored. ``deps`` name
+        the code ``func`` calls into (see code_hash). ``options`` do not
+        change the result (worker counts and such) and are not hashed.
+        """
+        params = params or {}
+        key = self.key(stage, code_hash(func, deps), params, inputs)
+        result = self.lookup(stage, key)
+        if result is not None:
+            print(f"[{stage}] cached ({key[:12]})")
+            return result
+        started = time.perf_counter()
+        outputs = func(*inputs, **params, **options)
+        seconds = time.perf_counter() - started
+        self.timings[stage] = seconds
+        print(f"[{stage}] ran in {seconds:.2f}s ({key[:12]})")
+        return self.store(stage, key, outputs, params, seconds)
+
+    def entries(self):
+        """Metadata of every stored entry, sorted by stage and creation time."""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for stage in sorted(os.listdir(self.root)):
+            stage_dir = os.path.join(self.root, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for key in os.listdir(stage_dir):
+                directory = os.path.join(stage_dir, key)
+                try:
+                    with open(os.path.join(directory, META_FILE)) as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                meta['bytes'] = sum(
+                    os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+                )
+                entries.append(meta)
+        return sorted(entries, key=lambda meta: (meta['stage'], meta['created']))
+
+    def invalidate(self, stage):
+        """Delete every entry of ``stage`` ('all' clears the cache). Returns the number removed."""
+        if stage == 'all':
+            removed = len(self.entries())
+            shutil.rmtree(self.root, ignore_errors=True)
+            return removed
+        stage_dir = os.path.join(self.root, stage)
+        removed = len(os.listdir(stage_dir)) if os.path.isdir(stage_dir) else 0
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        return removed
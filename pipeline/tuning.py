@@ -0,0 +1,141 @@
+"""
+Time-aware hyperparameter search.
+
+Folds are expanding windows over whole dates (train on the earliest blocks
+of days, validate on the next block), so no fold ever trains on rows newer
+than the ones it is scored on. Each model family is searched with
+successive halving (``HalvingRandomSearchCV``): every candidate starts on a
+small budget and only the best third survive to the next, larger one, so
+poor or expensive configurations are dropped early. The budget is training
+rows for most families and trees for RandomForest. GradientBoosting stops
+adding trees once its internal validation score stops improving, and the
+winning RandomForest is grown with ``warm_start`` until more trees stop
+helping on the most recent fold.
+"""
+import time
+
+import numpy as np
+from scipy.stats import loguniform
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.linear_model import Lasso, LinearRegression, Ridge
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import HalvingRandomSearchCV
+
+
+def time_folds(dates, n_splits=4):
+    """
+    Expanding-window (train_idx, val_idx) folds over whole dates: the sorted
+    distinct dates are cut into ``n_splits + 1`` blocks and fold k trains on
+    blocks 0..k and validates on block k+1.
+    """
+    blocks = np.array_split(np.unique(dates), n_splits + 1)
+    if not all(len(block) for block in blocks):
+        raise ValueError(f"Too few distinct dates for {n_splits} time folds")
+    folds = []
+    for block in blocks[1:]:
+        train = np.flatnonzero(dates < block[0])
+        val = np.flatnonzero((dates >= block[0]) & (dates <= block[-1]))
+        folds.append((train, val))
+    return folds
+
+
+def search_spaces(random_state=42):
+    """{name: (estimator, param_distributions, resource, max_resources)}"""
+    return {
+        'Linear Regression': (LinearRegression(), {'fit_intercept': [True]}, 'n_samples', 'auto'),
+        'Ridge Regression': (Ridge(), {'alpha': loguniform(1e-3, 1e3)}, 'n_samples', 'auto'),
+        'Lasso Regression': (Lasso(max_iter=5000), {'alpha': loguniform(1e-4, 10)}, 'n_samples', 'auto'),
+        'Random Forest': (
+            RandomForestRegressor(random_state=random_state),
+            {
+                'max_depth': [None, 8, 16, 32],
+                'min_samples_leaf': [1, 2, 5, 10],
+                'max_features': [1.0, 0.5, 'sqrt'],
+            },
+            'n_estimators', 200,
+        ),
+        'Gradient Boosting': (
+            GradientBoostingRegressor(n_estimators=1000, n_iter_no_change=10, validation_fraction=0.1,
+                                      random_state=random_state),
+            {
+                'learning_rate': loguniform(0.01, 0.3),
+                'max_depth': [2, 3, 4, 5],
+                'subsample': [0.7, 0.85, 1.0],
+                'min_samples_leaf': [1, 5, 20],
+            },
+            'n_samples', 'auto',
+        ),
+    }
+
+
+def grow_forest(forest, X_train, y_train, X_val, y_val, step=25, max_trees=500, tol=1e-3):
+    """
+    Add ``step`` trees at a time with warm_start until the validation RMSE
+    improves by less than ``tol`` (relative). Returns the tree count to keep.
+    """
+    forest = forest.set_params(warm_start=True, n_estimators=step)
+    forest.fit(X_train, y_train)
+    best = np.sqrt(mean_squared_error(y_val, forest.predict(X_val)))
+    while forest.n_estimators < max_trees:
+        forest.set_params(n_estimators=forest.n_estimators + step)
+        forest.fit(X_train, y_train)
+        rmse = np.sqrt(mean_squared_error(y_val, forest.predict(X_val)))
+        if best - rmse < tol * best:
+            return forest.n_estimators - step if rmse >= best else forest.n_estimators
+        best = rmse
+    return forest.n_estimators
+
+
+def tune(X, y, dates, n_splits=4, n_candidates=12, workers=-1, random_state=42):
+    """
+    Search every family in ``search_spaces`` on time folds of (X, y).
+    Returns {name: {'params', 'cv_rmse', 'search_seconds', 'evaluations'}}.
+    """
+    folds = time_folds(dates, n_splits)
+    tuned = {}
+    for name, (estimator, space, resource, max_resources) in search_spaces(random_state).items():
+        started = time.perf_counter()
+        min_resources = 10 if resource == 'n_estimators' else 'exhaust'
+        search = HalvingRandomSearchCV(
+            estimator, space,
+            n_candidates=1 if name == 'Linear Regression' else n_candidates,
+            factor=3,
+            resource=resource,
+            max_resources=max_resources,
+            min_resources=min_resources,
+            cv=folds,
+            scoring='neg_root_mean_squared_error',
+            refit=False,
+            n_jobs=workers,
+            random_state=random_state,
+        )
+        search.fit(X, y)
+        params = {key: value.item() if isinstance(value, np.generic) else value
+                  for key, value in search.best_params_.items()}
+        if name == 'Random Forest':
+            # The search budget is trees; pick the final count by growing the
+            # best forest on the most recent fold until it stops improving.
+            train, val = folds[-1]
+            forest = estimator.set_params(**{k: v for k, v in params.items() if k != 'n_estimators'})
+            params['n_estimators'] = grow_forest(forest, X[train], y[train], X[val], y[val])
+        tuned[name] = {
+            'params': params,
+            'cv_rmse': -search.best_score_,
+            'search_seconds': time.perf_counter() - started,
+            'evaluations': len(search.cv_results_['params']),
+        }
+        print(f"[tune] {name}: CV RMSE {tuned[name]['cv_rmse']:.2f} with {params} "
+              f"({tuned[name]['evaluations']} evaluations in {tuned[name]['search_seconds']:.1f}s)")
+    return tuned
+
+
+def tuned_models(tuned, random_state=42):
+    """Fresh estimators configured with the tuned parameters."""
+    models = {}
+    for name, (estimator, _, _, _) in search_spaces(random_state).items():
+        params = dict(tuned[name]['params'])
+        if name == 'Random Forest':
+            params['warm_start'] = False
+        models[name] = estimator.set_params(**params)
+    return models